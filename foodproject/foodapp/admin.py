@@ -21,6 +21,21 @@ from django import forms
 from django.contrib import messages
 from django.contrib.admin.widgets import AdminDateWidget
 from django.core.mail import send_mail
+from django.db import transaction
+from .catalog_cache import bump_catalog_version
+from .counters import reconcile_platform_counters
+from .dashboard import invalidate_reservation_summary
+from .dish_index import invalidate_dish_index
+
+def update_dishes(queryset, **fields):
+    """
+    Modification en masse de plats. QuerySet.update() ne déclenche pas les
+    signaux de Dish: l'index des plats et la version du catalogue (caches des
+    API, pages anonymes) sont invalidés ici, comme après une sauvegarde
+    """
+    queryset.update(**fields)
+    transaction.on_commit(invalidate_dish_index)
+    transaction.on_commit(bump_catalog_version)
 
 # Register your models here.
 class DishInline(admin.TabularInline):
@@ -79,27 +94,29 @@ class DishAdmin(admin.ModelAdmin):
     is_newly_added.short_description = "Nouveau"
     
     def mark_as_tourist_recommended(self, request, queryset):
-        queryset.update(is_tourist_recommended=True)
+        update_dishes(queryset, is_tourist_recommended=True)
         self.message_user(request, f"{queryset.count()} plat(s) marqué(s) comme recommandé(s) aux touristes.")
     mark_as_tourist_recommended.short_description = "Marquer comme recommandé aux touristes"
     
     def mark_as_vegetarian(self, request, queryset):
-        queryset.update(is_vegetarian=True)
+        update_dishes(queryset, is_vegetarian=True)
+        # QuerySet.update() ne déclenche pas les signaux: recompter les plats végétariens
+        reconcile_platform_counters()
         self.message_user(request, f"{queryset.count()} plat(s) marqué(s) comme végétarien(s).")
     mark_as_vegetarian.short_description = "Marquer comme végétarien"
     
     def mark_as_moroccan(self, request, queryset):
-        queryset.update(origin=Dish.MOROCCAN)
+        update_dishes(queryset, origin=Dish.MOROCCAN)
         self.message_user(request, f"{queryset.count()} plat(s) marqué(s) comme d'origine marocaine.")
     mark_as_moroccan.short_description = "Marquer comme cuisine marocaine"
     
     def mark_as_diabetic_friendly(self, request, queryset):
-        queryset.update(is_diabetic_friendly=True, has_sugar=False)
+        update_dishes(queryset, is_diabetic_friendly=True, has_sugar=False)
         self.message_user(request, f"{queryset.count()} plat(s) marqué(s) comme adapté(s) aux diabétiques.")
     mark_as_diabetic_friendly.short_description = "Marquer comme adapté aux diabétiques"
     
     def mark_as_gluten_free(self, request, queryset):
-        queryset.update(has_gluten=False)
+        update_dishes(queryset, has_gluten=False)
         self.message_user(request, f"{queryset.count()} plat(s) marqué(s) comme sans gluten.")
     mark_as_gluten_free.short_description = "Marquer comme sans gluten"
 
@@ -272,16 +289,23 @@ class ReservationAdmin(admin.ModelAdmin):
     
     actions = ['mark_as_confirmed', 'mark_as_canceled', 'mark_as_completed']
     
+    def mark_reservations(self, queryset, status):
+        # QuerySet.update() ne déclenche pas les signaux: invalider les compteurs des tableaux de bord
+        restaurant_ids = set(queryset.values_list('restaurant_id', flat=True))
+        queryset.update(status=status)
+        for restaurant_id in restaurant_ids:
+            invalidate_reservation_summary(restaurant_id)
+    
     def mark_as_confirmed(self, request, queryset):
-        queryset.update(status=Reservation.STATUS_CONFIRMED)
+        self.mark_reservations(queryset, Reservation.STATUS_CONFIRMED)
     mark_as_confirmed.short_description = "Confirmer les réservations sélectionnées"
     
     def mark_as_canceled(self, request, queryset):
-        queryset.update(status=Reservation.STATUS_CANCELED)
+        self.mark_reservations(queryset, Reservation.STATUS_CANCELED)
     mark_as_canceled.short_description = "Annuler les réservations sélectionnées"
     
     def mark_as_completed(self, request, queryset):
-        queryset.update(status=Reservation.STATUS_COMPLETED)
+        self.mark_reservations(queryset, Reservation.STATUS_COMPLETED)
     mark_as_completed.short_description = "Marquer les réservations sélectionnées comme terminées"
 
 class UserProfileInline(admin.StackedInline):
@@ -307,12 +331,19 @@ class ReviewAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
     actions = ['publish_reviews', 'unpublish_reviews']
     
+    def refresh_restaurant_ratings(self, queryset):
+        # QuerySet.update() ne déclenche pas les signaux: recalculer les agrégats
+        for restaurant in Restaurant.objects.filter(id__in=queryset.values('restaurant_id')):
+            restaurant.refresh_rating_aggregates()
+    
     def publish_reviews(self, request, queryset):
         queryset.update(is_published=True)
+        self.refresh_restaurant_ratings(queryset)
     publish_reviews.short_description = "Publier les avis sélectionnés"
     
     def unpublish_reviews(self, request, queryset):
         queryset.update(is_published=False)
+        self.refresh_restaurant_ratings(queryset)
     unpublish_reviews.short_description = "Masquer les avis sélectionnés"
 
 @admin.register(ForumTopic)
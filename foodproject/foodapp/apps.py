@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class FoodappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'foodapp'
+
+    def ready(self):
+        # Enregistrer les signaux (agrégats dénormalisés)
+        from . import signals  # noqa: F401
+        from .cache_backends import check_shared_cache
+        checks.register(check_shared_cache, checks.Tags.caches, deploy=True)
@@ -0,0 +1,223 @@
+"""
+Suggestions de saisie (autocomplétion) sur les noms de plats, restaurants et villes.
+
+Les noms sont normalisés comme pour la recherche (search.fold) et rangés dans
+un tableau trié de clés: une clé par mot du nom, du mot jusqu'à la fin du nom,
+pour que « poul » propose « Tajine de poulet ». La saisie est normalisée par
+search.fold_prefix (« tag » cherche aussi « taj », début de « tajine »); chaque
+préfixe se résout par bisect sur ce tableau; les meilleures suggestions des préfixes courts sont
+précalculées, et celles des préfixes plus longs qui correspondent encore à
+beaucoup d'entrées sont mémorisées au premier appel.
+
+Classement: nom commençant par le préfixe, puis popularité (nombre d'avis des
+restaurants, plats recommandés), puis nom le plus court.
+
+L'index est propre au processus, mis à jour objet par objet par les signaux
+(voir signals.py) et reconstruit après SEARCH_INDEX_TTL secondes.
+"""
+import bisect
+import heapq
+import threading
+import time
+
+from django.conf import settings
+
+from .models import City, Dish, Restaurant
+from .search import fold, fold_prefix
+
+MAX_SUGGESTIONS = 10
+
+# Longueur maximale des préfixes dont les suggestions sont précalculées
+PRECOMPUTED_PREFIX_LENGTH = 3
+
+# Nombre de correspondances à partir duquel les suggestions d'un préfixe plus
+# long sont mémorisées
+MEMOIZED_PREFIX_MATCHES = 200
+
+KINDS = ('dish', 'restaurant', 'city')
+
+
+def dish_entries():
+    for pk, name, recommended in Dish.objects.values_list('id', 'name', 'is_tourist_recommended').iterator():
+        yield ('dish', pk), name, 1 if recommended else 0
+
+
+def restaurant_entries():
+    for pk, name, rating_count in Restaurant.objects.values_list('id', 'name', 'rating_count').iterator():
+        yield ('restaurant', pk), name, rating_count
+
+
+def city_entries():
+    for pk, name in City.objects.values_list('id', 'name').iterator():
+        yield ('city', pk), name, 0
+
+
+def entry_for(instance):
+    """Entrée d'index (clé, libellé, poids) d'un objet sauvegardé"""
+    if isinstance(instance, Dish):
+        return ('dish', instance.pk), instance.name, 1 if instance.is_tourist_recommended else 0
+    if isinstance(instance, Restaurant):
+        return ('restaurant', instance.pk), instance.name, instance.rating_count
+    if isinstance(instance, City):
+        return ('city', instance.pk), instance.name, 0
+    return None
+
+
+class AutocompleteIndex:
+    """Tableau trié de (texte normalisé, position du mot, clé de l'entrée)"""
+
+    def __init__(self):
+        self.keys = []
+        self.entries = {}
+        self.top = {}
+
+    @classmethod
+    def build(cls):
+        index = cls()
+        for entries in (dish_entries(), restaurant_entries(), city_entries()):
+            for key, label, weight in entries:
+                index.entries[key] = (label, weight)
+                index.keys.extend(index._keys_for(key, label))
+        index.keys.sort()
+        index._precompute(index._prefixes_of(index.keys))
+        return index
+
+    def _keys_for(self, key, label):
+        words = fold(label).split()
+        return [(' '.join(words[position:]), position, key) for position in range(len(words))]
+
+    def _rank(self, key, position):
+        label, weight = self.entries[key]
+        return (position > 0, -weight, len(label), label)
+
+    def _scan(self, prefix):
+        """Meilleure position de chaque entrée dont une clé commence par prefix"""
+        matches = {}
+        keys = self.keys
+        index = bisect.bisect_left(keys, (prefix,))
+        while index < len(keys) and keys[index][0].startswith(prefix):
+            _text, position, key = keys[index]
+            if key not in matches or position < matches[key]:
+                matches[key] = position
+            index += 1
+        return matches
+
+    def _top_of(self, matches, limit=MAX_SUGGESTIONS):
+        # Meilleures suggestions toutes catégories confondues et par catégorie
+        ranked = [(self._rank(key, position), key) for key, position in matches.items()]
+        top = {None: heapq.nsmallest(limit, ranked)}
+        for kind in KINDS:
+            top[kind] = heapq.nsmallest(limit, (item for item in ranked if item[1][0] == kind))
+        return top
+
+    def _precompute(self, prefixes):
+        for prefix in prefixes:
+            matches = self._scan(prefix)
+            if matches:
+                self.top[prefix] = self._top_of(matches)
+            else:
+                self.top.pop(prefix, None)
+
+    def _top_for(self, prefix, limit):
+        top = self.top.get(prefix)
+        if top is None and len(prefix) > PRECOMPUTED_PREFIX_LENGTH:
+            matches = self._scan(prefix)
+            if len(matches) < MEMOIZED_PREFIX_MATCHES:
+                top = self._top_of(matches, limit)
+            else:
+                top = self.top[prefix] = self._top_of(matches)
+        return top or {}
+
+    def suggest(self, query, limit=MAX_SUGGESTIONS, kinds=None):
+        """Renvoie [(type, id, libellé)] des meilleures suggestions pour query"""
+        prefixes = fold_prefix(query)
+        if not prefixes:
+            return []
+        limit = min(limit, MAX_SUGGESTIONS)
+
+        # Meilleur classement de chaque entrée sur les formes possibles de la saisie
+        best = {}
+        for prefix in prefixes:
+            top = self._top_for(prefix, limit)
+            for kind in (kinds or [None]):
+                for rank, key in top.get(kind, []):
+                    if key not in best or rank < best[key]:
+                        best[key] = rank
+        ranked = heapq.nsmallest(limit, ((rank, key) for key, rank in best.items()))
+        return [(key[0], key[1], self.entries[key][0]) for _rank, key in ranked]
+
+    def update(self, key, label, weight):
+        """Ajoute ou remplace une entrée"""
+        old_prefixes = self._remove_keys(key)
+        self.entries[key] = (label, weight)
+        new_keys = self._keys_for(key, label)
+        for item in new_keys:
+            bisect.insort(self.keys, item)
+        self._precompute(old_prefixes | self._prefixes_of(new_keys))
+
+    def remove(self, key):
+        prefixes = self._remove_keys(key)
+        self.entries.pop(key, None)
+        self._precompute(prefixes)
+
+    def _remove_keys(self, key):
+        if key not in self.entries:
+            return set()
+        old_keys = self._keys_for(key, self.entries[key][0])
+        for item in old_keys:
+            position = bisect.bisect_left(self.keys, item)
+            if position < len(self.keys) and self.keys[position] == item:
+                del self.keys[position]
+        return self._prefixes_of(old_keys)
+
+    def _prefixes_of(self, keys):
+        """Préfixes précalculés des clés; oublie les préfixes plus longs mémorisés"""
+        prefixes = set()
+        for text, _position, _key in keys:
+            for length in range(1, len(text) + 1):
+                if length <= PRECOMPUTED_PREFIX_LENGTH:
+                    prefixes.add(text[:length])
+                else:
+                    self.top.pop(text[:length], None)
+        return prefixes
+
+
+_lock = threading.Lock()
+_index = None
+_built_at = 0.0
+
+
+def get_autocomplete_index():
+    """Renvoie l'index courant, en le reconstruisant s'il n'existe pas ou a expiré"""
+    global _index, _built_at
+    ttl = getattr(settings, 'SEARCH_INDEX_TTL', 300)
+    index = _index
+    if index is not None and (not ttl or time.monotonic() - _built_at < ttl):
+        return index
+    with _lock:
+        if _index is None or (ttl and time.monotonic() - _built_at >= ttl):
+            _index = AutocompleteIndex.build()
+            _built_at = time.monotonic()
+        return _index
+
+
+def update_autocomplete(instance):
+    """Met à jour l'entrée d'un objet sauvegardé (si l'index est déjà construit)"""
+    entry = entry_for(instance)
+    if entry is None or _index is None:
+        return
+    with _lock:
+        _index.update(*entry)
+
+
+def remove_autocomplete(kind, pk):
+    if _index is None:
+        return
+    with _lock:
+        _index.remove((kind, pk))
+
+
+def suggest(query, limit=MAX_SUGGESTIONS, kinds=None):
+    index = get_autocomplete_index()
+    with _lock:
+        return index.suggest(query, limit, kinds)
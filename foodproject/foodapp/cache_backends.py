@@ -0,0 +1,271 @@
+"""
+Backend de cache à deux niveaux.
+
+TieredCache place un LRU en mémoire, propre à chaque processus, devant un
+cache partagé entre les workers (alias ``LOCATION`` de CACHES: fichiers,
+base de données ou Redis selon CACHE_BACKEND, voir settings.py).
+
+- Les lectures interrogent d'abord le LRU local puis le cache partagé; les
+  valeurs trouvées dans le cache partagé sont recopiées localement.
+- Les écritures vont dans le cache partagé et dans le LRU local. Une entrée
+  locale vit au plus LOCAL_TIMEOUT secondes: c'est le délai maximal avant
+  qu'une modification faite par un autre worker soit visible.
+- add() et incr() (verrous, compteurs) sont toujours résolus par le cache
+  partagé. Les clés commençant par un préfixe de SHARED_ONLY_PREFIXES ne
+  sont jamais conservées localement.
+
+Les compteurs de succès/échecs sont tenus par processus. Chaque worker
+recopie périodiquement ses totaux sous sa propre clé du cache partagé et
+s'inscrit dans la liste des workers: aucune écriture concurrente sur une même
+clé, donc aucun compte perdu, même avec un incr() non atomique (cache en base
+de données). La commande ``cache_stats`` fait la somme des workers; les totaux
+d'un worker arrêté disparaissent METRICS_TIMEOUT secondes après son dernier
+report.
+"""
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+METRICS = ('local_hits', 'shared_hits', 'misses', 'sets')
+METRICS_KEY_PREFIX = 'cache_metrics:'
+METRICS_WORKERS_KEY = METRICS_KEY_PREFIX + 'workers'
+METRICS_TIMEOUT = 7 * 24 * 3600
+
+# Caches partagés dont add() n'est atomique qu'au sein d'un seul processus
+SINGLE_PROCESS_BACKENDS = (
+    'django.core.cache.backends.filebased.FileBasedCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+class TieredCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location or 'shared'
+        self._max_entries = options.get('LOCAL_MAX_ENTRIES', 1000)
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self._shared_only_prefixes = tuple(options.get('SHARED_ONLY_PREFIXES', ()))
+        self._metrics_interval = options.get('METRICS_FLUSH_INTERVAL', 60)
+
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = dict.fromkeys(METRICS, 0)
+        self._flushed_at = time.monotonic()
+        # Le pid seul peut être réutilisé par un worker relancé
+        self._worker_id = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    # -- Niveau local ------------------------------------------------------
+
+    def _is_local(self, key):
+        return not key.startswith(self._shared_only_prefixes)
+
+    def _local_get(self, local_key):
+        with self._lock:
+            entry = self._local.get(local_key)
+            if entry is None:
+                return None
+            expires_at, pickled = entry
+            if expires_at <= time.monotonic():
+                del self._local[local_key]
+                return None
+            self._local.move_to_end(local_key)
+        return entry
+
+    def _local_set(self, key, value, timeout, version):
+        if not self._is_local(key):
+            return
+        timeout = self.get_backend_timeout(timeout)
+        local_timeout = self._local_timeout
+        if timeout is not None:
+            local_timeout = min(timeout - time.time(), local_timeout)
+        if local_timeout <= 0:
+            self._local_delete(key, version)
+            return
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        local_key = self.make_and_validate_key(key, version=version)
+        with self._lock:
+            self._local[local_key] = (time.monotonic() + local_timeout, pickled)
+            self._local.move_to_end(local_key)
+            while len(self._local) > self._max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, key, version):
+        local_key = self.make_and_validate_key(key, version=version)
+        with self._lock:
+            self._local.pop(local_key, None)
+
+    # -- Métriques ---------------------------------------------------------
+
+    def _count(self, metric, amount=1):
+        if not amount:
+            return
+        with self._lock:
+            self._metrics[metric] += amount
+            due = time.monotonic() - self._flushed_at >= self._metrics_interval
+            if due:
+                totals = dict(self._metrics)
+                self._flushed_at = time.monotonic()
+        if due:
+            self.flush_metrics(totals)
+
+    def flush_metrics(self, totals=None):
+        """Recopie les totaux de ce processus sous sa clé du cache partagé"""
+        if totals is None:
+            with self._lock:
+                totals = dict(self._metrics)
+        self.shared.set(METRICS_KEY_PREFIX + self._worker_id, totals, METRICS_TIMEOUT)
+        workers = self.shared.get(METRICS_WORKERS_KEY) or []
+        if self._worker_id in workers:
+            return
+        # Inscription (une fois par worker, ou de nouveau si une inscription
+        # concurrente l'a effacée); on en profite pour oublier les workers expirés
+        alive = self.shared.get_many([METRICS_KEY_PREFIX + worker for worker in workers])
+        workers = [worker for worker in workers if METRICS_KEY_PREFIX + worker in alive]
+        self.shared.set(METRICS_WORKERS_KEY, workers + [self._worker_id], None)
+
+    def stats(self):
+        """Compteurs de ce processus et taux de succès"""
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['local_entries'] = len(self._local)
+        metrics['pid'] = os.getpid()
+        metrics['hit_rate'] = hit_rate(metrics)
+        return metrics
+
+    # -- API du cache ------------------------------------------------------
+
+    def get(self, key, default=None, version=None):
+        if self._is_local(key):
+            entry = self._local_get(self.make_and_validate_key(key, version=version))
+            if entry is not None:
+                self._count('local_hits')
+                return pickle.loads(entry[1])
+        sentinel = object()
+        value = self.shared.get(key, sentinel, version=version)
+        if value is sentinel:
+            self._count('misses')
+            return default
+        self._count('shared_hits')
+        self._local_set(key, value, self._local_timeout, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        remaining = []
+        for key in keys:
+            entry = None
+            if self._is_local(key):
+                entry = self._local_get(self.make_and_validate_key(key, version=version))
+            if entry is None:
+                remaining.append(key)
+            else:
+                found[key] = pickle.loads(entry[1])
+        self._count('local_hits', len(found))
+
+        if remaining:
+            shared_found = self.shared.get_many(remaining, version=version)
+            self._count('shared_hits', len(shared_found))
+            self._count('misses', len(remaining) - len(shared_found))
+            for key, value in shared_found.items():
+                self._local_set(key, value, self._local_timeout, version)
+            found.update(shared_found)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._local_set(key, value, timeout, version)
+        self._count('sets')
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self._local_set(key, value, timeout, version)
+        self._count('sets', len(data) - len(failed))
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._local_set(key, value, timeout, version)
+            self._count('sets')
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self._local_delete(key, version)
+        return value
+
+    def delete(self, key, version=None):
+        self._local_delete(key, version)
+        return self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._local_delete(key, version)
+        self.shared.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        if self._is_local(key) and self._local_get(self.make_and_validate_key(key, version=version)):
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+def hit_rate(metrics):
+    lookups = metrics['local_hits'] + metrics['shared_hits'] + metrics['misses']
+    return round((metrics['local_hits'] + metrics['shared_hits']) / lookups, 4) if lookups else None
+
+
+def shared_metrics(shared_cache):
+    """Somme des derniers totaux reportés par chaque worker dans le cache partagé"""
+    workers = shared_cache.get(METRICS_WORKERS_KEY) or []
+    reports = shared_cache.get_many([METRICS_KEY_PREFIX + worker for worker in workers])
+    metrics = {metric: sum(report.get(metric, 0) for report in reports.values()) for metric in METRICS}
+    metrics['workers'] = len(reports)
+    metrics['hit_rate'] = hit_rate(metrics)
+    return metrics
+
+
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Vérification de déploiement: les verrous (single_flight, paniers) et la
+    version du catalogue supposent un add() atomique entre les workers
+    """
+    errors = []
+    for alias, options in settings.CACHES.items():
+        if options['BACKEND'] != 'foodapp.cache_backends.TieredCache':
+            continue
+        shared_alias = options.get('LOCATION') or 'shared'
+        if settings.CACHES.get(shared_alias, {}).get('BACKEND') in SINGLE_PROCESS_BACKENDS:
+            errors.append(checks.Warning(
+                f"Le cache partagé '{shared_alias}' du cache '{alias}' ne convient qu'à un seul processus",
+                hint="Utiliser CACHE_BACKEND='db' ou 'redis' avec plusieurs workers.",
+                id='foodapp.W001',
+            ))
+    return errors
@@ -0,0 +1,381 @@
+"""
+Panier des clients connectés.
+
+Selon settings.CART_STORAGE, le panier est gardé:
+- en base ('database', par défaut): une commande au statut « cart », unique
+  par client et par restaurant (contrainte unique_open_cart). Chaque opération
+  s'exécute dans une transaction qui verrouille le panier et n'écrit que des
+  incréments:
+  - quantités: UPDATE ... SET quantity = quantity + n, ou création de la ligne;
+  - total: UPDATE ... SET total_amount = total_amount + variation.
+  Deux ajouts simultanés (double appui sur mobile) s'additionnent sans se perdre.
+- dans la session ('session') ou le cache partagé ('cache'): un dictionnaire
+  compact par restaurant, sans aucune écriture en base avant la validation, qui
+  crée la commande et ses articles (un seul bulk_create). Les modifications
+  d'un même client sont sérialisées par un verrou du cache partagé (cart_lock)
+  et la validation est idempotente (Order.idempotency_key).
+
+Dans tous les cas le prix unitaire est figé au premier ajout du plat, et la
+validation fait passer le panier au statut « new » (file de la cuisine).
+"""
+import secrets
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Subquery, Value
+from django.utils import timezone
+
+from .models import Dish, Order, OrderItem
+from .transactions import is_unique_violation, run_with_retries
+
+# Nombre maximal de plats différents dans une même requête
+MAX_LINES = 50
+
+# Champs de la commande renseignés à la validation du panier
+CHECKOUT_FIELDS = ('table_number', 'customer_name', 'is_takeaway', 'payment_method', 'notes', 'special_instructions')
+
+
+class CartError(ValueError):
+    pass
+
+
+def parse_cart_lines(data):
+    """
+    Lignes [(id du plat, quantité)] d'une requête: {"dish_id", "quantity"} ou
+    {"items": [{"dish_id", "quantity"}, ...]}. Une quantité négative retire le plat.
+    """
+    items = data.get('items')
+    if items is None:
+        items = [{'dish_id': data.get('dish_id'), 'quantity': data.get('quantity', 1)}]
+    if not isinstance(items, list) or not 1 <= len(items) <= MAX_LINES:
+        raise CartError(f"'items' doit contenir entre 1 et {MAX_LINES} plats")
+
+    lines = []
+    for item in items:
+        try:
+            dish_id, quantity = int(item['dish_id']), int(item.get('quantity', 1))
+        except (KeyError, TypeError, ValueError):
+            raise CartError("Chaque ligne doit avoir un 'dish_id' et une 'quantity' entiers")
+        if quantity:
+            lines.append((dish_id, quantity))
+    return lines
+
+
+def parse_checkout(data):
+    """Restaurant et champs de la commande d'une requête de validation"""
+    try:
+        restaurant_id = int(data['restaurant_id'])
+    except (KeyError, TypeError, ValueError):
+        raise CartError("'restaurant_id' doit être un entier")
+    fields = {field: data[field] for field in CHECKOUT_FIELDS if data.get(field) is not None}
+    if 'is_takeaway' in fields:
+        fields['is_takeaway'] = bool(fields['is_takeaway'])
+    if fields.get('payment_method', Order.PAYMENT_CASH) not in dict(Order.PAYMENT_CHOICES):
+        raise CartError(f"Mode de paiement inconnu: {fields['payment_method']}")
+    for field in ('table_number', 'customer_name'):
+        if field in fields:
+            fields[field] = str(fields[field])[:Order._meta.get_field(field).max_length]
+    return restaurant_id, fields
+
+
+def group_by_restaurant(lines):
+    """
+    Vérifie les plats des lignes en une requête; renvoie ({id: plat},
+    {restaurant: {plat: quantité}})
+    """
+    quantities = defaultdict(int)
+    for dish_id, quantity in lines:
+        quantities[dish_id] += quantity
+
+    dishes = Dish.objects.only('id', 'name', 'restaurant_id', 'price_range').in_bulk(list(quantities))
+    by_restaurant = defaultdict(dict)
+    for dish_id, quantity in quantities.items():
+        dish = dishes.get(dish_id)
+        if dish is None:
+            raise CartError(f"Plat introuvable: {dish_id}")
+        if dish.restaurant_id is None:
+            raise CartError(f"Le plat « {dish.name} » n'est proposé par aucun restaurant")
+        if quantity:
+            by_restaurant[dish.restaurant_id][dish_id] = quantity
+    return dishes, by_restaurant
+
+
+# ---------------------------------------------------------------------------
+# Panier en base
+# ---------------------------------------------------------------------------
+
+def open_cart(user, restaurant_id):
+    """Panier ouvert du client dans ce restaurant, verrouillé jusqu'à la fin de la transaction"""
+    cart = Order.objects.select_for_update().filter(
+        user=user, restaurant_id=restaurant_id, status=Order.STATUS_CART
+    ).first()
+    if cart is not None:
+        return cart
+    try:
+        with transaction.atomic():
+            return Order.objects.create(user=user, restaurant_id=restaurant_id, status=Order.STATUS_CART)
+    except IntegrityError:
+        # Panier créé en parallèle par une autre requête du client
+        return Order.objects.select_for_update().get(
+            user=user, restaurant_id=restaurant_id, status=Order.STATUS_CART
+        )
+
+
+def apply_to_cart(cart, quantities, dishes):
+    """Applique {id du plat: quantité} au panier; renvoie l'expression du nouveau total"""
+    total = F('total_amount') + Value(Decimal('0'))
+
+    for dish_id, quantity in quantities.items():
+        if quantity <= 0:
+            continue
+        if OrderItem.objects.filter(order=cart, dish_id=dish_id).update(quantity=F('quantity') + quantity):
+            # Ligne existante: le total suit le prix figé à son premier ajout
+            snapshot = OrderItem.objects.filter(order=cart, dish_id=dish_id)
+            total = total + Subquery(snapshot.values('price')[:1]) * quantity
+        else:
+            price = dishes[dish_id].unit_price
+            OrderItem.objects.create(order=cart, dish_id=dish_id, quantity=quantity, price=price)
+            total = total + Value(price * quantity)
+
+    removals = {dish_id: -quantity for dish_id, quantity in quantities.items() if quantity < 0}
+    if removals:
+        deleted = []
+        items = OrderItem.objects.select_for_update().filter(order=cart, dish_id__in=removals)
+        for item_id, dish_id, quantity, price in items.values_list('id', 'dish_id', 'quantity', 'price'):
+            removed = min(quantity, removals[dish_id])
+            if not removed:
+                continue
+            removals[dish_id] -= removed
+            if removed == quantity:
+                deleted.append(item_id)
+            else:
+                OrderItem.objects.filter(pk=item_id).update(quantity=F('quantity') - removed)
+            total = total - Value(price * removed)
+        if deleted:
+            OrderItem.objects.filter(pk__in=deleted).delete()
+
+    return ExpressionWrapper(total, output_field=DecimalField(max_digits=10, decimal_places=2))
+
+
+def update_cart(user, lines):
+    """
+    Ajoute (quantité > 0) ou retire (quantité < 0) des plats des paniers du
+    client, en une transaction. Renvoie [{'id', 'restaurant_id', 'total_amount', 'lines'}]
+    des paniers modifiés.
+    """
+    dishes, by_restaurant = group_by_restaurant(lines)
+
+    def update():
+        cart_ids = []
+        with transaction.atomic():
+            for restaurant_id, restaurant_quantities in by_restaurant.items():
+                cart = open_cart(user, restaurant_id)
+                total = apply_to_cart(cart, restaurant_quantities, dishes)
+                Order.objects.filter(pk=cart.pk).update(total_amount=total)
+                cart_ids.append(cart.pk)
+        return cart_ids
+
+    cart_ids = run_with_retries(update)
+    return list(
+        Order.objects.filter(pk__in=cart_ids)
+        .annotate(lines=Count('items'))
+        .values('id', 'restaurant_id', 'total_amount', 'lines')
+    )
+
+
+def checkout_cart(user, restaurant_id, **fields):
+    """Transmet le panier en base du client à la cuisine; renvoie la commande"""
+    def checkout():
+        with transaction.atomic():
+            order = Order.objects.select_for_update().filter(
+                user=user, restaurant_id=restaurant_id, status=Order.STATUS_CART
+            ).first()
+            if order is None or not order.items.exists():
+                raise CartError("Le panier est vide")
+            for field, value in fields.items():
+                setattr(order, field, value)
+            order.status = Order.STATUS_NEW
+            order.order_time = timezone.now()
+            order.save()
+            return order
+
+    return run_with_retries(checkout)
+
+
+# ---------------------------------------------------------------------------
+# Panier hors base (session ou cache)
+# ---------------------------------------------------------------------------
+
+CART_SESSION_KEY = 'cart'
+CART_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+# Verrou des modifications du panier d'un client (durée de vie, attente maximale)
+CART_LOCK_TIMEOUT = 10
+CART_LOCK_WAIT = 3.0
+CART_LOCK_POLL_INTERVAL = 0.01
+
+
+def cart_cache_key(user_id):
+    # Préfixe lu directement dans le cache partagé (settings.CACHES, SHARED_ONLY_PREFIXES)
+    return f'cart:{user_id}'
+
+
+@contextmanager
+def cart_lock(user_id):
+    """
+    Sérialise les lectures-modifications-écritures du panier hors base d'un
+    client: deux ajouts simultanés ne partent pas de la même copie
+    """
+    key = f'cart:lock:{user_id}'
+    deadline = time.monotonic() + CART_LOCK_WAIT
+    while not cache.add(key, 1, CART_LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            raise CartError("Le panier est en cours de modification, réessayez")
+        time.sleep(CART_LOCK_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
+class StoredCart:
+    """
+    Panier {restaurant: {'key': clé, 'lines': {plat: [quantité, prix unitaire]}}},
+    identifiants et prix en texte pour la sérialisation JSON de la session. La
+    clé, tirée à la création du panier d'un restaurant, sert de clé d'idempotence
+    à la commande créée par sa validation.
+    """
+
+    def __init__(self, data=None):
+        self.data = data or {}
+
+    @classmethod
+    def load(cls, request):
+        """Panier relu depuis son stockage (à appeler sous cart_lock)"""
+        if settings.CART_STORAGE == 'cache':
+            return cls(cache.get(cart_cache_key(request.user.pk)))
+        # Relu en base de sessions: request.session a été chargée en début de requête
+        return cls(request.session.load().get(CART_SESSION_KEY))
+
+    def save(self, request):
+        if settings.CART_STORAGE == 'cache':
+            key = cart_cache_key(request.user.pk)
+            if self.data:
+                cache.set(key, self.data, CART_CACHE_TIMEOUT)
+            else:
+                cache.delete(key)
+            return
+        session = request.session
+        if self.data:
+            session[CART_SESSION_KEY] = self.data
+        else:
+            session.pop(CART_SESSION_KEY, None)
+        session.save()
+        # Déjà enregistrée: SessionMiddleware ne doit pas réécrire en fin de requête
+        # une copie que d'autres requêtes du client auront pu modifier entre-temps
+        session.modified = False
+
+    def apply(self, lines):
+        """Ajoute ou retire des plats; renvoie les résumés des paniers modifiés"""
+        dishes, by_restaurant = group_by_restaurant(lines)
+        for restaurant_id, quantities in by_restaurant.items():
+            cart = self.data.setdefault(str(restaurant_id), {'key': f'cart:{secrets.token_hex(16)}', 'lines': {}})
+            cart_lines = cart['lines']
+            for dish_id, quantity in quantities.items():
+                line = cart_lines.get(str(dish_id))
+                if line is not None:
+                    line[0] += quantity
+                    if line[0] <= 0:
+                        del cart_lines[str(dish_id)]
+                elif quantity > 0:
+                    cart_lines[str(dish_id)] = [quantity, str(dishes[dish_id].unit_price)]
+            if not cart_lines:
+                del self.data[str(restaurant_id)]
+        return [self.summary(restaurant_id) for restaurant_id in by_restaurant]
+
+    def summary(self, restaurant_id):
+        cart_lines = self.data.get(str(restaurant_id), {}).get('lines', {})
+        total = sum((Decimal(price) * quantity for quantity, price in cart_lines.values()), Decimal('0.00'))
+        return {'id': None, 'restaurant_id': restaurant_id, 'total_amount': total, 'lines': len(cart_lines)}
+
+    def checkout(self, user, restaurant_id, **fields):
+        """
+        Crée la commande et ses articles; renvoie la commande. Une validation
+        envoyée deux fois renvoie la commande de la première.
+        """
+        cart = self.data.get(str(restaurant_id))
+        if not cart:
+            raise CartError("Le panier est vide")
+        idempotency_key = cart['key']
+
+        # Plats retirés de la carte depuis leur ajout au panier
+        offered = set(
+            Dish.objects.filter(pk__in=[int(dish_id) for dish_id in cart['lines']], restaurant_id=restaurant_id)
+            .values_list('pk', flat=True)
+        )
+        lines = [
+            (int(dish_id), quantity, Decimal(price))
+            for dish_id, (quantity, price) in cart['lines'].items()
+            if int(dish_id) in offered
+        ]
+        if not lines:
+            raise CartError("Aucun plat du panier n'est encore proposé par ce restaurant")
+
+        def create():
+            existing = Order.objects.filter(restaurant_id=restaurant_id, idempotency_key=idempotency_key).first()
+            if existing is not None:
+                return existing
+            try:
+                with transaction.atomic():
+                    order = Order.objects.create(
+                        user=user, restaurant_id=restaurant_id, status=Order.STATUS_NEW,
+                        total_amount=sum(quantity * price for _dish_id, quantity, price in lines),
+                        idempotency_key=idempotency_key, **fields
+                    )
+                    # Articles en une requête: bulk_create n'envoie pas les signaux d'OrderItem,
+                    # qui ne comptabilisent que les commandes encaissées (voir signals.py)
+                    OrderItem.objects.bulk_create([
+                        OrderItem(order=order, dish_id=dish_id, quantity=quantity, price=price)
+                        for dish_id, quantity, price in lines
+                    ])
+            except IntegrityError as error:
+                if not is_unique_violation(error, Order, ('restaurant', 'idempotency_key')):
+                    raise
+                # Même panier validé en parallèle: la commande existe déjà
+                return Order.objects.get(restaurant_id=restaurant_id, idempotency_key=idempotency_key)
+            return order
+
+        order = run_with_retries(create)
+        del self.data[str(restaurant_id)]
+        return order
+
+
+# ---------------------------------------------------------------------------
+# Panier de la requête (selon settings.CART_STORAGE)
+# ---------------------------------------------------------------------------
+
+def update_request_cart(request, lines):
+    """Applique les lignes au panier du client; renvoie les résumés des paniers modifiés"""
+    if settings.CART_STORAGE == 'database':
+        return update_cart(request.user, lines)
+    with cart_lock(request.user.pk):
+        cart = StoredCart.load(request)
+        carts = cart.apply(lines)
+        cart.save(request)
+    return carts
+
+
+def checkout_request_cart(request, restaurant_id, **fields):
+    """Valide le panier du client pour ce restaurant; renvoie la commande créée"""
+    if settings.CART_STORAGE == 'database':
+        return checkout_cart(request.user, restaurant_id, **fields)
+    with cart_lock(request.user.pk):
+        cart = StoredCart.load(request)
+        order = cart.checkout(request.user, restaurant_id, **fields)
+        cart.save(request)
+    return order
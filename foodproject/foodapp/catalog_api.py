@@ -0,0 +1,167 @@
+"""
+Sérialisation et pagination des API du catalogue (/api/dishes/, /api/restaurants/).
+
+Les listes sont paginées par identifiant (``?after=<id>&limit=``), les champs
+renvoyés peuvent être restreints (``?fields=id,name,city``) et le mode NDJSON
+(``?format=ndjson``) diffuse les objets ligne par ligne, lus par lots, pour les
+synchronisations en masse.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .models import Dish
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# Taille des lots lus en base en mode NDJSON
+STREAM_BATCH_SIZE = 500
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+
+def dish_api_data(dish):
+    """Représentation JSON d'un plat pour l'API"""
+    return {
+        'id': dish.id,
+        'name': dish.name,
+        'description': dish.description,
+        'price_range': dish.price_range,
+        'price_display': dict(Dish.PRICE_RANGE_CHOICES).get(dish.price_range, dish.price_range),
+        'type': dish.type,
+        'type_display': dish.get_type_display(),
+        'image': dish.image.url if dish.image else '',
+        'is_vegetarian': dish.is_vegetarian,
+        'is_vegan': dish.is_vegan,
+        'ingredients': dish.ingredients,
+        'history': dish.history,
+        'preparation_steps': dish.preparation_steps,
+        'city': {
+            'id': dish.city.id if dish.city else None,
+            'name': dish.city.name if dish.city else None
+        },
+    }
+
+
+def restaurant_api_data(restaurant):
+    """Représentation JSON d'un restaurant pour l'API"""
+    return {
+        'id': restaurant.id,
+        'name': restaurant.name,
+        'description': restaurant.description,
+        'is_open': restaurant.is_open,
+        'address': restaurant.address,
+        'phone': restaurant.phone,
+        'email': restaurant.email,
+        'website': restaurant.website,
+        'image': restaurant.image.url if restaurant.image else '',
+        'city': {
+            'id': restaurant.city.id,
+            'name': restaurant.city.name
+        },
+    }
+
+
+# Champs sélectionnables avec ?fields=
+DISH_API_FIELDS = [
+    'id', 'name', 'description', 'price_range', 'price_display', 'type', 'type_display',
+    'image', 'is_vegetarian', 'is_vegan', 'ingredients', 'history', 'preparation_steps', 'city',
+]
+RESTAURANT_API_FIELDS = [
+    'id', 'name', 'description', 'is_open', 'address', 'phone', 'email', 'website', 'image', 'city',
+]
+
+
+class PageParamsError(ValueError):
+    pass
+
+
+class PageParams:
+    """Paramètres de pagination et de sélection de champs d'une requête d'API"""
+
+    def __init__(self, request, available_fields):
+        try:
+            self.after = int(request.GET.get('after') or 0)
+            limit = request.GET.get('limit')
+            self.limit = int(limit) if limit else None
+        except ValueError:
+            raise PageParamsError("Paramètres 'after' et 'limit' entiers attendus")
+        if self.after < 0 or (self.limit is not None and self.limit < 1):
+            raise PageParamsError("Paramètres 'after' et 'limit' positifs attendus")
+
+        fields = request.GET.get('fields')
+        if fields:
+            self.fields = [field.strip() for field in fields.split(',') if field.strip()]
+            unknown = [field for field in self.fields if field not in available_fields]
+            if unknown:
+                raise PageParamsError(f"Champs inconnus: {', '.join(unknown)}")
+        else:
+            self.fields = None
+
+        self.stream = (
+            request.GET.get('format') == 'ndjson'
+            or NDJSON_CONTENT_TYPE in request.headers.get('Accept', '')
+        )
+        if not self.stream:
+            self.limit = min(self.limit or DEFAULT_LIMIT, MAX_LIMIT)
+
+    def select(self, data):
+        if self.fields is None:
+            return data
+        return {field: data[field] for field in self.fields}
+
+
+def id_batches(ids, after, limit=None, batch_size=STREAM_BATCH_SIZE):
+    """Découpe une liste triée d'identifiants en lots, à partir de after"""
+    ids = [pk for pk in ids if pk > after]
+    if limit is not None:
+        ids = ids[:limit]
+    for start in range(0, len(ids), batch_size):
+        yield ids[start:start + batch_size]
+
+
+def keyset_id_batches(queryset, after, limit=None, batch_size=STREAM_BATCH_SIZE):
+    """Parcourt les identifiants d'un QuerySet par lots (WHERE id > dernier id)"""
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        batch = list(queryset.filter(id__gt=after).order_by('id').values_list('id', flat=True)[:size])
+        if not batch:
+            return
+        yield batch
+        after = batch[-1]
+        if remaining is not None:
+            remaining -= len(batch)
+        if len(batch) < size:
+            return
+
+
+def page_ids(ids, limit):
+    """Sépare les identifiants de la page (limit + 1 lus) et l'identifiant suivant"""
+    ids = list(ids)
+    if len(ids) > limit:
+        ids = ids[:limit]
+        return ids, ids[-1]
+    return ids, None
+
+
+def ndjson_response(batches, params):
+    """Réponse NDJSON diffusée: un objet JSON par ligne, produits par lots"""
+    def lines():
+        for batch in batches:
+            yield ''.join(
+                json.dumps(params.select(data), cls=DjangoJSONEncoder) + '\n'
+                for data in batch
+            )
+    return StreamingHttpResponse(lines(), content_type=NDJSON_CONTENT_TYPE)
+
+
+def page_payload(results, params, next_after, **extra):
+    """Contenu JSON d'une page: résultats et identifiant à passer dans ?after="""
+    return {
+        'results': [params.select(data) for data in results],
+        'next_after': next_after,
+        **extra,
+    }
@@ -0,0 +1,111 @@
+"""
+Cache des API du catalogue (plats, restaurants, villes).
+
+- Une version globale du catalogue est renouvelée par les signaux post_save /
+  post_delete de Dish, Restaurant et City (voir signals.py). Toutes les clés
+  contiennent cette version: une modification rend immédiatement obsolètes
+  les entrées existantes, sans attendre une expiration.
+- Chaque objet est sérialisé une fois par version (« fragment ») et les pages
+  sont assemblées à partir des fragments, lus en un seul get_many.
+- La régénération d'une entrée manquante est exclusive (« single-flight »):
+  un seul worker la reconstruit pendant que les autres servent la copie
+  précédente ou attendent brièvement le résultat.
+"""
+import hashlib
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+# Durée de vie des entrées (la version les invalide bien avant en cas de modification)
+CATALOG_CACHE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 60 * 60)
+
+# Durée maximale de reconstruction d'une entrée, et attente des autres workers
+BUILD_LOCK_TIMEOUT = 30
+BUILD_WAIT = 2.0
+BUILD_POLL_INTERVAL = 0.05
+
+
+def catalog_version():
+    """Version courante du catalogue"""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    """Invalide toutes les entrées du catalogue en changeant de version"""
+    # Version inédite plutôt qu'un incr(): sur les caches où incr() est une lecture
+    # suivie d'une écriture, deux modifications simultanées donneraient la même version
+    cache.set(CATALOG_VERSION_KEY, time.time_ns() + secrets.randbelow(1000), None)
+
+
+def fragment_key(kind, pk, version):
+    return f'catalog:{kind}:{pk}:v{version}'
+
+
+def cached_fragments(kind, ids, load, serializer, version=None):
+    """
+    Renvoie les représentations sérialisées des objets ids (dans l'ordre),
+    depuis le cache quand c'est possible. load(ids manquants) renvoie
+    {id: objet}; les fragments manquants sont sérialisés puis mis en cache.
+    """
+    version = catalog_version() if version is None else version
+    keys = {pk: fragment_key(kind, pk, version) for pk in ids}
+    cached = cache.get_many(keys.values())
+
+    missing = [pk for pk in ids if keys[pk] not in cached]
+    if missing:
+        fresh = {keys[pk]: serializer(obj) for pk, obj in load(missing).items()}
+        cache.set_many(fresh, CATALOG_CACHE_TIMEOUT)
+        cached.update(fresh)
+    return [cached[keys[pk]] for pk in ids if keys[pk] in cached]
+
+
+def request_key(prefix, request):
+    """Clé d'une réponse dépendant du chemin et des paramètres de la requête"""
+    query = '&'.join(sorted(request.GET.urlencode().split('&')))
+    digest = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+    return f'catalog:{prefix}:{digest}'
+
+
+def single_flight(key, version, build):
+    """
+    Lit l'entrée key de la version donnée, ou la reconstruit avec build().
+
+    Un seul appelant reconstruit une entrée manquante (verrou cache.add);
+    les autres renvoient la dernière copie connue, même d'une version
+    antérieure, ou attendent la nouvelle au plus BUILD_WAIT secondes.
+    """
+    versioned_key = f'{key}:v{version}'
+    value = cache.get(versioned_key)
+    if value is not None:
+        return value
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, BUILD_LOCK_TIMEOUT):
+        try:
+            value = build()
+            # La copie non versionnée sert de repli pendant les reconstructions suivantes
+            cache.set_many({versioned_key: value, f'{key}:stale': value}, CATALOG_CACHE_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    stale = cache.get(f'{key}:stale')
+    if stale is not None:
+        return stale
+
+    deadline = time.monotonic() + BUILD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(BUILD_POLL_INTERVAL)
+        value = cache.get(versioned_key)
+        if value is not None:
+            return value
+    # Le worker propriétaire du verrou est trop lent: construire sans mettre en cache
+    return build()
@@ -0,0 +1,126 @@
+"""
+Synchronisation incrémentale des commandes d'un restaurant (caisse, tablettes).
+
+Le client lit d'abord les commandes en cours sans curseur, puis demande
+régulièrement les changements depuis le curseur reçu: seules les commandes
+modifiées depuis (Order.updated_at, index order_changes_idx) sont renvoyées,
+avec leurs articles. Une commande annulée est renvoyée comme « pierre
+tombale » ({"id", "removed": true}): le client la retire de sa liste.
+
+Order.updated_at est mis à jour par Order.save() et, pour les articles et le
+statut en cuisine, par les signaux (voir signals.py); QuerySet.update() ne
+le modifie pas, à l'exception des paniers, qui ne sont jamais renvoyés.
+
+Un changement est daté au moment de la sauvegarde, mais n'est visible
+qu'après la validation de sa transaction: les changements des
+CHANGES_SETTLE_SECONDS dernières secondes ne sont renvoyés qu'au passage
+suivant, pour qu'une transaction encore en cours ne soit pas dépassée par le
+curseur.
+"""
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .dish_sorting import decode_cursor, encode_cursor
+from .models import Order, OrderItem
+from .transactions import RETRY_TIMEOUT
+
+ACTIVE_STATUSES = [Order.STATUS_NEW, Order.STATUS_PREPARING, Order.STATUS_READY]
+
+CHANGES_PAGE_SIZE = 200
+
+# Durée maximale entre la datation d'un changement et la validation de sa
+# transaction: les rejeux de run_with_retries, plus une marge
+CHANGES_SETTLE_SECONDS = RETRY_TIMEOUT + 3
+
+ORDER_FIELDS = [
+    'id', 'order_code', 'status', 'table_number', 'customer_name', 'is_takeaway',
+    'total_amount', 'payment_method', 'order_time', 'notes', 'kitchen_status__status',
+]
+
+
+def compact_orders(rows):
+    """Commandes au format de synchronisation, articles lus en une requête"""
+    items = {}
+    for order_id, item_id, dish_id, name, quantity, price, completed in OrderItem.objects.filter(
+        order_id__in=[row['id'] for row in rows]
+    ).order_by('id').values_list('order_id', 'id', 'dish_id', 'dish__name', 'quantity', 'price', 'is_completed'):
+        items.setdefault(order_id, []).append({
+            'id': item_id, 'dish_id': dish_id, 'name': name, 'quantity': quantity,
+            'price': str(price), 'is_completed': completed,
+        })
+
+    orders = []
+    for row in rows:
+        if row['status'] == Order.STATUS_CANCELLED:
+            orders.append({'id': row['id'], 'removed': True})
+            continue
+        orders.append({
+            'id': row['id'],
+            'code': row['order_code'],
+            'status': row['status'],
+            'kitchen_status': row['kitchen_status__status'],
+            'table': row['table_number'] or '',
+            'customer': row['customer_name'] or '',
+            'takeaway': row['is_takeaway'],
+            'total': str(row['total_amount']),
+            'payment': row['payment_method'],
+            'time': row['order_time'].isoformat() if row['order_time'] else None,
+            'notes': row['notes'],
+            'items': items.get(row['id'], []),
+        })
+    return orders
+
+
+def parse_changes_cursor(cursor):
+    """(updated_at, id) d'un curseur; ValueError s'il est invalide"""
+    position = decode_cursor(cursor)
+    try:
+        updated_at = parse_datetime(position['t'])
+        order_id = int(position['id'])
+    except (KeyError, TypeError, ValueError, ValidationError):
+        raise ValueError("Curseur invalide")
+    if updated_at is None:
+        raise ValueError("Curseur invalide")
+    return updated_at, order_id
+
+
+def order_changes(restaurant, cursor=None, page_size=CHANGES_PAGE_SIZE):
+    """
+    Sans curseur: commandes en cours du restaurant. Avec curseur: commandes
+    modifiées depuis, par pages de page_size. Renvoie
+    {'orders', 'cursor', 'has_more'}; le client redemande aussitôt tant que
+    has_more est vrai.
+    """
+    settled = timezone.now() - timedelta(seconds=CHANGES_SETTLE_SECONDS)
+    orders = Order.objects.filter(restaurant=restaurant).exclude(status=Order.STATUS_CART)
+
+    if cursor is None:
+        rows = list(orders.filter(status__in=ACTIVE_STATUSES).order_by('order_time').values(*ORDER_FIELDS))
+        # Les changements plus récents que settled seront renvoyés au passage suivant
+        return {
+            'orders': compact_orders(rows),
+            'cursor': encode_cursor({'t': settled.isoformat(), 'id': 0}),
+            'has_more': False,
+        }
+
+    updated_at, order_id = parse_changes_cursor(cursor)
+    rows = list(
+        orders.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=order_id))
+        .filter(updated_at__lte=settled)
+        .order_by('updated_at', 'id')
+        .values('updated_at', *ORDER_FIELDS)[:page_size + 1]
+    )
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if rows:
+        cursor = encode_cursor({'t': rows[-1]['updated_at'].isoformat(), 'id': rows[-1]['id']})
+    return {'orders': compact_orders(rows), 'cursor': cursor, 'has_more': has_more}
+
+
+def touch_order(order_id):
+    """Marque une commande comme modifiée (article ou statut en cuisine changé)"""
+    Order.objects.filter(pk=order_id).update(updated_at=timezone.now())
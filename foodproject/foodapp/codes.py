@@ -0,0 +1,153 @@
+"""
+Codes courts uniques (codes de confirmation des réservations, codes de commande).
+
+Chaque type de code a un compteur en base (CodeSequence). Les numéros sont
+réservés par blocs: un processus incrémente le compteur de BLOCK_SIZE en une
+requête puis distribue le bloc localement, sans autre accès à la base. Chaque
+numéro passe ensuite par une permutation de Feistel (clé propre au compteur,
+tirée à sa création) de l'espace des codes de CODE_LENGTH caractères: deux
+numéros distincts donnent toujours deux codes distincts, qui ne se suivent pas
+et ne révèlent pas le volume de commandes.
+
+Seuls les anciens codes tirés au hasard peuvent encore entrer en collision;
+save_with_code remplace alors le code par le suivant.
+"""
+import hashlib
+import secrets
+import string
+import threading
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import CodeSequence
+
+CODE_ALPHABET = string.digits + string.ascii_uppercase
+CODE_LENGTH = 6
+CODE_SPACE = len(CODE_ALPHABET) ** CODE_LENGTH
+
+FEISTEL_ROUNDS = 4
+HALF_BITS = 16
+HALF_MASK = (1 << HALF_BITS) - 1
+
+BLOCK_SIZE = 100
+
+# Tentatives de sauvegarde quand un code neuf heurte un ancien code aléatoire
+LEGACY_COLLISION_ATTEMPTS = 5
+
+
+class CodeSequenceExhausted(Exception):
+    pass
+
+
+def encode(value):
+    chars = []
+    for _position in range(CODE_LENGTH):
+        value, index = divmod(value, len(CODE_ALPHABET))
+        chars.append(CODE_ALPHABET[index])
+    return ''.join(reversed(chars))
+
+
+def round_keys(key):
+    digest = hashlib.sha256(key.encode()).digest()
+    return [digest[index * 4:index * 4 + 4] for index in range(FEISTEL_ROUNDS)]
+
+
+def feistel(value, keys):
+    """Permutation de [0, 2^(2 * HALF_BITS)) à FEISTEL_ROUNDS tours"""
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for key in keys:
+        mixed = hashlib.blake2b(right.to_bytes(2, 'big'), key=key, digest_size=2).digest()
+        left, right = right, left ^ (int.from_bytes(mixed, 'big') & HALF_MASK)
+    return (left << HALF_BITS) | right
+
+
+def permute(value, keys):
+    """
+    Permutation de [0, CODE_SPACE): la permutation sur 32 bits est réappliquée
+    jusqu'à retomber dans l'espace des codes (« cycle walking »)
+    """
+    value = feistel(value, keys)
+    while value >= CODE_SPACE:
+        value = feistel(value, keys)
+    return value
+
+
+class CodeAllocator:
+    """Distribue les codes d'un compteur, réservés par blocs"""
+
+    def __init__(self, name, block_size=BLOCK_SIZE):
+        self.name = name
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._keys = None
+
+    def _reserve(self, size):
+        """Incrémente le compteur en base; renvoie (premier numéro, clés de la permutation)"""
+        with transaction.atomic():
+            updated = CodeSequence.objects.filter(name=self.name).update(next_value=F('next_value') + size)
+            if not updated:
+                try:
+                    with transaction.atomic():
+                        CodeSequence.objects.create(name=self.name, next_value=size, key=secrets.token_hex(16))
+                except IntegrityError:
+                    # Compteur créé en parallèle par un autre processus
+                    CodeSequence.objects.filter(name=self.name).update(next_value=F('next_value') + size)
+            end, key = CodeSequence.objects.filter(name=self.name).values_list('next_value', 'key').get()
+        if end > CODE_SPACE:
+            raise CodeSequenceExhausted(f"Plus de codes disponibles pour « {self.name} »")
+        return end - size, round_keys(key)
+
+    def _store(self, start, end, keys):
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end, self._keys = start, end, keys
+
+    def allocate(self, count):
+        """Renvoie count codes inédits (imports en masse: un seul accès à la base)"""
+        with self._lock:
+            taken = min(count, self._end - self._next)
+            numbers = list(range(self._next, self._next + taken))
+            self._next += taken
+            keys = self._keys
+        codes = [encode(permute(number, keys)) for number in numbers]
+        if len(codes) == count:
+            return codes
+
+        missing = count - len(codes)
+        size = max(missing, self.block_size)
+        start, keys = self._reserve(size)
+        codes.extend(encode(permute(number, keys)) for number in range(start, start + missing))
+        if size > missing:
+            # Le reste du bloc n'est utilisable qu'une fois la réservation validée:
+            # une transaction annulée rendrait ces numéros au compteur
+            transaction.on_commit(lambda: self._store(start + missing, start + size, keys))
+        return codes
+
+    def next(self):
+        return self.allocate(1)[0]
+
+
+reservation_codes = CodeAllocator('reservation', block_size=20)
+order_codes = CodeAllocator('order')
+
+
+def save_with_code(instance, field, allocator, save, *args, **kwargs):
+    """
+    Sauvegarde instance en lui attribuant un code s'il n'en a pas. Un code qui
+    heurte un ancien code aléatoire est remplacé par le suivant.
+    """
+    if getattr(instance, field):
+        return save(*args, **kwargs)
+    for attempt in range(LEGACY_COLLISION_ATTEMPTS):
+        setattr(instance, field, allocator.next())
+        try:
+            with transaction.atomic():
+                return save(*args, **kwargs)
+        except IntegrityError:
+            taken = type(instance)._default_manager.filter(**{field: getattr(instance, field)}).exists()
+            if not taken or attempt == LEGACY_COLLISION_ATTEMPTS - 1:
+                setattr(instance, field, None)
+                raise
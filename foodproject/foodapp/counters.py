@@ -0,0 +1,153 @@
+"""
+Compteurs globaux du tableau de bord principal (PlatformCounters).
+
+Une seule ligne, lue en une requête par le tableau de bord, est tenue à jour
+par incréments (F expressions) depuis les signaux de Restaurant, Dish, City
+et User (voir signals.py). Les mises à jour en masse via QuerySet.update()
+ne déclenchent pas de signaux: reconcile_platform_counters() recompte tout,
+depuis les actions de l'admin concernées et la commande périodique
+``reconcile_platform_counters``.
+"""
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import City, Dish, PlatformCounters, Restaurant
+
+COUNTERS_PK = 1
+
+DISH_TYPE_COUNTERS = {
+    Dish.SWEET: 'sweet_dishes',
+    Dish.SALTY: 'salty_dishes',
+    Dish.DRINK: 'drink_dishes',
+}
+
+
+def restaurant_contribution(restaurant):
+    return {'restaurants': 1, 'open_restaurants': int(bool(restaurant.is_open))}
+
+
+def dish_contribution(dish):
+    contribution = {'dishes': 1, 'vegetarian_dishes': int(bool(dish.is_vegetarian))}
+    if dish.type in DISH_TYPE_COUNTERS:
+        contribution[DISH_TYPE_COUNTERS[dish.type]] = 1
+    return contribution
+
+
+def city_contribution(city):
+    return {'cities': 1}
+
+
+def user_contribution(user):
+    return {'users': 1, 'staff_users': int(bool(user.is_staff))}
+
+
+CONTRIBUTIONS = {
+    Restaurant: restaurant_contribution,
+    Dish: dish_contribution,
+    City: city_contribution,
+    User: user_contribution,
+}
+
+
+# Champs lus par chaque contribution
+CONTRIBUTION_FIELDS = {
+    Restaurant: ('is_open',),
+    Dish: ('is_vegetarian', 'type'),
+    City: (),
+    User: ('is_staff',),
+}
+
+
+def loaded_contribution(model, instance):
+    """
+    Contribution d'une instance chargée, ou None si un champ compté a été
+    différé (.only()/.defer()): le lire relancerait une requête par instance
+    """
+    if CONTRIBUTION_FIELDS[model] and instance.get_deferred_fields() & set(CONTRIBUTION_FIELDS[model]):
+        return None
+    return CONTRIBUTIONS[model](instance)
+
+
+def stored_contribution(model, pk):
+    """Contribution de la ligne enregistrée en base ({} si elle n'existe pas)"""
+    instance = model._base_manager.only(*CONTRIBUTION_FIELDS[model]).filter(pk=pk).first()
+    return CONTRIBUTIONS[model](instance) if instance is not None else {}
+
+
+def counters_delta(old, new):
+    """Différence entre deux contributions (dictionnaires éventuellement vides)"""
+    return {field: new.get(field, 0) - old.get(field, 0) for field in set(old) | set(new)}
+
+
+def apply_counters_delta(delta):
+    """Applique atomiquement des incréments à la ligne des compteurs"""
+    delta = {field: value for field, value in delta.items() if value}
+    if not delta:
+        return
+    updated = PlatformCounters.objects.filter(pk=COUNTERS_PK).update(
+        updated_at=timezone.now(),
+        **{field: F(field) + value for field, value in delta.items()}
+    )
+    if not updated:
+        # Première utilisation: la ligne est créée à partir des tables
+        reconcile_platform_counters()
+
+
+def count_platform():
+    """Compteurs recalculés à partir des tables (quatre requêtes)"""
+    counts = Restaurant.objects.aggregate(
+        restaurants=Count('id'),
+        open_restaurants=Count('id', filter=Q(is_open=True)),
+    )
+    counts.update(Dish.objects.aggregate(
+        dishes=Count('id'),
+        vegetarian_dishes=Count('id', filter=Q(is_vegetarian=True)),
+        **{field: Count('id', filter=Q(type=dish_type)) for dish_type, field in DISH_TYPE_COUNTERS.items()}
+    ))
+    counts['cities'] = City.objects.count()
+    counts.update(User.objects.aggregate(
+        users=Count('id'),
+        staff_users=Count('id', filter=Q(is_staff=True)),
+    ))
+    return counts
+
+
+def reconcile_platform_counters():
+    """
+    Recompte tout et remplace la ligne des compteurs; renvoie les écarts
+    corrigés {compteur: (ancienne valeur, nouvelle valeur)}
+    """
+    with transaction.atomic():
+        # Écriture avant le comptage: elle verrouille la ligne (ou toute la base sous
+        # SQLite, où select_for_update() n'a pas d'effet) jusqu'à la fin de la
+        # transaction, et un incrément concurrent attend la fin du recomptage au lieu
+        # d'être écrasé par celui-ci
+        touched = PlatformCounters.objects.filter(pk=COUNTERS_PK).update(updated_at=timezone.now())
+        row = PlatformCounters.objects.filter(pk=COUNTERS_PK).first() if touched else None
+        counts = count_platform()
+        if row is None:
+            try:
+                with transaction.atomic():
+                    PlatformCounters.objects.create(pk=COUNTERS_PK, **counts)
+            except IntegrityError:
+                # Ligne créée en parallèle par un autre recomptage
+                pass
+            return {field: (None, value) for field, value in counts.items()}
+        drift = {
+            field: (getattr(row, field), value)
+            for field, value in counts.items()
+            if getattr(row, field) != value
+        }
+        PlatformCounters.objects.filter(pk=COUNTERS_PK).update(updated_at=timezone.now(), **counts)
+    return drift
+
+
+def platform_counters():
+    """Ligne des compteurs, créée si besoin"""
+    row = PlatformCounters.objects.filter(pk=COUNTERS_PK).first()
+    if row is None:
+        reconcile_platform_counters()
+        row = PlatformCounters.objects.get(pk=COUNTERS_PK)
+    return row
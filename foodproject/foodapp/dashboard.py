@@ -0,0 +1,123 @@
+"""
+Données des tableaux de bord des comptes restaurants.
+
+Les compteurs de réservations par statut sont calculés en un seul
+aggregate() et gardés en cache par restaurant, sous une clé versionnée; les
+signaux de Reservation (et les actions en masse de l'admin) changent la
+version après chaque modification. La liste des réservations est parcourue
+par pages, par clé (date, heure, id) comme la liste des plats (voir
+dish_sorting.py).
+"""
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_time
+
+from .dish_sorting import decode_cursor, encode_cursor
+from .models import Order, Reservation
+
+DASHBOARD_CACHE_TIMEOUT = 60 * 10
+
+RESERVATION_PAGE_SIZE = 25
+
+RECENT_ORDERS = 5
+
+
+def summary_version_key(restaurant_id):
+    return f'dashboard:reservations:{restaurant_id}:version'
+
+
+def summary_version(restaurant_id):
+    """Version courante des compteurs du restaurant, changée à chaque invalidation"""
+    key = summary_version_key(restaurant_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def reservation_summary(restaurant_id):
+    """Nombre de réservations du restaurant, au total et par statut"""
+    # Version lue avant le calcul: une réservation enregistrée pendant le calcul
+    # change la version, et le résultat périmé est rangé sous l'ancienne clé
+    key = f'dashboard:reservations:{restaurant_id}:v{summary_version(restaurant_id)}'
+    summary = cache.get(key)
+    if summary is None:
+        summary = Reservation.objects.filter(restaurant_id=restaurant_id).aggregate(
+            total=Count('id'),
+            **{
+                status: Count('id', filter=Q(status=status))
+                for status, _label in Reservation.STATUS_CHOICES
+            }
+        )
+        cache.set(key, summary, DASHBOARD_CACHE_TIMEOUT)
+    return summary
+
+
+def invalidate_reservation_summary(restaurant_id):
+    # Nouvelle version plutôt qu'une suppression: un calcul en cours ne peut pas
+    # remettre en cache des compteurs antérieurs à la modification
+    cache.set(summary_version_key(restaurant_id), time.time_ns(), None)
+
+
+def reservation_page(reservations, cursor=None, page_size=RESERVATION_PAGE_SIZE):
+    """
+    Renvoie (réservations de la page, curseur de la page suivante ou None),
+    les plus récentes d'abord. reservations est un QuerySet déjà filtré.
+    """
+    reservations = reservations.order_by('-date', '-time', '-id')
+    position = decode_cursor(cursor)
+    if position:
+        date, time = parse_date(str(position.get('d'))), parse_time(str(position.get('t')))
+        if date is not None and time is not None and isinstance(position.get('id'), int):
+            reservations = reservations.filter(
+                Q(date__lt=date)
+                | Q(date=date, time__lt=time)
+                | Q(date=date, time=time, id__lt=position['id'])
+            )
+
+    page = list(reservations[:page_size + 1])
+    if len(page) <= page_size:
+        return page, None
+    page = page[:page_size]
+    last = page[-1]
+    return page, encode_cursor({'d': last.date.isoformat(), 't': last.time.isoformat(), 'id': last.id})
+
+
+def restaurant_dashboard_context(restaurant, params):
+    """Contexte commun aux tableaux de bord restaurant (params: request.GET)"""
+    status_filter = params.get('status') or None
+    date_filter = params.get('date') or None
+
+    reservations = Reservation.objects.filter(restaurant=restaurant)
+    if status_filter:
+        reservations = reservations.filter(status=status_filter)
+    if date_filter:
+        date = parse_date(date_filter)
+        reservations = reservations.filter(date=date) if date else reservations.none()
+    page, next_cursor = reservation_page(reservations, params.get('cursor'))
+
+    summary = reservation_summary(restaurant.id)
+    today = timezone.localdate()
+
+    return {
+        'restaurant': restaurant,
+        'reservations': page,
+        'next_cursor': next_cursor,
+        'is_first_page': not params.get('cursor'),
+        'today_reservations': Reservation.objects.filter(restaurant=restaurant, date=today).order_by('time'),
+        'total_reservations': summary['total'],
+        'pending_reservations': summary[Reservation.STATUS_PENDING],
+        'confirmed_reservations': summary[Reservation.STATUS_CONFIRMED],
+        'canceled_reservations': summary[Reservation.STATUS_CANCELED],
+        'completed_reservations': summary[Reservation.STATUS_COMPLETED],
+        'status_filter': status_filter,
+        'date_filter': date_filter,
+        'recent_orders': Order.objects.filter(
+            restaurant=restaurant,
+            status__in=[Order.STATUS_NEW, Order.STATUS_PREPARING, Order.STATUS_READY]
+        ).order_by('-order_time')[:RECENT_ORDERS],
+    }
@@ -0,0 +1,338 @@
+"""
+Index de facettes des plats.
+
+Les attributs filtrables de chaque plat (drapeaux santé/régime, type, gamme de
+prix, origine, ville, restaurant, catégorie) sont chargés en une seule requête
+dans des tableaux NumPy: un masque de bits par plat pour les drapeaux et un code
+entier par facette catégorielle. Une combinaison de filtres se résout alors en
+quelques opérations vectorisées, sans requête SQL, et les compteurs de facettes
+s'obtiennent avec np.bincount.
+
+L'index est propre au processus. Il est invalidé par les signaux de Dish (voir
+signals.py) et reconstruit paresseusement au prochain accès, ainsi que dans
+les autres processus dès que la version du catalogue change (catalog_cache.py):
+les pages mises en cache sous une version sont donc construites avec l'index
+de cette version. DISH_INDEX_TTL (secondes) borne en plus sa durée de vie, pour
+les mises à jour en masse qui ne passent pas par les signaux.
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+
+from .catalog_cache import catalog_version
+from .models import Dish
+
+# Drapeaux booléens de Dish, un bit chacun (l'ordre fixe la position du bit)
+FLAG_FIELDS = [
+    'is_vegetarian',
+    'is_vegan',
+    'has_sugar',
+    'has_cholesterol',
+    'has_gluten',
+    'has_lactose',
+    'has_nuts',
+    'is_diabetic_friendly',
+    'is_low_calorie',
+    'is_tourist_recommended',
+    'is_admin_created',
+]
+FLAG_BITS = {field: np.uint16(1 << position) for position, field in enumerate(FLAG_FIELDS)}
+
+# Facettes à vocabulaire fixe (champ, valeurs possibles)
+CHOICE_FACETS = {
+    'type': [value for value, _label in Dish.TYPE_CHOICES],
+    'price_range': [value for value, _label in Dish.PRICE_RANGE_CHOICES],
+    'origin': [value for value, _label in Dish.ORIGIN_CHOICES],
+}
+
+# Facettes clés étrangères (facette, champ); 0 représente une valeur nulle
+FOREIGN_KEY_FACETS = {
+    'city': 'city_id',
+    'restaurant': 'restaurant_id',
+    'category': 'category_id',
+}
+
+# Paramètres de l'interface (liste des plats, DishFilterForm) -> filtres de l'index
+DIETARY_FILTERS = {
+    'vegetarian': 'is_vegetarian',
+    'vegan': 'is_vegan',
+}
+HEALTH_FILTERS = {
+    'gluten_free': ('exclude', 'has_gluten'),
+    'lactose_free': ('exclude', 'has_lactose'),
+    'nut_free': ('exclude', 'has_nuts'),
+    'sugar_free': ('exclude', 'has_sugar'),
+    'diabetic_friendly': ('require', 'is_diabetic_friendly'),
+    'low_calorie': ('require', 'is_low_calorie'),
+}
+HEALTH_CHECKBOXES = {
+    'bad_for_cholesterol': 'has_cholesterol',
+    'bad_for_sugar': 'has_sugar',
+    'bad_for_lactose': 'has_lactose',
+}
+PRICE_PARAMS = {
+    'low': Dish.PRICE_LOW,
+    'medium': Dish.PRICE_MEDIUM,
+    'high': Dish.PRICE_HIGH,
+}
+
+TRUE_VALUES = ('1', 'true', 'on', 'yes')
+
+# Au-delà de ce nombre de plats retenus, un QuerySet est filtré par la clause
+# WHERE équivalente plutôt que par la liste de leurs identifiants
+MAX_ID_FILTER = 1000
+
+
+def accepted_values(accepted):
+    """Valeurs acceptées d'une facette (None si la facette ne filtre pas)"""
+    if accepted in (None, '', []):
+        return None
+    if not isinstance(accepted, (list, tuple, set)):
+        return [accepted]
+    return accepted
+
+
+def foreign_key_values(values):
+    """Identifiants entiers d'une facette clé étrangère (les valeurs invalides sont ignorées)"""
+    keys = []
+    for value in values:
+        try:
+            keys.append(int(value))
+        except (TypeError, ValueError):
+            continue
+    return keys
+
+
+class DishFacetIndex:
+    """Index en mémoire des facettes de tous les plats"""
+
+    def __init__(self, rows):
+        rows = list(rows)
+        size = len(rows)
+        self.size = size
+        self.ids = np.fromiter((row['id'] for row in rows), dtype=np.int64, count=size)
+
+        flags = np.zeros(size, dtype=np.uint16)
+        for field, bit in FLAG_BITS.items():
+            flags |= np.fromiter((bool(row[field]) for row in rows), dtype=bool, count=size) * bit
+        self.flags = flags
+
+        # Facettes catégorielles: code = position dans le vocabulaire, -1 si inconnue
+        self.codes = {}
+        for facet, values in CHOICE_FACETS.items():
+            lookup = {value: code for code, value in enumerate(values)}
+            self.codes[facet] = np.fromiter(
+                (lookup.get(row[facet], -1) for row in rows), dtype=np.int8, count=size
+            )
+        # Facettes clés étrangères: codes denses (indices dans self.keys[facet])
+        self.keys = {}
+        for facet, field in FOREIGN_KEY_FACETS.items():
+            values = np.fromiter((row[field] or 0 for row in rows), dtype=np.int64, count=size)
+            self.keys[facet], codes = np.unique(values, return_inverse=True)
+            self.codes[facet] = codes.astype(np.int32)
+
+    @classmethod
+    def build(cls):
+        fields = ['id'] + FLAG_FIELDS + list(CHOICE_FACETS) + list(FOREIGN_KEY_FACETS.values())
+        return cls(Dish.objects.order_by('id').values(*fields).iterator(chunk_size=5000))
+
+    def match(self, require=(), exclude=(), **facets):
+        """
+        Masque booléen des plats correspondant aux filtres.
+
+        require/exclude: drapeaux qui doivent être vrais / faux.
+        facets: valeur ou liste de valeurs acceptées par facette
+        (type, price_range, origin, city, restaurant, category).
+        """
+        mask = np.ones(self.size, dtype=bool)
+
+        required = np.uint16(sum(int(FLAG_BITS[field]) for field in set(require)))
+        excluded = np.uint16(sum(int(FLAG_BITS[field]) for field in set(exclude)))
+        if required:
+            mask &= (self.flags & required) == required
+        if excluded:
+            mask &= (self.flags & excluded) == 0
+
+        for facet, accepted in facets.items():
+            accepted = accepted_values(accepted)
+            if accepted is not None:
+                mask &= self._facet_mask(facet, self._facet_codes(facet, accepted))
+        return mask
+
+    def _facet_mask(self, facet, accepted_codes):
+        codes = self.codes[facet]
+        if len(accepted_codes) <= 4:
+            # Quelques comparaisons vectorisées sont plus rapides qu'une indirection
+            facet_mask = np.zeros(self.size, dtype=bool)
+            for code in accepted_codes:
+                facet_mask |= codes == code
+            return facet_mask
+        # Table de correspondance code -> accepté (le dernier élément couvre le code -1)
+        size = len(CHOICE_FACETS[facet]) if facet in CHOICE_FACETS else len(self.keys[facet])
+        lookup = np.zeros(size + 1, dtype=bool)
+        lookup[accepted_codes] = True
+        return lookup.take(codes)
+
+    def _facet_codes(self, facet, values):
+        if facet in CHOICE_FACETS:
+            vocabulary = CHOICE_FACETS[facet]
+            return [vocabulary.index(value) for value in values if value in vocabulary]
+        keys = self.keys[facet]
+        codes = []
+        for value in foreign_key_values(values):
+            code = int(np.searchsorted(keys, value))
+            if code < len(keys) and keys[code] == value:
+                codes.append(code)
+        return codes
+
+    def matching_ids(self, mask):
+        """Identifiants (triés) des plats du masque"""
+        return self.ids[mask]
+
+    def facet_counts(self, mask):
+        """Nombre de plats du masque par valeur de chaque facette et par drapeau"""
+        selected = np.flatnonzero(mask)
+        flags = self.flags.take(selected)
+        counts = {
+            'total': len(selected),
+            'flags': {field: int(np.count_nonzero(flags & bit)) for field, bit in FLAG_BITS.items()},
+        }
+        for facet, values in CHOICE_FACETS.items():
+            codes = self.codes[facet].take(selected)
+            totals = np.bincount(codes[codes >= 0], minlength=len(values))
+            counts[facet] = {value: int(totals[code]) for code, value in enumerate(values)}
+        for facet in FOREIGN_KEY_FACETS:
+            keys = self.keys[facet]
+            totals = np.bincount(self.codes[facet].take(selected), minlength=len(keys))
+            counts[facet] = {
+                int(key): int(total) for key, total in zip(keys, totals) if key and total
+            }
+        return counts
+
+
+_lock = threading.Lock()
+# (index, version du catalogue à sa construction, date de construction)
+_state = None
+
+
+def is_current(state, version, ttl):
+    index, built_version, built_at = state or (None, None, 0.0)
+    return index is not None and built_version == version and (not ttl or time.monotonic() - built_at < ttl)
+
+
+def get_dish_index():
+    """
+    Renvoie l'index courant, reconstruit s'il a été invalidé, si la version du
+    catalogue a changé (modification faite dans un autre processus) ou s'il a expiré
+    """
+    global _state
+    ttl = getattr(settings, 'DISH_INDEX_TTL', 300)
+    # Version lue avant la construction: une modification concurrente la change à nouveau
+    version = catalog_version()
+    state = _state
+    if is_current(state, version, ttl):
+        return state[0]
+    with _lock:
+        if not is_current(_state, version, ttl):
+            _state = (DishFacetIndex.build(), version, time.monotonic())
+        return _state[0]
+
+
+def invalidate_dish_index():
+    """Force la reconstruction de l'index au prochain accès"""
+    global _state
+    with _lock:
+        _state = None
+
+
+def dish_filters_q(filters):
+    """Condition ORM équivalente à DishFacetIndex.match(**filters)"""
+    condition = Q()
+    for field in filters.get('require', ()):
+        condition &= Q(**{field: True})
+    for field in filters.get('exclude', ()):
+        # Une valeur nulle compte comme fausse, comme dans l'index
+        condition &= ~Q(**{field: True})
+    for facet, accepted in filters.items():
+        accepted = None if facet in ('require', 'exclude') else accepted_values(accepted)
+        if accepted is None:
+            continue
+        if facet in CHOICE_FACETS:
+            condition &= Q(**{f'{facet}__in': [value for value in accepted if value in CHOICE_FACETS[facet]]})
+            continue
+        field = FOREIGN_KEY_FACETS[facet]
+        keys = foreign_key_values(accepted)
+        facet_condition = Q(**{f'{field}__in': [key for key in keys if key]})
+        if 0 in keys:
+            # 0 représente une valeur nulle dans l'index
+            facet_condition |= Q(**{f'{field}__isnull': True})
+        condition &= facet_condition
+    return condition
+
+
+def filter_dishes(dishes, dish_index, mask, filters):
+    """
+    Applique les filtres à un QuerySet de Dish: par identifiants quand l'index
+    en retient peu, sinon par la clause WHERE équivalente (une liste de milliers
+    de paramètres serait plus lente que le filtre SQL lui-même)
+    """
+    if not filters:
+        return dishes
+    if np.count_nonzero(mask) <= MAX_ID_FILTER:
+        return dishes.filter(id__in=dish_index.matching_ids(mask).tolist())
+    return dishes.filter(dish_filters_q(filters))
+
+
+def dish_filters_from_params(params):
+    """
+    Traduit les paramètres GET de la liste des plats / de l'API en arguments
+    de DishFacetIndex.match(). Accepte à la fois les noms du gabarit
+    (dish_type, price, dietary, health_issues) et ceux de DishFilterForm.
+    """
+    require = set()
+    exclude = set()
+    filters = {}
+
+    dish_type = params.get('type') or params.get('dish_type')
+    if dish_type:
+        filters['type'] = dish_type
+
+    price_ranges = params.getlist('price_range') if hasattr(params, 'getlist') else params.get('price_range')
+    if params.get('price') in PRICE_PARAMS:
+        price_ranges = list(price_ranges or []) + [PRICE_PARAMS[params['price']]]
+    if price_ranges:
+        filters['price_range'] = price_ranges
+
+    for facet in ('origin', 'city', 'restaurant', 'category'):
+        if params.get(facet):
+            filters[facet] = params.get(facet)
+
+    dietary = params.get('dietary')
+    if dietary in DIETARY_FILTERS:
+        require.add(DIETARY_FILTERS[dietary])
+
+    health = params.get('health_issues')
+    if health in HEALTH_FILTERS:
+        mode, field = HEALTH_FILTERS[health]
+        (require if mode == 'require' else exclude).add(field)
+
+    for param, field in HEALTH_CHECKBOXES.items():
+        if str(params.get(param, '')).lower() in TRUE_VALUES:
+            exclude.add(field)
+
+    # Drapeaux passés directement (ex: ?is_vegan=1&has_gluten=0)
+    for field in FLAG_FIELDS:
+        value = str(params.get(field, '')).lower()
+        if value in TRUE_VALUES:
+            require.add(field)
+        elif value in ('0', 'false', 'no'):
+            exclude.add(field)
+
+    if require:
+        filters['require'] = sorted(require)
+    if exclude:
+        filters['exclude'] = sorted(exclude)
+    return filters
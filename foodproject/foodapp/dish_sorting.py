@@ -0,0 +1,157 @@
+"""
+Tri et pagination de la liste des plats.
+
+Chaque tri correspond à un ORDER BY SQL (champ, id) couvert par un index de
+Dish; les pages sont parcourues par clé (« keyset »): le curseur contient les
+valeurs de tri du dernier plat affiché et la page suivante est lue avec un
+WHERE sur ces valeurs, sans OFFSET ni matérialisation du catalogue.
+
+Le module natif cpp_modules.food_processor n'est utilisé que si
+DISH_NATIVE_SORT est activé (voir la commande ``benchmark_dish_sort``).
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+
+from .models import Dish
+
+try:
+    from cpp_modules.food_processor import fast_sort_dishes
+except ImportError:
+    fast_sort_dishes = None
+
+# Tri -> (champ, décroissant)
+DISH_SORTS = {
+    'name': ('name', False),
+    'price_asc': ('price_rank', False),
+    'price_desc': ('price_rank', True),
+    'calories': ('calories', False),
+    'newest': ('created_at', True),
+}
+DEFAULT_SORT = 'name'
+
+# Tris pris en charge par le module natif
+NATIVE_SORTS = ('name', 'price_asc', 'price_desc')
+
+DISH_PAGE_SIZE = 24
+
+
+def sort_field(sort_by):
+    return DISH_SORTS.get(sort_by, DISH_SORTS[DEFAULT_SORT])
+
+
+def sort_ordering(sort_by):
+    """Clauses ORDER BY d'un tri (les valeurs nulles en dernier)"""
+    field, descending = sort_field(sort_by)
+    if Dish._meta.get_field(field).null:
+        if descending:
+            return [F(field).desc(nulls_last=True), '-id']
+        return [F(field).asc(nulls_last=True), 'id']
+    if descending:
+        return [f'-{field}', '-id']
+    return [field, 'id']
+
+
+def encode_cursor(data):
+    raw = json.dumps(data, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Décode un curseur; renvoie None s'il est absent ou invalide"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def keyset_filter(sort_by, cursor):
+    """Condition WHERE sélectionnant les plats situés après le curseur"""
+    field, descending = sort_field(sort_by)
+    model_field = Dish._meta.get_field(field)
+    value = model_field.to_python(cursor['v']) if cursor['v'] is not None else None
+    pk = int(cursor['id'])
+    after = 'lt' if descending else 'gt'
+
+    if value is None:
+        # Les valeurs nulles sont en dernier: continuer parmi elles
+        return Q(**{f'{field}__isnull': True, f'id__{after}': pk})
+    condition = Q(**{f'{field}__{after}': value}) | Q(**{field: value, f'id__{after}': pk})
+    if model_field.null:
+        condition |= Q(**{f'{field}__isnull': True})
+    return condition
+
+
+def dish_page(dishes, sort_by, cursor=None, page_size=DISH_PAGE_SIZE):
+    """
+    Renvoie (plats de la page, curseur de la page suivante ou None).
+    dishes est un QuerySet de Dish déjà filtré.
+    """
+    if use_native_sort(sort_by):
+        return native_dish_page(dishes, sort_by, cursor, page_size)
+    return sql_dish_page(dishes, sort_by, cursor, page_size)
+
+
+def sql_dish_page(dishes, sort_by, cursor=None, page_size=DISH_PAGE_SIZE):
+    """Variante de dish_page triée et paginée en SQL (curseur = valeurs de tri)"""
+    dishes = dishes.order_by(*sort_ordering(sort_by))
+    position = decode_cursor(cursor)
+    if position and 'id' in position and 'v' in position:
+        try:
+            dishes = dishes.filter(keyset_filter(sort_by, position))
+        except (ValueError, TypeError, ValidationError):
+            # Curseur invalide: repartir de la première page
+            pass
+
+    page = list(dishes[:page_size + 1])
+    if len(page) <= page_size:
+        return page, None
+    page = page[:page_size]
+    last = page[-1]
+    field, _descending = sort_field(sort_by)
+    return page, encode_cursor({'v': getattr(last, field), 'id': last.id})
+
+
+def use_native_sort(sort_by):
+    return (
+        fast_sort_dishes is not None
+        and getattr(settings, 'DISH_NATIVE_SORT', False)
+        and sort_by in NATIVE_SORTS
+    )
+
+
+def native_sorted_ids(dishes, sort_by):
+    """Identifiants des plats triés par le module natif"""
+    dishes_data = [
+        {
+            'id': dish['id'],
+            'name': dish['name'],
+            'price_range': dish['price_range'],
+            'type': dish['type'],
+            'city_id': dish['city_id'] or 0,
+        }
+        for dish in dishes.values('id', 'name', 'price_range', 'type', 'city_id')
+    ]
+    return [dish['id'] for dish in fast_sort_dishes(dishes_data, sort_by)]
+
+
+def native_dish_page(dishes, sort_by, cursor=None, page_size=DISH_PAGE_SIZE):
+    """Variante de dish_page triée par le module natif (curseur = position)"""
+    position = decode_cursor(cursor) or {}
+    offset = position.get('offset', 0) if isinstance(position.get('offset'), int) else 0
+
+    dish_ids = native_sorted_ids(dishes, sort_by)
+    page_ids = dish_ids[offset:offset + page_size]
+    dishes_by_id = dishes.in_bulk(page_ids)
+    page = [dishes_by_id[dish_id] for dish_id in page_ids if dish_id in dishes_by_id]
+
+    next_offset = offset + page_size
+    next_cursor = encode_cursor({'offset': next_offset}) if next_offset < len(dish_ids) else None
+    return page, next_cursor
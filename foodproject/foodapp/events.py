@@ -0,0 +1,267 @@
+"""
+Diffusion en direct des changements de commandes (tableau des commandes en cours).
+
+Les signaux de Order, KitchenOrderStatus et OrderItem publient ici, après
+validation de la transaction, des événements par restaurant: commande créée,
+changement de statut, changement de statut en cuisine, article prêt. Les flux
+SSE du tableau des commandes (sse.py) et les écrans de cuisine en WebSocket
+(kitchen.py) s'abonnent aux événements de leur restaurant.
+
+Chaque restaurant garde ses EVENT_BUFFER_SIZE derniers événements. Leur jeton
+de reprise (« <processus>-<numéro> ») est envoyé comme identifiant SSE: un
+client reconnecté reçoit seulement les événements manqués. Un jeton qui ne
+peut plus être repris (événements sortis du tampon, autre processus ou
+redémarrage) donne un état complet des commandes en cours (active_orders),
+envoyé en « snapshot » par le flux SSE et les écrans de cuisine.
+
+La diffusion est propre au processus: avec plusieurs workers ASGI, un flux ne
+voit que les changements faits par son propre processus.
+"""
+import asyncio
+import secrets
+import threading
+from collections import defaultdict, deque
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+from django.db.models import Prefetch
+
+from .models import KitchenOrderStatus, Order, OrderItem
+
+EVENT_BUFFER_SIZE = 500
+
+ACTIVE_STATUSES = [Order.STATUS_NEW, Order.STATUS_PREPARING, Order.STATUS_READY]
+
+# Identifie ce processus dans les jetons de reprise
+EPOCH = secrets.token_hex(4)
+
+
+class RestaurantEvents:
+    """Derniers événements d'un restaurant et abonnés en attente"""
+
+    def __init__(self):
+        self.events = deque(maxlen=EVENT_BUFFER_SIZE)
+        # Numéro du dernier événement sorti du tampon
+        self.evicted = 0
+        self.subscribers = set()
+
+
+_lock = threading.Lock()
+_restaurants = defaultdict(RestaurantEvents)
+_last_id = 0
+
+
+def token(event_id):
+    return f'{EPOCH}-{event_id}'
+
+
+def parse_token(value):
+    """Numéro d'événement d'un jeton de ce processus, None sinon"""
+    epoch, _sep, event_id = (value or '').partition('-')
+    if epoch != EPOCH or not event_id.isdigit():
+        return None
+    return int(event_id)
+
+
+def current_token():
+    """Jeton de l'instant présent (page rendue à partir d'un état lu en base)"""
+    with _lock:
+        return token(_last_id)
+
+
+def publish(restaurant_id, event_type, data):
+    """Publie un événement; appelable depuis n'importe quel thread"""
+    global _last_id
+    with _lock:
+        _last_id += 1
+        restaurant = _restaurants[restaurant_id]
+        if len(restaurant.events) == restaurant.events.maxlen:
+            restaurant.evicted = restaurant.events[0][0]
+        restaurant.events.append((_last_id, event_type, data))
+        subscribers = list(restaurant.subscribers)
+    for subscriber in subscribers:
+        subscriber.notify()
+
+
+class Subscription:
+    """Abonnement d'un flux (coroutine) aux événements d'un restaurant"""
+
+    def __init__(self, restaurant_id, last_id):
+        self.restaurant_id = restaurant_id
+        self.last_id = last_id
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+
+    def __enter__(self):
+        with _lock:
+            _restaurants[self.restaurant_id].subscribers.add(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        with _lock:
+            _restaurants[self.restaurant_id].subscribers.discard(self)
+
+    def notify(self):
+        try:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+        except RuntimeError:
+            # Boucle fermée: le flux est terminé
+            pass
+
+    def pending(self):
+        """Événements [(jeton, type, données)] publiés depuis le dernier lu; None s'il en manque"""
+        with _lock:
+            restaurant = _restaurants[self.restaurant_id]
+            if self.last_id < restaurant.evicted:
+                return None
+            events = [event for event in restaurant.events if event[0] > self.last_id]
+        if events:
+            self.last_id = events[-1][0]
+        return [(token(event_id), event_type, data) for event_id, event_type, data in events]
+
+    def resume_token(self):
+        """Jeton de reprise de la position de l'abonnement"""
+        return token(self.last_id)
+
+    def skip_pending(self):
+        """Ignore les événements publiés jusqu'ici (état relu en base)"""
+        with _lock:
+            self.last_id = _last_id
+
+    async def next_events(self, timeout):
+        """Attend au plus timeout secondes de nouveaux événements ([] à l'expiration)"""
+        self.wakeup.clear()
+        events = self.pending()
+        if events != []:
+            return events
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        return self.pending()
+
+
+def subscribe(restaurant_id, resume_token=None):
+    """
+    Abonnement à partir d'un jeton de reprise; None si le jeton ne peut pas
+    être repris (le client doit recharger la liste). Sans jeton, seuls les
+    événements à venir sont reçus.
+    """
+    if resume_token is None:
+        with _lock:
+            return Subscription(restaurant_id, _last_id)
+    last_id = parse_token(resume_token)
+    if last_id is None:
+        return None
+    return Subscription(restaurant_id, last_id)
+
+
+# ---------------------------------------------------------------------------
+# Événements des commandes
+# ---------------------------------------------------------------------------
+
+def order_data(order, items=None):
+    """
+    Données d'une commande pour le tableau et les écrans de cuisine; sans
+    items (articles préchargés), les articles sont lus en une requête
+    """
+    if items is None:
+        items = order.items.select_related('dish')
+    return {
+        'id': order.id,
+        'order_code': order.order_code,
+        'status': order.status,
+        'status_display': order.get_status_display(),
+        'customer_name': order.customer_name or '',
+        'table_number': order.table_number or '',
+        'is_takeaway': order.is_takeaway,
+        'total_amount': str(order.total_amount),
+        'order_time': order.order_time.isoformat() if order.order_time else None,
+        'notes': order.notes,
+        'special_instructions': order.special_instructions,
+        'items': [
+            {
+                'id': item.id, 'name': item.dish.name, 'quantity': item.quantity, 'price': str(item.price),
+                'notes': item.notes, 'is_completed': item.is_completed,
+            }
+            for item in items
+        ],
+    }
+
+
+def kitchen_data(kitchen_status):
+    """Statut en cuisine d'une commande (None: pas encore pris en charge)"""
+    if kitchen_status is None:
+        return {'kitchen_status': None, 'kitchen_status_display': '', 'assigned_to': None, 'estimated_prep_time': None}
+    return {
+        'kitchen_status': kitchen_status.status,
+        'kitchen_status_display': kitchen_status.get_status_display(),
+        'assigned_to': kitchen_status.assigned_to_id,
+        'estimated_prep_time': kitchen_status.estimated_prep_time,
+    }
+
+
+def publish_order_created(order):
+    publish(order.restaurant_id, 'order_created', order_data(order))
+
+
+def publish_order_status(order):
+    publish(order.restaurant_id, 'order_status', {
+        'id': order.id,
+        'status': order.status,
+        'status_display': order.get_status_display(),
+    })
+
+
+def publish_kitchen_status(kitchen_status, restaurant_id):
+    publish(restaurant_id, 'kitchen_status', {'id': kitchen_status.order_id, **kitchen_data(kitchen_status)})
+
+
+def publish_item_status(item, restaurant_id):
+    publish(restaurant_id, 'item_status', {
+        'id': item.id,
+        'order_id': item.order_id,
+        'is_completed': item.is_completed,
+    })
+
+
+# ---------------------------------------------------------------------------
+# Commandes en cours (état complet des tableaux et écrans)
+# ---------------------------------------------------------------------------
+
+def database_call(function):
+    """Exécute function dans un thread, en libérant la connexion à la base ensuite"""
+    def call(*args, **kwargs):
+        try:
+            return function(*args, **kwargs)
+        finally:
+            # Appel depuis une transaction en cours (écran HTTP, via async_to_sync):
+            # la connexion appartient à l'appelant
+            if not connection.in_atomic_block:
+                close_old_connections()
+    return sync_to_async(call)
+
+
+def kitchen_status_of(order):
+    try:
+        return order.kitchen_status
+    except KitchenOrderStatus.DoesNotExist:
+        return None
+
+
+def read_active_orders(restaurant_id, order_ids=None):
+    """Commandes en cours avec statut en cuisine et articles (trois requêtes)"""
+    orders = Order.objects.filter(restaurant_id=restaurant_id, status__in=ACTIVE_STATUSES)
+    if order_ids is not None:
+        orders = orders.filter(pk__in=order_ids)
+    orders = orders.select_related('kitchen_status').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('dish').order_by('id'))
+    ).order_by('order_time')
+    return [
+        {**order_data(order, order.items.all()), **kitchen_data(kitchen_status_of(order))}
+        for order in orders
+    ]
+
+
+# Version des flux et WebSockets, exécutée hors de la boucle d'événements
+active_orders = database_call(read_active_orders)
@@ -0,0 +1,119 @@
+"""
+Tirage aléatoire des plats mis en avant (accueil, profil utilisateur).
+
+Plutôt qu'un ORDER BY RANDOM() qui trie toute la table à chaque requête, les
+identifiants des plats éligibles à chaque sélection (tous, végans,
+végétariens, recommandés aux touristes) sont gardés en mémoire, dans des
+tableaux lus en une seule requête. Un tirage uniforme de k plats coûte O(k)
+(random.sample sur les positions), plus une requête in_bulk pour les k plats.
+
+Les tableaux sont relus quand la version du catalogue change (voir
+catalog_cache.py): une modification faite par un autre worker est prise en
+compte dès la requête suivante. Ils sont aussi relus après FEATURED_POOLS_TTL
+secondes, pour les modifications en masse (QuerySet.update()) qui ne changent
+pas la version.
+
+Avec FEATURED_ROTATION_MINUTES > 0, la sélection n'est plus tirée à chaque
+requête: elle change toutes les N minutes. Le tirage est alors fait avec une
+graine dérivée de la sélection, de la version du catalogue et de la période,
+si bien que tous les workers affichent les mêmes plats sans se concerter.
+"""
+import random
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .catalog_cache import catalog_version
+from .models import Dish
+
+# Sélection -> drapeaux requis
+FEATURED_POOLS = {
+    'all': [],
+    'vegan': ['is_vegan'],
+    'vegetarian': ['is_vegetarian'],
+    'tourist': ['is_tourist_recommended'],
+}
+
+
+class FeaturedPools:
+    """Identifiants des plats éligibles à chaque sélection, pour une version du catalogue"""
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.built_at = time.monotonic()
+        rows = list(rows)
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        flags = {
+            field: np.fromiter((bool(row[position]) for row in rows), dtype=bool, count=len(rows))
+            for position, field in enumerate(self.flag_fields(), start=1)
+        }
+        self.pools = {}
+        for name, required in FEATURED_POOLS.items():
+            mask = np.ones(len(rows), dtype=bool)
+            for field in required:
+                mask &= flags[field]
+            self.pools[name] = ids[mask]
+        # Sélections figées par (sélection, nombre, période de rotation)
+        self.rotations = {}
+
+    @staticmethod
+    def flag_fields():
+        return sorted({field for required in FEATURED_POOLS.values() for field in required})
+
+    @classmethod
+    def build(cls, version):
+        return cls(version, Dish.objects.order_by('id').values_list('id', *cls.flag_fields()).iterator(chunk_size=5000))
+
+    def is_current(self, version, ttl):
+        return self.version == version and (not ttl or time.monotonic() - self.built_at < ttl)
+
+    def sample(self, pool, count, rng=random):
+        ids = self.pools[pool]
+        positions = rng.sample(range(len(ids)), min(count, len(ids)))
+        return [int(ids[position]) for position in positions]
+
+    def rotation(self, pool, count, period):
+        key = (pool, count, period)
+        rotations = self.rotations
+        if key not in rotations:
+            # Les sélections des périodes passées sont oubliées
+            rotations = {other: ids for other, ids in rotations.items() if other[2] == period}
+            rotations[key] = self.sample(pool, count, random.Random(f'{pool}:{self.version}:{period}'))
+            self.rotations = rotations
+        return rotations[key]
+
+
+_lock = threading.Lock()
+_pools = None
+
+
+def get_featured_pools():
+    """Tableaux de la version courante du catalogue, relus si elle a changé ou s'ils ont expiré"""
+    global _pools
+    ttl = getattr(settings, 'FEATURED_POOLS_TTL', 300)
+    version = catalog_version()
+    pools = _pools
+    if pools is not None and pools.is_current(version, ttl):
+        return pools
+    with _lock:
+        if _pools is None or not _pools.is_current(version, ttl):
+            _pools = FeaturedPools.build(version)
+        return _pools
+
+
+def featured_dish_ids(pool='all', count=5):
+    """Identifiants de count plats tirés au hasard dans la sélection pool"""
+    pools = get_featured_pools()
+    rotation_minutes = getattr(settings, 'FEATURED_ROTATION_MINUTES', 0)
+    if rotation_minutes:
+        return pools.rotation(pool, count, int(time.time() // (rotation_minutes * 60)))
+    return pools.sample(pool, count)
+
+
+def featured_dishes(pool='all', count=5):
+    """count plats tirés au hasard dans la sélection pool (une requête)"""
+    ids = featured_dish_ids(pool, count)
+    dishes = Dish.objects.in_bulk(ids)
+    return [dishes[pk] for pk in ids if pk in dishes]
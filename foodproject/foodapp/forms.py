@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.models import User
 from .models import City, Dish, Reservation, RestaurantDraft, Category, Restaurant
+from .reservations import is_opening_time, opening_hours_display
 from django.utils import timezone
 import datetime
 
@@ -9,6 +10,8 @@ class DishFilterForm(forms.Form):
         ('name', 'Nom (A-Z)'),
         ('price_asc', 'Prix (croissant)'),
         ('price_desc', 'Prix (décroissant)'),
+        ('calories', 'Calories'),
+        ('newest', 'Nouveautés'),
     ]
     
     sort = forms.ChoiceField(choices=SORT_CHOICES, required=False, label='Trier par')
@@ -17,7 +20,7 @@ class DishFilterForm(forms.Form):
     is_vegetarian = forms.BooleanField(required=False, label="Vegetarian Only")
     is_vegan = forms.BooleanField(required=False, label="Vegan Only")
     price_range = forms.MultipleChoiceField(
-        choices=Dish.price_range.field.choices,
+        choices=Dish.PRICE_RANGE_CHOICES,
         required=False,
         widget=forms.CheckboxSelectMultiple,
         label="Price Range"
@@ -107,14 +110,9 @@ class ReservationForm(forms.ModelForm):
         if date == timezone.now().date() and time < timezone.now().time():
             raise forms.ValidationError("Vous ne pouvez pas réserver pour une heure déjà passée.")
         
-        # Vérifier que l'heure est dans les créneaux acceptables (exemple: 12h-14h30 et 19h-22h30)
-        lunch_start = datetime.time(12, 0)
-        lunch_end = datetime.time(14, 30)
-        dinner_start = datetime.time(19, 0)
-        dinner_end = datetime.time(22, 30)
-        
-        if not ((lunch_start <= time <= lunch_end) or (dinner_start <= time <= dinner_end)):
-            raise forms.ValidationError("Veuillez choisir une heure pendant les services: 12h-14h30 ou 19h-22h30.")
+        # Vérifier que l'heure est dans les services du restaurant (RESERVATION_OPENING_HOURS)
+        if not is_opening_time(time):
+            raise forms.ValidationError(f"Veuillez choisir une heure pendant les services: {opening_hours_display()}.")
         
         return time
     
@@ -173,14 +171,9 @@ class ReservationModifyForm(forms.ModelForm):
         if date == timezone.now().date() and time < timezone.now().time():
             raise forms.ValidationError("Vous ne pouvez pas réserver pour une heure déjà passée.")
         
-        # Vérifier que l'heure est dans les créneaux acceptables
-        lunch_start = datetime.time(12, 0)
-        lunch_end = datetime.time(14, 30)
-        dinner_start = datetime.time(19, 0)
-        dinner_end = datetime.time(22, 30)
-        
-        if not ((lunch_start <= time <= lunch_end) or (dinner_start <= time <= dinner_end)):
-            raise forms.ValidationError("Veuillez choisir une heure pendant les services: 12h-14h30 ou 19h-22h30.")
+        # Vérifier que l'heure est dans les services du restaurant (RESERVATION_OPENING_HOURS)
+        if not is_opening_time(time):
+            raise forms.ValidationError(f"Veuillez choisir une heure pendant les services: {opening_hours_display()}.")
         
         return time
 
@@ -0,0 +1,271 @@
+"""
+Écrans de cuisine en WebSocket.
+
+Application ASGI montée par foodproject/asgi.py sur SOCKET_PATH. Les messages
+sont en JSON.
+
+Serveur vers écran:
+- {"type": "snapshot", "station", "orders": [...]}: commandes en cours
+  (nouvelles, en préparation, prêtes) du poste, à la connexion, au changement
+  de poste et après un retard trop important;
+- {"type": "deltas", "deltas": [...]}: changements depuis le dernier envoi,
+  chacun de type "order", "order_status", "kitchen_status", "item_status" ou
+  "order_removed";
+- {"type": "error", "message"}.
+
+Écran vers serveur:
+- {"type": "tick", "item_id", "completed"}: article prêt (OrderItem.is_completed);
+- {"type": "kitchen_status", "order_id", "status", "assigned_to"}: statut en
+  cuisine de la commande et poste qui la prépare (assigned_to facultatif);
+- {"type": "station", "station"}: poste affiché (null: toute la cuisine).
+
+Un écran de poste (?station=<id d'utilisateur>) n'affiche que les commandes
+attribuées à ce poste (KitchenOrderStatus.assigned_to) et celles qui ne sont
+encore attribuées à personne.
+
+Contre-pression: chaque écran lit les événements du restaurant (events.py) à
+son rythme, un envoi après l'autre, sans file propre. Les événements accumulés
+pendant un envoi lent sont fusionnés (un delta par commande et par article);
+un écran trop en retard (événements sortis du tampon) reçoit un nouveau snapshot.
+
+Sans WebSocket (runserver, WSGI), la page interroge display_state par HTTP
+(vue kitchen_orders): mêmes commandes, réponse toujours en snapshot.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs, urlparse
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import DatabaseError, transaction
+
+from .events import (
+    ACTIVE_STATUSES, active_orders, database_call, kitchen_data, kitchen_status_of, read_active_orders, subscribe,
+)
+from .models import KitchenOrderStatus, Order, OrderItem
+from .sse import restaurant_for
+
+SOCKET_PATH = '/ws/kitchen/'
+
+# Statut de la commande correspondant à chaque statut en cuisine
+ORDER_STATUS_FOR_KITCHEN = {
+    KitchenOrderStatus.STATUS_QUEUED: Order.STATUS_NEW,
+    KitchenOrderStatus.STATUS_PREPARING: Order.STATUS_PREPARING,
+    KitchenOrderStatus.STATUS_READY: Order.STATUS_READY,
+    KitchenOrderStatus.STATUS_SERVED: Order.STATUS_DELIVERED,
+}
+
+# Attente maximale d'événements avant de relancer la boucle
+WAIT_TIMEOUT = 30
+
+# Code de fermeture d'une connexion refusée
+CLOSE_FORBIDDEN = 4403
+
+UNCHANGED = object()
+
+DATABASE_ERROR_MESSAGE = "Base de données indisponible, réessayez"
+
+
+class KitchenError(ValueError):
+    pass
+
+
+@database_call
+def tick_item(restaurant_id, item_id, completed):
+    item = OrderItem.objects.filter(pk=item_id, order__restaurant_id=restaurant_id).first()
+    if item is None:
+        raise KitchenError("Article introuvable")
+    if item.is_completed != completed:
+        item.is_completed = completed
+        item.save(update_fields=['is_completed'])
+
+
+@database_call
+def set_kitchen_status(restaurant_id, order_id, status=None, assigned_to=UNCHANGED):
+    """Statut en cuisine et poste d'une commande; le statut de la commande suit"""
+    if status is not None and status not in ORDER_STATUS_FOR_KITCHEN:
+        raise KitchenError(f"Statut inconnu: {status}")
+    if assigned_to not in (UNCHANGED, None) and not User.objects.filter(pk=assigned_to).exists():
+        raise KitchenError(f"Poste inconnu: {assigned_to}")
+
+    with transaction.atomic():
+        order = Order.objects.select_for_update().filter(pk=order_id, restaurant_id=restaurant_id).first()
+        if order is None:
+            raise KitchenError("Commande introuvable")
+        kitchen_status = kitchen_status_of(order) or KitchenOrderStatus(order=order)
+        if status is not None:
+            kitchen_status.status = status
+        if assigned_to is not UNCHANGED:
+            kitchen_status.assigned_to_id = assigned_to
+        kitchen_status.save()
+
+        order_status = ORDER_STATUS_FOR_KITCHEN[kitchen_status.status]
+        if order.status != order_status:
+            order.status = order_status
+            order.save()
+
+
+class KitchenDisplay:
+    """Poste affiché par un écran et commandes présentes à l'écran"""
+
+    def __init__(self, restaurant_id, station=None):
+        self.restaurant_id = restaurant_id
+        self.station = station
+        # Commande affichée -> poste attribué
+        self.assigned = {}
+
+    def shows(self, assigned_to):
+        return self.station is None or assigned_to is None or assigned_to == self.station
+
+    def snapshot(self, orders):
+        orders = [order for order in orders if self.shows(order['assigned_to'])]
+        self.assigned = {order['id']: order['assigned_to'] for order in orders}
+        return {'type': 'snapshot', 'station': self.station, 'orders': orders}
+
+    def forget(self, order_id, deltas):
+        self.assigned.pop(order_id, None)
+        for key in [key for key in deltas if key[1] == order_id]:
+            del deltas[key]
+        deltas[('order_removed', order_id)] = {'type': 'order_removed', 'id': order_id}
+
+    def deltas(self, events):
+        """
+        Deltas de l'écran pour une suite d'événements, fusionnés par commande et
+        par article; renvoie aussi les commandes devenues visibles, à charger
+        """
+        deltas = {}
+        to_load = set()
+        for _token, event_type, data in events:
+            order_id = data['order_id'] if event_type == 'item_status' else data['id']
+            if event_type == 'order_created':
+                if data['status'] in ACTIVE_STATUSES:
+                    self.assigned[order_id] = None
+                    deltas[('order', order_id)] = {'type': 'order', 'order': {**data, **kitchen_data(None)}}
+            elif event_type == 'order_status':
+                if order_id not in self.assigned:
+                    continue
+                if data['status'] not in ACTIVE_STATUSES:
+                    self.forget(order_id, deltas)
+                else:
+                    deltas[('order_status', order_id)] = {'type': 'order_status', **data}
+            elif event_type == 'kitchen_status':
+                if not self.shows(data['assigned_to']):
+                    if order_id in self.assigned:
+                        self.forget(order_id, deltas)
+                elif order_id in self.assigned:
+                    self.assigned[order_id] = data['assigned_to']
+                    deltas[('kitchen_status', order_id)] = {'type': 'kitchen_status', **data}
+                else:
+                    # Commande attribuée à ce poste depuis un autre écran
+                    to_load.add(order_id)
+            elif event_type == 'item_status':
+                if order_id in self.assigned:
+                    deltas[('item_status', order_id, data['id'])] = {'type': 'item_status', **data}
+        return deltas, to_load
+
+    async def updates(self, events):
+        """Message de mise à jour de l'écran (None s'il n'y a rien à envoyer)"""
+        deltas, to_load = self.deltas(events)
+        if to_load:
+            for order in await active_orders(self.restaurant_id, to_load):
+                if self.shows(order['assigned_to']):
+                    self.assigned[order['id']] = order['assigned_to']
+                    deltas[('order', order['id'])] = {'type': 'order', 'order': order}
+        if not deltas:
+            return None
+        return {'type': 'deltas', 'deltas': list(deltas.values())}
+
+    async def handle(self, message):
+        """Exécute une commande de l'écran; renvoie un message à lui envoyer ou None"""
+        command = message.get('type')
+        if command == 'tick':
+            await tick_item(self.restaurant_id, int(message['item_id']), bool(message.get('completed', True)))
+        elif command == 'kitchen_status':
+            assigned_to = message['assigned_to'] if 'assigned_to' in message else UNCHANGED
+            if assigned_to not in (UNCHANGED, None):
+                assigned_to = int(assigned_to)
+            await set_kitchen_status(self.restaurant_id, int(message['order_id']), message.get('status'), assigned_to)
+        elif command == 'station':
+            station = message.get('station')
+            self.station = int(station) if station is not None else None
+            return self.snapshot(await active_orders(self.restaurant_id))
+        else:
+            raise KitchenError(f"Message inconnu: {command}")
+        return None
+
+
+def display_state(restaurant_id, station=None, message=None):
+    """Version HTTP de l'écran: exécute la commande message éventuelle, renvoie le snapshot du poste"""
+    display = KitchenDisplay(restaurant_id, station)
+    if message is not None:
+        async_to_sync(display.handle)(message)
+    return display.snapshot(read_active_orders(restaurant_id))
+
+
+def parse_station(query_string):
+    values = parse_qs(query_string.decode('latin-1')).get('station')
+    return int(values[0]) if values and values[0].isdigit() else None
+
+
+def same_origin(headers):
+    # Refuse les connexions ouvertes par les pages d'un autre site avec le cookie de session
+    origin = headers.get('origin')
+    return origin is None or urlparse(origin).netloc == headers.get('host')
+
+
+async def kitchen_socket(scope, receive, send):
+    """Connexion d'un écran de cuisine"""
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+    restaurant_id = await restaurant_for(headers.get('cookie', '')) if same_origin(headers) else None
+    if restaurant_id is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_FORBIDDEN})
+        return
+    await send({'type': 'websocket.accept'})
+
+    async def send_json(message):
+        await send({'type': 'websocket.send', 'text': json.dumps(message)})
+
+    display = KitchenDisplay(restaurant_id, parse_station(scope.get('query_string', b'')))
+    # Abonnement avant la lecture: un changement concurrent arrive ensuite en delta
+    subscription = subscribe(restaurant_id)
+    with subscription:
+        await send_json(display.snapshot(await active_orders(restaurant_id)))
+
+        receiving = asyncio.ensure_future(receive())
+        try:
+            while True:
+                events = asyncio.ensure_future(subscription.next_events(WAIT_TIMEOUT))
+                await asyncio.wait({events, receiving}, return_when=asyncio.FIRST_COMPLETED)
+
+                if receiving.done():
+                    message = receiving.result()
+                    if message['type'] == 'websocket.disconnect':
+                        events.cancel()
+                        return
+                    receiving = asyncio.ensure_future(receive())
+                    try:
+                        reply = await display.handle(json.loads(message.get('text') or '{}'))
+                    except (KeyError, TypeError, ValueError) as e:
+                        reply = {'type': 'error', 'message': str(e)}
+                    except DatabaseError:
+                        # Verrou ou base indisponible: l'écran peut renvoyer sa commande
+                        reply = {'type': 'error', 'message': DATABASE_ERROR_MESSAGE}
+                    if reply is not None:
+                        await send_json(reply)
+
+                if not events.done():
+                    events.cancel()
+                    continue
+                pending = events.result()
+                if pending is None:
+                    # Écran trop en retard: repartir d'un état relu en base
+                    subscription.skip_pending()
+                    await send_json(display.snapshot(await active_orders(restaurant_id)))
+                    continue
+                update = await display.updates(pending)
+                if update is not None:
+                    await send_json(update)
+        finally:
+            receiving.cancel()
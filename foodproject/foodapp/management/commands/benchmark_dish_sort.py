@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodapp.dish_sorting import (
+    DISH_PAGE_SIZE, DISH_SORTS, NATIVE_SORTS, fast_sort_dishes, native_dish_page, sql_dish_page,
+)
+from foodapp.models import Dish
+
+
+class Command(BaseCommand):
+    help = ("Compare le tri SQL par clé et le module natif (cpp_modules) sur la liste "
+            "des plats, pour décider d'activer DISH_NATIVE_SORT")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=5, help='Nombre de pages parcourues par tri')
+        parser.add_argument('--repeat', type=int, default=3, help='Nombre de répétitions (meilleur temps retenu)')
+
+    def handle(self, *args, **options):
+        pages = max(options['pages'], 1)
+        repeat = max(options['repeat'], 1)
+        dishes = Dish.objects.all()
+        self.stdout.write(f"{dishes.count()} plats, {pages} pages de {DISH_PAGE_SIZE}")
+
+        native_wins = []
+        for sort_by in DISH_SORTS:
+            sql_time = self.best_time(sql_dish_page, dishes, sort_by, pages, repeat)
+            line = f"{sort_by:<12} SQL: {sql_time * 1000:8.2f} ms"
+            if fast_sort_dishes is not None and sort_by in NATIVE_SORTS:
+                native_time = self.best_time(native_dish_page, dishes, sort_by, pages, repeat)
+                line += f"   natif: {native_time * 1000:8.2f} ms"
+                if native_time < sql_time:
+                    native_wins.append(sort_by)
+            self.stdout.write(line)
+
+        if fast_sort_dishes is None:
+            self.stdout.write(self.style.WARNING(
+                'Module cpp_modules.food_processor indisponible: le tri SQL est utilisé'
+            ))
+        elif native_wins and len(native_wins) == len(NATIVE_SORTS):
+            self.stdout.write(self.style.SUCCESS(
+                'Le module natif est plus rapide sur tous ses tris: DISH_NATIVE_SORT = True est justifié'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                'Le tri SQL est au moins aussi rapide: laisser DISH_NATIVE_SORT = False'
+            ))
+
+    def best_time(self, page_function, dishes, sort_by, pages, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cursor = None
+            for _page in range(pages):
+                _dishes, cursor = page_function(dishes, sort_by, cursor)
+                if cursor is None:
+                    break
+            timings.append(time.perf_counter() - start)
+        return min(timings)
@@ -0,0 +1,28 @@
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+from foodapp.cache_backends import METRICS, TieredCache, shared_metrics
+
+
+class Command(BaseCommand):
+    help = 'Affiche les compteurs de succès/échecs du cache à deux niveaux (tous les workers)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alias', default='default', help='Alias du cache dans CACHES')
+
+    def handle(self, *args, **options):
+        cache = caches[options['alias']]
+        if not isinstance(cache, TieredCache):
+            self.stdout.write(self.style.WARNING(
+                f"Le cache '{options['alias']}' n'est pas un TieredCache: aucune métrique disponible"
+            ))
+            return
+
+        metrics = shared_metrics(cache.shared)
+        self.stdout.write(f"{'workers':<12} {metrics['workers']}")
+        for metric in METRICS:
+            self.stdout.write(f'{metric:<12} {metrics[metric]}')
+        hit_rate = metrics['hit_rate']
+        self.stdout.write(self.style.SUCCESS(
+            f"Taux de succès: {hit_rate:.1%}" if hit_rate is not None else 'Aucune lecture enregistrée'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from foodapp.models import Dish
+from foodapp.viewed_dishes import prune_dish_views
+
+class Command(BaseCommand):
+    help = 'Supprime les vues (Dish.viewed_by) des plats qui ne sont plus nouveaux'
+
+    def handle(self, *args, **options):
+        # À lancer périodiquement (cron): seules les vues des plats nouveaux servent aux badges
+        deleted = prune_dish_views()
+        self.stdout.write(self.style.SUCCESS(
+            f'{deleted} vue(s) de plats de plus de {Dish.NEW_DISH_DAYS} jours supprimée(s)'
+        ))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from foodapp.models import Restaurant, Order
+from foodapp.stats import rebuild_daily_sales
+import datetime
+
+class Command(BaseCommand):
+    help = 'Reconstruit les agrégats de ventes journalières (DailyRestaurantSales) sur une période'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='from_date', type=str,
+                            help='Premier jour à reconstruire (YYYY-MM-DD), par défaut la première commande')
+        parser.add_argument('--to', dest='to_date', type=str,
+                            help='Dernier jour à reconstruire (YYYY-MM-DD), par défaut aujourd\'hui')
+        parser.add_argument('--restaurant', type=int, action='append',
+                            help='Identifiant du restaurant (répétable), par défaut tous')
+
+    def parse_date(self, value, option):
+        try:
+            return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Date invalide pour {option}: {value} (format attendu YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        restaurants = Restaurant.objects.all().order_by('id')
+        if options['restaurant']:
+            restaurants = restaurants.filter(id__in=options['restaurant'])
+
+        end_date = timezone.localdate()
+        if options['to_date']:
+            end_date = self.parse_date(options['to_date'], '--to')
+
+        start_date = None
+        if options['from_date']:
+            start_date = self.parse_date(options['from_date'], '--from')
+        else:
+            first_order = Order.objects.aggregate(first=Min('order_time'))['first']
+            start_date = timezone.localdate(first_order) if first_order else end_date
+
+        if start_date > end_date:
+            raise CommandError('--from doit être antérieur ou égal à --to')
+
+        total_rows = 0
+        for restaurant in restaurants:
+            rows = rebuild_daily_sales(restaurant, start_date, end_date)
+            total_rows += rows
+            self.stdout.write(f'{restaurant.name}: {rows} jour(s) reconstruit(s)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Agrégats reconstruits du {start_date} au {end_date}: {total_rows} ligne(s)'
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from foodapp.search import SOURCES, get_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte (plats, restaurants, connaissances, forum)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind', action='append', dest='kinds',
+            help=f"Type à réindexer ({', '.join(SOURCES)}); tous par défaut"
+        )
+
+    def handle(self, *args, **options):
+        kinds = options['kinds']
+        unknown = [kind for kind in kinds or [] if kind not in SOURCES]
+        if unknown:
+            raise CommandError(f"Type inconnu: {', '.join(unknown)}")
+
+        count = rebuild_index(kinds)
+        self.stdout.write(self.style.SUCCESS(
+            f'{count} documents indexés ({type(get_backend()).__name__})'
+        ))
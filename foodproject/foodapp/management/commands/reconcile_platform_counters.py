@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from foodapp.counters import reconcile_platform_counters
+
+class Command(BaseCommand):
+    help = 'Recompte les compteurs globaux du tableau de bord (PlatformCounters) et corrige les écarts'
+
+    def handle(self, *args, **options):
+        # À lancer périodiquement (cron): rattrape les mises à jour en masse, sans signaux
+        drift = reconcile_platform_counters()
+        for field, (old, new) in sorted(drift.items()):
+            self.stdout.write(f'{field}: {old} -> {new}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Compteurs recomptés: {len(drift)} écart(s) corrigé(s)'
+        ))
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0024_kitchenorderstatus'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRestaurantSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('orders_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('revenue_salty', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('revenue_sweet', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('revenue_drink', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('payment_cash', models.PositiveIntegerField(default=0)),
+                ('payment_card', models.PositiveIntegerField(default=0)),
+                ('payment_online', models.PositiveIntegerField(default=0)),
+                ('new_count', models.PositiveIntegerField(default=0)),
+                ('preparing_count', models.PositiveIntegerField(default=0)),
+                ('ready_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('cancelled_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='foodapp.restaurant')),
+            ],
+            options={
+                'verbose_name': 'Ventes journalières',
+                'verbose_name_plural': 'Ventes journalières',
+                'ordering': ['-date'],
+                'unique_together': {('restaurant', 'date')},
+            },
+        ),
+    ]
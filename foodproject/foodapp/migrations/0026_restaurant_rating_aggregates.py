@@ -0,0 +1,68 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:26
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    """Calcule les agrégats de notes des restaurants existants (avis publiés)"""
+    Restaurant = apps.get_model('foodapp', 'Restaurant')
+    Review = apps.get_model('foodapp', 'Review')
+
+    rows = Review.objects.filter(is_published=True).values('restaurant_id').annotate(
+        rating_sum=Sum('rating'),
+        rating_count=Count('id'),
+        **{
+            f'rating_{stars}_count': Count('id', filter=Q(rating=stars))
+            for stars in range(1, 6)
+        }
+    ).order_by()
+    for row in rows:
+        restaurant_id = row.pop('restaurant_id')
+        Restaurant.objects.filter(pk=restaurant_id).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0025_dailyrestaurantsales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
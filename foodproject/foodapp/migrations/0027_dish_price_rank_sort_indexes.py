@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:32
+
+from django.db import migrations, models
+
+
+PRICE_RANKS = {'L': 1, 'M': 2, 'H': 3}
+
+
+def backfill_price_rank(apps, schema_editor):
+    """Renseigne le rang de prix des plats existants"""
+    Dish = apps.get_model('foodapp', 'Dish')
+    for price_range, rank in PRICE_RANKS.items():
+        Dish.objects.filter(price_range=price_range).update(price_rank=rank)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0026_restaurant_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dish',
+            name='price_rank',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Dérivé de price_range à la sauvegarde'),
+        ),
+        migrations.AddIndex(
+            model_name='dish',
+            index=models.Index(fields=['name', 'id'], name='dish_name_sort_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dish',
+            index=models.Index(fields=['price_rank', 'id'], name='dish_price_sort_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dish',
+            index=models.Index(fields=['calories', 'id'], name='dish_calories_sort_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dish',
+            index=models.Index(fields=['created_at', 'id'], name='dish_newest_sort_idx'),
+        ),
+        migrations.RunPython(backfill_price_rank, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:05
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """Table FTS5 de la recherche (SQLite uniquement, sinon index en mémoire)"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS foodapp_search_index USING fts5("
+        "kind UNINDEXED, title, body, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS foodapp_search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0027_dish_price_rank_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
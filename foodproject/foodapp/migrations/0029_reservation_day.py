@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0028_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservationDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('bookings', models.PositiveIntegerField(default=0, help_text='Nombre de réservations enregistrées ou modifiées')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservation_days', to='foodapp.restaurant')),
+            ],
+            options={
+                'unique_together': {('restaurant', 'date')},
+            },
+        ),
+    ]
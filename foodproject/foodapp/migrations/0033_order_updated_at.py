@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:42
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_updated_at(apps, schema_editor):
+    """Date de modification des commandes existantes: leur date de commande"""
+    Order = apps.get_model('foodapp', 'Order')
+    Order.objects.update(updated_at=F('order_time'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0032_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'updated_at', 'id'], name='order_changes_idx'),
+        ),
+    ]
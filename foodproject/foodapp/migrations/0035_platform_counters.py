@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0034_reservation_list_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformCounters',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('restaurants', models.IntegerField(default=0)),
+                ('open_restaurants', models.IntegerField(default=0)),
+                ('dishes', models.IntegerField(default=0)),
+                ('vegetarian_dishes', models.IntegerField(default=0)),
+                ('sweet_dishes', models.IntegerField(default=0)),
+                ('salty_dishes', models.IntegerField(default=0)),
+                ('drink_dishes', models.IntegerField(default=0)),
+                ('cities', models.IntegerField(default=0)),
+                ('users', models.IntegerField(default=0)),
+                ('staff_users', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Compteurs de la plateforme',
+                'verbose_name_plural': 'Compteurs de la plateforme',
+            },
+        ),
+    ]
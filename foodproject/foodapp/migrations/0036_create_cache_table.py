@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:40
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    """Table du cache partagé quand CACHE_BACKEND='db' (défaut, voir settings.py)"""
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0035_platform_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:10
+
+from django.db import migrations
+
+
+def clear_search_index(apps, schema_editor):
+    """
+    Documents normalisés avec l'ancienne règle (élisions et traits d'union
+    supprimés au lieu de séparer les mots): l'index vide est reconstruit au
+    premier usage
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DELETE FROM foodapp_search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0036_create_cache_table'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0037_refold_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='idempotency_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
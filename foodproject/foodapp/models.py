@@ -4,6 +4,7 @@ from django.utils.html import mark_safe
 from django.utils import timezone
 import datetime
 import uuid
+from decimal import Decimal
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -61,6 +62,20 @@ class Dish(models.Model):
         (PRICE_HIGH, 'Premium'),
     ]
     
+    # Rang numérique de la gamme de prix, pour trier en SQL (L < M < H)
+    PRICE_RANKS = {
+        PRICE_LOW: 1,
+        PRICE_MEDIUM: 2,
+        PRICE_HIGH: 3,
+    }
+    
+    # Prix unitaire facturé (DH) selon la gamme de prix
+    UNIT_PRICES = {
+        PRICE_LOW: Decimal('5.99'),
+        PRICE_MEDIUM: Decimal('10.99'),
+        PRICE_HIGH: Decimal('15.99'),
+    }
+    
     # Origine culinaire
     MOROCCAN = 'moroccan'
     INTERNATIONAL = 'international'
@@ -84,6 +99,8 @@ class Dish(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField()
     price_range = models.CharField(max_length=10)
+    price_rank = models.PositiveSmallIntegerField(default=0, editable=False,
+                                                  help_text="Dérivé de price_range à la sauvegarde")
     image = models.ImageField(upload_to='dishes/', null=True, blank=True)
     type = models.CharField(max_length=20, choices=TYPE_CHOICES)
     is_vegetarian = models.BooleanField(default=False)
@@ -103,6 +120,7 @@ class Dish(models.Model):
                                      help_text="Notes culturelles sur ce plat pour les touristes")
     
     # Champ pour la date de création du plat (pour l'icône "Nouveau")
+    NEW_DISH_DAYS = 3
     created_at = models.DateTimeField(auto_now_add=True)
     
     # Champ pour suivre les utilisateurs qui ont vu ce plat
@@ -112,21 +130,44 @@ class Dish(models.Model):
     is_admin_created = models.BooleanField(default=True, 
                                          help_text="Indique si le plat a été créé via le panneau d'administration Django")
     
+    class Meta:
+        indexes = [
+            # Index des tris de la liste des plats (pagination par clé)
+            models.Index(fields=['name', 'id'], name='dish_name_sort_idx'),
+            models.Index(fields=['price_rank', 'id'], name='dish_price_sort_idx'),
+            models.Index(fields=['calories', 'id'], name='dish_calories_sort_idx'),
+            models.Index(fields=['created_at', 'id'], name='dish_newest_sort_idx'),
+        ]
+    
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        self.price_rank = self.PRICE_RANKS.get(self.price_range, 0)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'price_range' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'price_rank'}
+        super().save(*args, **kwargs)
+    
+    @property
+    def unit_price(self):
+        return self.UNIT_PRICES.get(self.price_range, self.UNIT_PRICES[self.PRICE_HIGH])
+    
     def is_new(self):
-        """Vérifie si le plat est considéré comme nouveau (moins de 3 jours)"""
-        three_days_ago = timezone.now() - datetime.timedelta(days=3)
-        return self.created_at >= three_days_ago
+        """Vérifie si le plat est considéré comme nouveau (moins de NEW_DISH_DAYS jours)"""
+        new_since = timezone.now() - datetime.timedelta(days=self.NEW_DISH_DAYS)
+        return self.created_at >= new_since
     
     def mark_as_viewed(self, user):
-        """Marque le plat comme vu par l'utilisateur"""
-        if user.is_authenticated:
-            self.viewed_by.add(user)
+        """Marque le plat comme vu par l'utilisateur (et met à jour son cache, voir viewed_dishes.py)"""
+        from .viewed_dishes import mark_dish_viewed
+        mark_dish_viewed(user, self)
     
     def is_new_for_user(self, user):
-        """Vérifie si le plat est nouveau pour cet utilisateur spécifique"""
+        """
+        Vérifie si le plat est nouveau pour cet utilisateur spécifique (une
+        requête; pour une liste de plats, voir viewed_dishes.set_new_badges)
+        """
         if not user.is_authenticated:
             return self.is_new()
         return self.is_new() and not self.viewed_by.filter(id=user.id).exists()
@@ -151,6 +192,15 @@ class Restaurant(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     capacity = models.PositiveIntegerField(default=50, help_text="Capacité maximale du restaurant")
+    
+    # Agrégats des avis publiés, tenus à jour par les signaux de Review
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"{self.name} - {self.city.name}"
@@ -164,10 +214,39 @@ class Restaurant(models.Model):
     
     @property
     def rating(self):
-        reviews = self.reviews.all()
-        if not reviews:
+        """Note moyenne des avis publiés"""
+        if not self.rating_count:
             return 0
-        return sum(review.rating for review in reviews) / reviews.count()
+        return self.rating_sum / self.rating_count
+    
+    @property
+    def reviews_count(self):
+        return self.rating_count
+    
+    @property
+    def ratings_histogram(self):
+        """Nombre d'avis publiés par nombre d'étoiles, de 5 à 1"""
+        return {stars: getattr(self, f'rating_{stars}_count') for stars in range(5, 0, -1)}
+    
+    @staticmethod
+    def rating_aggregates(reviews):
+        """Calcule les agrégats de notes d'un ensemble d'avis en une seule requête"""
+        aggregates = reviews.aggregate(
+            rating_sum=models.Sum('rating'),
+            rating_count=models.Count('id'),
+            **{
+                f'rating_{stars}_count': models.Count('id', filter=models.Q(rating=stars))
+                for stars in range(1, 6)
+            }
+        )
+        return {field: value or 0 for field, value in aggregates.items()}
+    
+    def refresh_rating_aggregates(self):
+        """Recalcule les agrégats de notes à partir des avis publiés"""
+        aggregates = self.rating_aggregates(self.reviews.filter(is_published=True))
+        Restaurant.objects.filter(pk=self.pk).update(**aggregates)
+        for field, value in aggregates.items():
+            setattr(self, field, value)
 
 class RestaurantAccount(models.Model):
     ACCOUNT_TYPE_CHOICES = [
@@ -316,19 +395,19 @@ class Reservation(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     confirmation_code = models.CharField(max_length=10, unique=True, blank=True, null=True)
     
+    class Meta:
+        indexes = [
+            # Liste des réservations d'un restaurant par pages (voir dashboard.py)
+            models.Index(fields=['restaurant', 'date', 'time', 'id'], name='reservation_list_idx'),
+        ]
+    
     def __str__(self):
         return f"Réservation de {self.name} au {self.restaurant.name} le {self.date} à {self.time}"
     
     def save(self, *args, **kwargs):
-        # Générer un code de confirmation si nécessaire
-        if not self.confirmation_code:
-            import random
-            import string
-            # Générer un code aléatoire de 10 caractères alphanumériques
-            self.confirmation_code = ''.join(
-                random.choices(string.ascii_uppercase + string.digits, k=6)
-            )
-        super().save(*args, **kwargs)
+        # Attribuer un code de confirmation unique si nécessaire (voir codes.py)
+        from .codes import reservation_codes, save_with_code
+        save_with_code(self, 'confirmation_code', reservation_codes, super().save, *args, **kwargs)
     
     @property
     def is_past(self):
@@ -360,6 +439,31 @@ class Reservation(models.Model):
         )
         return (reservation_datetime - now).total_seconds() > 24 * 3600
 
+class CodeSequence(models.Model):
+    """Compteur d'un générateur de codes courts uniques (voir codes.py)"""
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField(default=0)
+    key = models.CharField(max_length=64, help_text="Clé de la permutation des numéros en codes")
+    
+    def __str__(self):
+        return f"{self.name} ({self.next_value})"
+
+class ReservationDay(models.Model):
+    """
+    Ligne de verrou des réservations d'un restaurant pour une journée: toute
+    prise de place la met à jour dans sa transaction, ce qui sérialise les
+    vérifications de capacité concurrentes (voir reservations.book_reservation)
+    """
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='reservation_days')
+    date = models.DateField()
+    bookings = models.PositiveIntegerField(default=0, help_text="Nombre de réservations enregistrées ou modifiées")
+    
+    def __str__(self):
+        return f"Réservations de {self.restaurant.name} le {self.date}"
+    
+    class Meta:
+        unique_together = ('restaurant', 'date')
+
 class Review(models.Model):
     RATING_CHOICES = [
         (1, '1 étoile'),
@@ -785,6 +889,7 @@ class UserSubscription(models.Model):
 
 class Order(models.Model):
     """Modèle pour les commandes au restaurant"""
+    STATUS_CART = 'cart'
     STATUS_NEW = 'new'
     STATUS_PREPARING = 'preparing'
     STATUS_READY = 'ready'
@@ -793,6 +898,7 @@ class Order(models.Model):
     STATUS_PAID = 'paid'
     
     STATUS_CHOICES = [
+        (STATUS_CART, 'Panier'),
         (STATUS_NEW, 'Nouvelle'),
         (STATUS_PREPARING, 'En préparation'),
         (STATUS_READY, 'Prête'),
@@ -821,24 +927,24 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_CHOICES, default=PAYMENT_CASH)
     is_takeaway = models.BooleanField(default=False)
     order_time = models.DateTimeField(auto_now_add=True)
+    # Dernière modification de la commande, de ses articles ou de son statut en cuisine (voir changes.py)
+    updated_at = models.DateTimeField(auto_now=True)
     delivery_time = models.DateTimeField(null=True, blank=True)
     notes = models.TextField(blank=True)
     special_instructions = models.TextField(blank=True)
     order_code = models.CharField(max_length=10, unique=True, blank=True, null=True)
+    # Clé envoyée par la caisse avec chaque ticket, contre les doublons (voir pos.py)
+    idempotency_key = models.CharField(max_length=64, blank=True, null=True)
+    # Empreinte du ticket enregistré sous cette clé: un renvoi différent est refusé
+    idempotency_hash = models.CharField(max_length=64, blank=True, default='')
     
     def __str__(self):
         return f"Commande #{self.id} - {self.restaurant.name} - {self.get_status_display()}"
     
     def save(self, *args, **kwargs):
-        # Générer un code de commande si nécessaire
-        if not self.order_code:
-            import random
-            import string
-            # Générer un code aléatoire de 6 caractères alphanumériques
-            self.order_code = ''.join(
-                random.choices(string.ascii_uppercase + string.digits, k=6)
-            )
-        super().save(*args, **kwargs)
+        # Attribuer un code de commande unique si nécessaire (voir codes.py)
+        from .codes import order_codes, save_with_code
+        save_with_code(self, 'order_code', order_codes, super().save, *args, **kwargs)
     
     @property
     def is_completed(self):
@@ -854,6 +960,25 @@ class Order(models.Model):
             return 0
         diff = self.delivery_time - self.order_time
         return int(diff.total_seconds() / 60)
+    
+    class Meta:
+        constraints = [
+            # Un seul panier ouvert par client et par restaurant (voir cart.py)
+            models.UniqueConstraint(
+                fields=['user', 'restaurant'],
+                condition=models.Q(status='cart'),
+                name='unique_open_cart',
+            ),
+            # Un ticket de caisse renvoyé après une coupure ne crée pas de doublon
+            models.UniqueConstraint(
+                fields=['restaurant', 'idempotency_key'],
+                name='unique_order_idempotency_key',
+            ),
+        ]
+        indexes = [
+            # Changements d'un restaurant depuis un curseur (updated_at, id)
+            models.Index(fields=['restaurant', 'updated_at', 'id'], name='order_changes_idx'),
+        ]
 
 class OrderItem(models.Model):
     """Éléments individuels d'une commande"""
@@ -871,6 +996,65 @@ class OrderItem(models.Model):
     def subtotal(self):
         return self.price * self.quantity
 
+class DailyRestaurantSales(models.Model):
+    """Agrégat journalier des ventes d'un restaurant, tenu à jour à chaque modification de commande"""
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='daily_sales')
+    date = models.DateField()
+    
+    # Commandes et chiffre d'affaires (commandes livrées ou payées)
+    orders_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    # Chiffre d'affaires par type de plat
+    revenue_salty = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    revenue_sweet = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    revenue_drink = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    # Nombre de commandes par mode de paiement
+    payment_cash = models.PositiveIntegerField(default=0)
+    payment_card = models.PositiveIntegerField(default=0)
+    payment_online = models.PositiveIntegerField(default=0)
+    
+    # Nombre de commandes du jour par statut actuel
+    new_count = models.PositiveIntegerField(default=0)
+    preparing_count = models.PositiveIntegerField(default=0)
+    ready_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    cancelled_count = models.PositiveIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Ventes de {self.restaurant.name} le {self.date}"
+    
+    class Meta:
+        verbose_name = "Ventes journalières"
+        verbose_name_plural = "Ventes journalières"
+        unique_together = ('restaurant', 'date')
+        ordering = ['-date']
+
+class PlatformCounters(models.Model):
+    """Compteurs globaux du tableau de bord, tenus à jour par les signaux (une seule ligne, voir counters.py)"""
+    restaurants = models.IntegerField(default=0)
+    open_restaurants = models.IntegerField(default=0)
+    dishes = models.IntegerField(default=0)
+    vegetarian_dishes = models.IntegerField(default=0)
+    sweet_dishes = models.IntegerField(default=0)
+    salty_dishes = models.IntegerField(default=0)
+    drink_dishes = models.IntegerField(default=0)
+    cities = models.IntegerField(default=0)
+    users = models.IntegerField(default=0)
+    staff_users = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Compteurs de la plateforme ({self.updated_at})"
+    
+    class Meta:
+        verbose_name = "Compteurs de la plateforme"
+        verbose_name_plural = "Compteurs de la plateforme"
+
 class ChatSession(models.Model):
     """Model for storing chat sessions"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
@@ -0,0 +1,113 @@
+"""
+Cache des pages publiques du catalogue pour les visiteurs anonymes.
+
+Les pages décorées par cache_anonymous_page (accueil, liste des restaurants,
+liste des plats) sont identiques pour tous les visiteurs anonymes d'une même
+langue: la réponse rendue est mise en cache sous une clé formée du chemin,
+des paramètres non vides triés et de la langue (request.LANGUAGE_CODE, fixée
+par UserLanguageMiddleware). La clé est versionnée par la version du
+catalogue (voir catalog_cache.py) et par période de PAGE_CACHE_TIMEOUT
+secondes.
+
+- Rafraîchissement en arrière-plan (« stale-while-revalidate »): quand une
+  entrée est périmée, un seul worker la reconstruit (single_flight) pendant
+  que les autres servent la copie précédente.
+- Chaque réponse porte un ETag; un navigateur qui le renvoie dans
+  If-None-Match reçoit un 304 sans contenu.
+- Le jeton CSRF de la page (formulaire de langue de base.html) est propre à
+  chaque visiteur: il est remplacé dans la copie en cache par un marqueur, et
+  le marqueur par le jeton du visiteur à chaque envoi.
+- Les utilisateurs connectés, les requêtes autres que GET et les visiteurs
+  ayant des messages en attente passent directement par la vue.
+"""
+import hashlib
+import re
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import urlencode
+
+from .catalog_cache import catalog_version, single_flight
+
+CSRF_PLACEHOLDER = b'__page_cache_csrf_token__'
+
+CSRF_TOKEN_PATTERN = re.compile(rb'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+# Durée pendant laquelle un navigateur peut afficher sa copie en la revalidant
+BROWSER_STALE_SECONDS = 60
+
+
+def cacheable_request(request):
+    if request.method != 'GET' or request.user.is_authenticated:
+        return False
+    # Les messages sont affichés par base.html et propres au visiteur
+    return not len(messages.get_messages(request))
+
+
+def page_key(request):
+    params = sorted((name, value) for name, values in request.GET.lists() for value in values if value)
+    digest = hashlib.md5(f'{request.path}?{urlencode(params)}'.encode()).hexdigest()
+    language = getattr(request, 'LANGUAGE_CODE', settings.LANGUAGE_CODE)
+    return f'catalog:page:{language}:{digest}'
+
+
+def page_entry(response):
+    """Copie en cache d'une réponse (None si elle ne doit pas être partagée)"""
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return None
+    if hasattr(response, 'render'):
+        response.render()
+    content = response.content
+    match = CSRF_TOKEN_PATTERN.search(content)
+    if match:
+        content = content.replace(match.group(1), CSRF_PLACEHOLDER)
+    return {
+        'content': content,
+        'content_type': response['Content-Type'],
+        'etag': f'"{hashlib.md5(content).hexdigest()}"',
+    }
+
+
+def entry_response(request, entry):
+    not_modified = get_conditional_response(request, etag=entry['etag'])
+    if not_modified is not None:
+        response = not_modified
+    else:
+        content = entry['content']
+        if CSRF_PLACEHOLDER in content:
+            content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+        response = HttpResponse(content, content_type=entry['content_type'])
+    response['ETag'] = entry['etag']
+    patch_cache_control(response, private=True, max_age=0, stale_while_revalidate=BROWSER_STALE_SECONDS)
+    # La langue dépend du cookie de langue ou de la session
+    patch_vary_headers(response, ['Cookie', 'Accept-Language'])
+    return response
+
+
+def cache_anonymous_page(view):
+    """Met en cache la page rendue par view pour les visiteurs anonymes"""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        timeout = getattr(settings, 'PAGE_CACHE_TIMEOUT', 300)
+        if not timeout or not cacheable_request(request):
+            return view(request, *args, **kwargs)
+
+        rendered = {}
+
+        def build():
+            response = view(request, *args, **kwargs)
+            rendered['response'] = response
+            # Réponse non partageable: les requêtes suivantes de la version passent par la vue
+            return page_entry(response) or {'bypass': True}
+
+        version = f'{catalog_version()}.{int(time.time() // timeout)}'
+        entry = single_flight(page_key(request), version, build)
+        if entry.get('bypass'):
+            return rendered.get('response') or view(request, *args, **kwargs)
+        return entry_response(request, entry)
+    return wrapped
@@ -0,0 +1,102 @@
+"""
+Commandes saisies à la caisse (POS) des restaurants.
+
+Un ticket complet est créé en une transaction: les plats sont vérifiés contre
+la carte du restaurant en une requête (in_bulk), le total est calculé en un
+passage avec les prix du serveur (Dish.unit_price; les prix envoyés par la
+caisse sont ignorés) et les articles sont insérés par un seul bulk_create.
+
+La caisse joint à chaque ticket une clé d'idempotence (Order.idempotency_key,
+unique par restaurant): un ticket renvoyé après une coupure du Wi-Fi renvoie la
+commande déjà créée au lieu d'en créer une seconde. L'empreinte du ticket
+(Order.idempotency_hash) est enregistrée avec la clé: un ticket modifié puis
+renvoyé sous la même clé est refusé (IdempotencyConflict) plutôt qu'ignoré.
+"""
+import hashlib
+import json
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+
+from .cart import CartError, parse_cart_lines, parse_checkout
+from .models import Dish, Order, OrderItem
+from .transactions import run_with_retries
+
+IDEMPOTENCY_KEY_LENGTH = Order._meta.get_field('idempotency_key').max_length
+
+
+class IdempotencyConflict(CartError):
+    pass
+
+
+def ticket_hash(quantities, fields):
+    """Empreinte d'un ticket normalisé (quantités par plat et champs de la commande)"""
+    payload = json.dumps(
+        {'lines': sorted(quantities.items()), 'fields': fields}, sort_keys=True, separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def parse_ticket(data):
+    """(restaurant, lignes [(plat, quantité)], clé d'idempotence, champs de la commande) d'un ticket"""
+    restaurant_id, fields = parse_checkout(data)
+    lines = parse_cart_lines(data)
+    if not lines or any(quantity <= 0 for _dish_id, quantity in lines):
+        raise CartError("Les quantités du ticket doivent être positives")
+
+    idempotency_key = data.get('idempotency_key') or None
+    if idempotency_key is not None:
+        if not isinstance(idempotency_key, str) or len(idempotency_key) > IDEMPOTENCY_KEY_LENGTH:
+            raise CartError(f"'idempotency_key' doit être un texte de {IDEMPOTENCY_KEY_LENGTH} caractères au plus")
+    return restaurant_id, lines, idempotency_key, fields
+
+
+def create_pos_order(restaurant, lines, idempotency_key=None, **fields):
+    """
+    Crée la commande d'un ticket de caisse. Renvoie (commande, créée); créée
+    vaut False si le ticket avait déjà été enregistré sous cette clé.
+    IdempotencyConflict si la clé a servi pour un autre ticket.
+    """
+    quantities = defaultdict(int)
+    for dish_id, quantity in lines:
+        quantities[dish_id] += quantity
+
+    dishes = Dish.objects.filter(restaurant=restaurant).only('id', 'price_range').in_bulk(list(quantities))
+    unknown = sorted(set(quantities) - set(dishes))
+    if unknown:
+        raise CartError(f"Plats absents de la carte du restaurant: {', '.join(map(str, unknown))}")
+
+    prices = {}
+    total = Decimal('0.00')
+    for dish_id, quantity in quantities.items():
+        prices[dish_id] = dishes[dish_id].unit_price
+        total += prices[dish_id] * quantity
+
+    payload_hash = ticket_hash(quantities, fields) if idempotency_key else ''
+
+    def create():
+        if idempotency_key:
+            existing = Order.objects.filter(restaurant=restaurant, idempotency_key=idempotency_key).first()
+            if existing is not None:
+                # Commandes enregistrées avant les empreintes: pas de comparaison possible
+                if existing.idempotency_hash and existing.idempotency_hash != payload_hash:
+                    raise IdempotencyConflict(
+                        "Ce ticket a déjà été enregistré avant d'être modifié: "
+                        "vérifiez les commandes en cours avant de le renvoyer"
+                    )
+                return existing, False
+        with transaction.atomic():
+            order = Order.objects.create(
+                restaurant=restaurant, status=Order.STATUS_NEW, total_amount=total,
+                idempotency_key=idempotency_key, idempotency_hash=payload_hash, **fields
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, dish_id=dish_id, quantity=quantity, price=prices[dish_id])
+                for dish_id, quantity in quantities.items()
+            ])
+        return order, True
+
+    # Un même ticket envoyé deux fois en parallèle heurte la contrainte d'unicité:
+    # la nouvelle tentative trouve alors la commande du premier envoi
+    return run_with_retries(create, unique=[(Order, ('restaurant', 'idempotency_key'))])
@@ -0,0 +1,286 @@
+"""
+Disponibilité des créneaux de réservation.
+
+Une réservation occupe ses couverts pendant RESERVATION_DURATION_MINUTES à
+partir de son heure. Les réservations actives d'une journée sont chargées en
+une seule requête et converties en occupation minute par minute (sommes
+préfixes d'un tableau de variations): le nombre maximal de couverts occupés
+pendant le repas d'un nouveau client se lit ensuite sans autre requête, pour
+un créneau comme pour toute la grille du jour.
+
+La capacité est celle du restaurant (Restaurant.capacity); les heures
+d'ouverture, le pas des créneaux et les jours de fermeture sont réglés dans
+settings.py (RESERVATION_*).
+
+Le calendrier de disponibilité (occupation maximale de chaque créneau des
+CALENDAR_DAYS prochains jours) est gardé en cache, une entrée compacte par
+jour, et recalculé jour par jour par les signaux de Reservation.
+
+Les prises de place passent par book_reservation: la vérification de capacité
+et l'enregistrement se font dans une transaction qui verrouille la ligne
+ReservationDay du restaurant et du jour. Les repas se chevauchant d'un
+créneau à l'autre, le verrou porte sur la journée plutôt que sur un créneau.
+"""
+import datetime
+import hashlib
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .models import Reservation, ReservationDay
+from .transactions import run_with_retries
+
+# Statuts des réservations qui occupent des places
+ACTIVE_STATUSES = [Reservation.STATUS_PENDING, Reservation.STATUS_CONFIRMED]
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def to_minutes(time):
+    return time.hour * 60 + time.minute
+
+
+def from_minutes(minutes):
+    return datetime.time(minutes // 60, minutes % 60)
+
+
+def opening_periods():
+    """Services [(début, fin)] en minutes depuis minuit"""
+    return [
+        (to_minutes(datetime.datetime.strptime(start, '%H:%M').time()),
+         to_minutes(datetime.datetime.strptime(end, '%H:%M').time()))
+        for start, end in settings.RESERVATION_OPENING_HOURS
+    ]
+
+
+def opening_hours_display():
+    return ' ou '.join(f'{start}-{end}' for start, end in settings.RESERVATION_OPENING_HOURS)
+
+
+def is_open_day(date):
+    return date.weekday() not in settings.RESERVATION_CLOSED_WEEKDAYS
+
+
+def slot_starts():
+    """Débuts des créneaux proposés, en minutes depuis minuit"""
+    step = settings.RESERVATION_SLOT_MINUTES
+    return [minutes for start, end in opening_periods() for minutes in range(start, end, step)]
+
+
+def is_opening_time(time):
+    """Heure comprise dans un service (bornes incluses)"""
+    minutes = to_minutes(time)
+    return any(start <= minutes <= end for start, end in opening_periods())
+
+
+class DayOccupancy:
+    """Occupation d'un restaurant minute par minute sur une journée"""
+
+    def __init__(self, capacity, date, reservations):
+        self.capacity = capacity
+        self.date = date
+        self.duration = settings.RESERVATION_DURATION_MINUTES
+
+        # +guests à l'arrivée, -guests au départ; la somme cumulée donne l'occupation
+        changes = np.zeros(MINUTES_PER_DAY + self.duration, dtype=np.int64)
+        for time, guests in reservations:
+            start = to_minutes(time)
+            changes[start] += guests
+            changes[start + self.duration] -= guests
+        self.occupancy = np.cumsum(changes)
+
+    @classmethod
+    def load(cls, restaurant, date, exclude_reservation_id=None):
+        """Charge les réservations actives du jour en une requête"""
+        reservations = Reservation.objects.filter(restaurant=restaurant, date=date, status__in=ACTIVE_STATUSES)
+        # Exclure une réservation spécifique (utile pour les modifications)
+        if exclude_reservation_id:
+            reservations = reservations.exclude(id=exclude_reservation_id)
+        return cls(restaurant.capacity, date, reservations.values_list('time', 'guests'))
+
+    def peak(self, time):
+        """Nombre maximal de couverts occupés pendant un repas commençant à time"""
+        start = to_minutes(time)
+        return int(self.occupancy[start:start + self.duration].max())
+
+    def peaks(self, starts):
+        """Occupation maximale des fenêtres [début, début + durée) de chaque créneau"""
+        return sliding_window_view(self.occupancy, self.duration)[starts].max(axis=1)
+
+    def remaining(self, time):
+        return max(self.capacity - self.peak(time), 0)
+
+    def is_available(self, time, guests):
+        return is_open_day(self.date) and guests <= self.remaining(time)
+
+    def slots(self, guests=1):
+        """Grille des créneaux du jour: [{'time', 'remaining', 'available'}]"""
+        if not is_open_day(self.date):
+            return []
+        starts = slot_starts()
+        remaining = np.maximum(self.capacity - self.peaks(starts), 0)
+        return [
+            {
+                'time': from_minutes(minutes).strftime('%H:%M'),
+                'remaining': int(places),
+                'available': bool(places >= guests),
+            }
+            for minutes, places in zip(starts, remaining)
+        ]
+
+
+def is_slot_available(restaurant, date, time, guests, exclude_reservation_id=None):
+    """
+    Vérifie si un créneau horaire est disponible pour un restaurant donné
+    """
+    return DayOccupancy.load(restaurant, date, exclude_reservation_id).is_available(time, guests)
+
+
+# ---------------------------------------------------------------------------
+# Calendrier de disponibilité
+# ---------------------------------------------------------------------------
+
+CALENDAR_DAYS = 90
+CALENDAR_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def calendar_key(restaurant_id, date):
+    # La grille des créneaux fait partie de la clé: changer les réglages invalide le calendrier
+    grid = repr((settings.RESERVATION_OPENING_HOURS, settings.RESERVATION_SLOT_MINUTES,
+                 settings.RESERVATION_DURATION_MINUTES))
+    digest = hashlib.md5(grid.encode()).hexdigest()[:8]
+    return f'reservation_calendar:{restaurant_id}:{date.isoformat()}:{digest}'
+
+
+def calendar_days(restaurant_id, dates):
+    """
+    Occupation maximale de chaque créneau pour les dates données, en une requête.
+    Renvoie {date: octets} (un uint16 par créneau), indépendants de la capacité.
+    """
+    reservations = defaultdict(list)
+    rows = Reservation.objects.filter(
+        restaurant_id=restaurant_id, date__in=dates, status__in=ACTIVE_STATUSES
+    ).values_list('date', 'time', 'guests')
+    for date, time, guests in rows:
+        reservations[date].append((time, guests))
+
+    starts = slot_starts()
+    return {
+        date: DayOccupancy(0, date, reservations[date]).peaks(starts).astype(np.uint16).tobytes()
+        for date in dates
+    }
+
+
+def refresh_calendar_day(restaurant_id, date):
+    """Recalcule un jour du calendrier (réservation créée, modifiée ou annulée)"""
+    today = timezone.localdate()
+    if not today <= date < today + datetime.timedelta(days=CALENDAR_DAYS + 1):
+        return
+    cache.set(calendar_key(restaurant_id, date), calendar_days(restaurant_id, [date])[date], CALENDAR_CACHE_TIMEOUT)
+
+
+class AvailabilityCalendar:
+    """Places libres par jour et par créneau (tableau jours x créneaux)"""
+
+    def __init__(self, start_date, starts, remaining):
+        self.start_date = start_date
+        self.starts = starts
+        self.remaining = remaining
+
+    @property
+    def dates(self):
+        return [self.start_date + datetime.timedelta(days=offset) for offset in range(len(self.remaining))]
+
+    def free_slots(self, guests=1):
+        """Masque de bits par jour: bit i levé si le créneau i peut accueillir guests convives"""
+        return [sum(1 << int(index) for index in np.flatnonzero(row >= guests)) for row in self.remaining]
+
+    def available_dates(self, guests=1):
+        return [date for date, free in zip(self.dates, self.free_slots(guests)) if free]
+
+    def as_json(self, guests=1):
+        return {
+            'start': self.start_date.isoformat(),
+            'days': len(self.remaining),
+            'slots': [from_minutes(minutes).strftime('%H:%M') for minutes in self.starts],
+            'guests': guests,
+            'free_slots': self.free_slots(guests),
+            'available_dates': [date.isoformat() for date in self.available_dates(guests)],
+            'remaining': self.remaining.tolist(),
+        }
+
+
+def availability_calendar(restaurant, days=CALENDAR_DAYS):
+    """
+    Calendrier des places libres du restaurant à partir d'aujourd'hui. Les jours
+    absents du cache sont calculés ensemble, en une seule requête.
+    """
+    start_date = timezone.localdate()
+    dates = [start_date + datetime.timedelta(days=offset) for offset in range(days)]
+    keys = {date: calendar_key(restaurant.id, date) for date in dates}
+    cached = cache.get_many(keys.values())
+
+    missing = [date for date in dates if keys[date] not in cached]
+    if missing:
+        fresh = {keys[date]: value for date, value in calendar_days(restaurant.id, missing).items()}
+        cache.set_many(fresh, CALENDAR_CACHE_TIMEOUT)
+        cached.update(fresh)
+
+    starts = slot_starts()
+    peaks = np.frombuffer(b''.join(cached[keys[date]] for date in dates), dtype=np.uint16)
+    remaining = np.maximum(restaurant.capacity - peaks.reshape(len(dates), len(starts)).astype(np.int64), 0)
+
+    # Jours de fermeture et créneaux déjà passés aujourd'hui
+    for row, date in zip(remaining, dates):
+        if not is_open_day(date):
+            row[:] = 0
+    now = timezone.localtime()
+    remaining[0, np.asarray(starts) <= to_minutes(now.time())] = 0
+    return AvailabilityCalendar(start_date, starts, remaining)
+
+
+def get_available_dates(restaurant, days_ahead=30, guests=1):
+    """
+    Renvoie les dates auxquelles il reste au moins un créneau libre dans ce restaurant
+    """
+    return availability_calendar(restaurant, days_ahead).available_dates(guests)
+
+
+# ---------------------------------------------------------------------------
+# Prise de place
+# ---------------------------------------------------------------------------
+
+def lock_day(restaurant, date):
+    """
+    Verrouille les réservations du restaurant pour la journée jusqu'à la fin de
+    la transaction courante. Un UPDATE plutôt qu'un SELECT ... FOR UPDATE: il
+    pose un verrou de ligne sur PostgreSQL/MySQL et le verrou d'écriture sur SQLite.
+    """
+    locked = ReservationDay.objects.filter(restaurant=restaurant, date=date).update(bookings=F('bookings') + 1)
+    if not locked:
+        # Première réservation du jour; une création concurrente lève IntegrityError
+        ReservationDay.objects.create(restaurant=restaurant, date=date, bookings=1)
+
+
+def book_reservation(reservation, exclude_reservation_id=None):
+    """
+    Enregistre reservation si son créneau a encore assez de places.
+    Renvoie False si le créneau est complet.
+    """
+    def book():
+        with transaction.atomic():
+            lock_day(reservation.restaurant, reservation.date)
+            occupancy = DayOccupancy.load(reservation.restaurant, reservation.date, exclude_reservation_id)
+            if not occupancy.is_available(reservation.time, reservation.guests):
+                return False
+            reservation.save()
+            return True
+
+    # Verrou tenu par une autre prise de place ou ligne du jour créée en parallèle
+    return run_with_retries(book, unique=[(ReservationDay, ('restaurant', 'date'))])
@@ -0,0 +1,387 @@
+"""
+Recherche plein texte sur les plats, restaurants, la base de connaissances
+du chatbot et les sujets du forum.
+
+Les textes indexés et les requêtes passent par la même normalisation (fold):
+minuscules, accents supprimés et variantes courantes des transcriptions de
+l'arabe ramenées à une forme unique (tajine/tagine, msemmen/msemen, ...).
+Chaque mot de la requête est cherché par préfixe, ce qui permet la saisie
+progressive.
+
+Deux moteurs d'index:
+- SQLite FTS5 (table virtuelle foodapp_search_index, classement bm25) quand la
+  base est SQLite;
+- sinon un index inversé en mémoire (classement tf-idf), propre au processus
+  et reconstruit après SEARCH_INDEX_TTL secondes.
+
+L'index est mis à jour objet par objet par les signaux (voir signals.py) et
+peut être reconstruit avec la commande ``rebuild_search_index``.
+"""
+import bisect
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+
+from .models import ChatbotKnowledge, Dish, ForumTopic, Restaurant
+
+SEARCH_TABLE = 'foodapp_search_index'
+
+# Poids du titre par rapport au corps du document
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+DEFAULT_LIMIT = 20
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Variantes de transcription ramenées à une forme unique (appliquées après
+# suppression des accents, avant la réduction des lettres doublées). Élisions
+# et traits d'union séparent les mots: « d'agneau » -> « d agneau »
+TRANSLITERATIONS = [
+    (re.compile(r"['’ʿʾ`-]"), ' '),
+    (re.compile(r'ou'), 'u'),
+    (re.compile(r'dj'), 'j'),
+    (re.compile(r'g(?=[ei])'), 'j'),
+    (re.compile(r'q'), 'k'),
+    (re.compile(r'ck'), 'k'),
+    (re.compile(r'(?<=[aeiu])h\b'), ''),
+]
+# Lettres seulement: « 100 » reste « 100 »
+DOUBLED_LETTERS_RE = re.compile(r'([a-z])\1+')
+
+
+def fold(text):
+    """Normalise un texte pour l'index et les requêtes"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = text.replace('œ', 'oe').replace('æ', 'ae')
+    for pattern, replacement in TRANSLITERATIONS:
+        text = pattern.sub(replacement, text)
+    return DOUBLED_LETTERS_RE.sub(r'\1', text)
+
+
+# Dernière lettre d'un mot inachevé dont la transcription dépend de la lettre
+# suivante (ou -> u, dj -> j, ge/gi -> je/ji, ck -> k)
+PREFIX_ENDINGS = {'o': 'u', 'd': 'j', 'g': 'j', 'c': 'k'}
+
+
+def fold_prefix(text):
+    """
+    Formes normalisées possibles d'un début de saisie, chacune préfixe de la
+    forme normalisée des mots qui commencent ainsi: « tag » donne « tag » et
+    « taj » (tagine -> tajine), « co » donne « co » et « cu » (couscous -> cuscus)
+    """
+    prefix = ' '.join(fold(text).split())
+    if not prefix:
+        return []
+    ending = PREFIX_ENDINGS.get(prefix[-1])
+    if ending is None or str(text)[-1].isspace():
+        # Dernier mot terminé (suivi d'un espace): une seule forme
+        return [prefix]
+    return [prefix, prefix[:-1] + ending]
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(fold(text))
+
+
+# ---------------------------------------------------------------------------
+# Documents indexés
+# ---------------------------------------------------------------------------
+
+class SearchSource:
+    """Type d'objet indexé: modèle, code (rowid FTS) et extraction du texte"""
+
+    def __init__(self, kind, code, model, title, body, related=()):
+        self.kind = kind
+        self.code = code
+        self.model = model
+        self.title = title
+        self.body = body
+        self.related = related
+
+    def queryset(self):
+        return self.model.objects.select_related(*self.related)
+
+    def document(self, obj):
+        return fold(self.title(obj)), fold(' '.join(part or '' for part in self.body(obj)))
+
+
+SOURCES = {
+    source.kind: source for source in [
+        SearchSource(
+            'dish', 1, Dish,
+            title=lambda dish: dish.name,
+            body=lambda dish: [dish.description, dish.ingredients, dish.city.name if dish.city else ''],
+            related=['city'],
+        ),
+        SearchSource(
+            'restaurant', 2, Restaurant,
+            title=lambda restaurant: restaurant.name,
+            body=lambda restaurant: [restaurant.description, restaurant.city.name],
+            related=['city'],
+        ),
+        SearchSource(
+            'knowledge', 3, ChatbotKnowledge,
+            title=lambda entry: entry.title,
+            body=lambda entry: [entry.keywords, entry.content, entry.content_fr],
+        ),
+        SearchSource(
+            'forum', 4, ForumTopic,
+            title=lambda topic: topic.title,
+            body=lambda topic: [topic.content],
+        ),
+    ]
+}
+SOURCES_BY_MODEL = {source.model: source for source in SOURCES.values()}
+
+# rowid FTS = id de l'objet * ROWID_FACTOR + code du type
+ROWID_FACTOR = 8
+
+
+def source_for(obj):
+    return SOURCES_BY_MODEL.get(type(obj))
+
+
+# ---------------------------------------------------------------------------
+# Moteur SQLite FTS5
+# ---------------------------------------------------------------------------
+
+class FTS5Backend:
+    """Index SQLite FTS5; les documents sont stockés déjà normalisés"""
+
+    def __init__(self):
+        self._checked = False
+
+    def _ensure_built(self):
+        # Construire l'index au premier usage s'il est vide (déploiement initial)
+        if self._checked:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT 1 FROM {SEARCH_TABLE} LIMIT 1')
+            empty = cursor.fetchone() is None
+        if empty:
+            self.rebuild()
+        self._checked = True
+
+    def index(self, source, obj):
+        title, body = source.document(obj)
+        rowid = obj.pk * ROWID_FACTOR + source.code
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, kind, title, body) VALUES (%s, %s, %s, %s)',
+                [rowid, source.kind, title, body]
+            )
+
+    def remove(self, source, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [pk * ROWID_FACTOR + source.code])
+
+    def rebuild(self, kinds=None):
+        count = 0
+        for source in SOURCES.values():
+            if kinds and source.kind not in kinds:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE kind = %s', [source.kind])
+                rows = []
+                for obj in source.queryset().iterator(chunk_size=2000):
+                    title, body = source.document(obj)
+                    rows.append((obj.pk * ROWID_FACTOR + source.code, source.kind, title, body))
+                    if len(rows) >= 2000:
+                        self._insert_many(cursor, rows)
+                        count += len(rows)
+                        rows = []
+                self._insert_many(cursor, rows)
+                count += len(rows)
+        self._checked = True
+        return count
+
+    def _insert_many(self, cursor, rows):
+        if rows:
+            cursor.executemany(
+                f'INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, kind, title, body) VALUES (%s, %s, %s, %s)',
+                rows
+            )
+
+    def search(self, tokens, kind, limit):
+        self._ensure_built()
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, bm25({SEARCH_TABLE}, 0, {TITLE_WEIGHT}, {BODY_WEIGHT}) AS score '
+                f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND kind = %s '
+                f'ORDER BY score LIMIT %s',
+                [match, kind, limit]
+            )
+            ids = [rowid // ROWID_FACTOR for rowid, _score in cursor.fetchall()]
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND kind = %s',
+                [match, kind]
+            )
+            total = cursor.fetchone()[0]
+        return ids, total
+
+
+# ---------------------------------------------------------------------------
+# Moteur en mémoire
+# ---------------------------------------------------------------------------
+
+class MemoryBackend:
+    """Index inversé en mémoire: mot -> {(type, id): poids}"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._postings = defaultdict(dict)
+        self._documents = {}
+        self._terms = []
+
+    def _ensure_built(self):
+        ttl = getattr(settings, 'SEARCH_INDEX_TTL', 300)
+        if self._built_at is None or (ttl and time.monotonic() - self._built_at >= ttl):
+            self.rebuild()
+
+    def _add(self, key, title, body):
+        weights = defaultdict(float)
+        for token in title.split():
+            weights[token] += TITLE_WEIGHT
+        for token in body.split():
+            weights[token] += BODY_WEIGHT
+        for token, weight in weights.items():
+            if token not in self._postings:
+                bisect.insort(self._terms, token)
+            self._postings[token][key] = weight
+        self._documents[key] = list(weights)
+
+    def _discard(self, key):
+        for token in self._documents.pop(key, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[token]
+                position = bisect.bisect_left(self._terms, token)
+                if position < len(self._terms) and self._terms[position] == token:
+                    del self._terms[position]
+
+    def index(self, source, obj):
+        if self._built_at is None:
+            return
+        title, body = source.document(obj)
+        with self._lock:
+            self._discard((source.kind, obj.pk))
+            self._add((source.kind, obj.pk), ' '.join(TOKEN_RE.findall(title)), ' '.join(TOKEN_RE.findall(body)))
+
+    def remove(self, source, pk):
+        with self._lock:
+            self._discard((source.kind, pk))
+
+    def rebuild(self, kinds=None):
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._documents = {}
+            self._terms = []
+            for source in SOURCES.values():
+                for obj in source.queryset().iterator(chunk_size=2000):
+                    title, body = source.document(obj)
+                    self._add((source.kind, obj.pk), ' '.join(TOKEN_RE.findall(title)),
+                              ' '.join(TOKEN_RE.findall(body)))
+            self._built_at = time.monotonic()
+            return len(self._documents)
+
+    def _prefix_terms(self, prefix):
+        start = bisect.bisect_left(self._terms, prefix)
+        end = bisect.bisect_left(self._terms, prefix + '￿')
+        return self._terms[start:end]
+
+    def search(self, tokens, kind, limit):
+        with self._lock:
+            self._ensure_built()
+            total_documents = max(len(self._documents), 1)
+            scores = None
+            for token in tokens:
+                token_scores = defaultdict(float)
+                for term in self._prefix_terms(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + total_documents / len(postings))
+                    for key, weight in postings.items():
+                        if key[0] == kind:
+                            token_scores[key] += weight * idf
+                if scores is None:
+                    scores = token_scores
+                else:
+                    # Tous les mots de la requête doivent être présents
+                    scores = {key: score + token_scores[key] for key, score in scores.items() if key in token_scores}
+                if not scores:
+                    return [], 0
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0][1]))
+        return [key[1] for key, _score in ranked[:limit]], len(ranked)
+
+
+# ---------------------------------------------------------------------------
+# API
+# ---------------------------------------------------------------------------
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def fts5_available():
+    if connection.vendor != 'sqlite':
+        return False
+    return SEARCH_TABLE in connection.introspection.table_names()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = FTS5Backend() if fts5_available() else MemoryBackend()
+    return _backend
+
+
+def index_object(obj):
+    source = source_for(obj)
+    if source is not None:
+        get_backend().index(source, obj)
+
+
+def remove_object(model, pk):
+    source = SOURCES_BY_MODEL.get(model)
+    if source is not None:
+        get_backend().remove(source, pk)
+
+
+def rebuild_index(kinds=None):
+    """Reconstruit l'index; renvoie le nombre de documents indexés"""
+    return get_backend().rebuild(kinds)
+
+
+def search_objects(query, kinds=None, limit=DEFAULT_LIMIT):
+    """
+    Recherche query dans les types demandés (tous par défaut).
+    Renvoie {type: (objets classés, nombre total de résultats)}.
+    """
+    tokens = tokenize(query)
+    kinds = kinds or list(SOURCES)
+    results = {}
+    for kind in kinds:
+        if not tokens:
+            results[kind] = ([], 0)
+            continue
+        source = SOURCES[kind]
+        ids, total = get_backend().search(tokens, kind, limit)
+        objects = source.queryset().in_bulk(ids)
+        results[kind] = ([objects[pk] for pk in ids if pk in objects], total)
+    return results
@@ -0,0 +1,518 @@
+"""
+Signaux de l'application foodapp.
+
+Les agrégats dénormalisés (ventes journalières, compteurs globaux, notes des
+restaurants) et les index dérivés (facettes des plats, recherche, cache du
+catalogue, calendrier des réservations) sont tenus à jour ici à partir des
+sauvegardes et suppressions de modèles; les changements de commandes y sont
+aussi diffusés au tableau en direct (events.py) et datés pour la
+synchronisation des caisses (changes.py). Les mises à jour en masse via
+QuerySet.update() ne déclenchent pas de signaux: les commandes de
+reconstruction (``rebuild_daily_sales``, ``rebuild_search_index``,
+``reconcile_platform_counters``) ou Restaurant.refresh_rating_aggregates()
+permettent de resynchroniser.
+"""
+from decimal import Decimal
+from operator import attrgetter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .autocomplete import remove_autocomplete, update_autocomplete
+from .catalog_cache import bump_catalog_version
+from .changes import touch_order
+from .counters import CONTRIBUTIONS, apply_counters_delta, counters_delta, loaded_contribution, stored_contribution
+from .dashboard import invalidate_reservation_summary
+from .dish_index import invalidate_dish_index
+from .events import publish_item_status, publish_kitchen_status, publish_order_created, publish_order_status
+from .models import (
+    Category, ChatbotKnowledge, City, Dish, ForumTopic, KitchenOrderStatus, Order, OrderItem, Reservation,
+    Restaurant, Review,
+)
+from .reservations import refresh_calendar_day
+from .search import index_object, remove_object
+from .stats import (
+    REVENUE_STATUSES, sales_day, order_contribution, contribution_delta,
+    order_items_revenue, apply_sales_delta,
+)
+
+
+# ---------------------------------------------------------------------------
+# États mémorisés au chargement (voir LOADED_STATES en fin de module)
+# ---------------------------------------------------------------------------
+
+def remember_loaded_state(sender, instance, attr):
+    """
+    Mémorise l'état d'une instance chargée sous ``attr``. Rien n'est mémorisé
+    si un des champs lus a été différé (.only()/.defer()): le lire relancerait
+    une requête par instance; l'état est relu avant l'écriture
+    (reload_loaded_states)
+    """
+    fields, state = LOADED_STATES[sender][attr]
+    if not instance.pk:
+        setattr(instance, attr, None)
+    elif not instance.get_deferred_fields() & set(fields):
+        setattr(instance, attr, state(instance))
+
+
+# ---------------------------------------------------------------------------
+# Ventes journalières (DailyRestaurantSales)
+# ---------------------------------------------------------------------------
+
+def order_sales_state(order):
+    """État d'une commande utile aux agrégats de ventes"""
+    return {
+        'status': order.status,
+        'total_amount': order.total_amount,
+        'payment_method': order.payment_method,
+    }
+
+
+@receiver(post_init, sender=Order)
+def remember_order_sales_state(sender, instance, **kwargs):
+    # Mémoriser l'état chargé pour calculer les deltas à la sauvegarde
+    remember_loaded_state(sender, instance, '_sales_state')
+
+
+@receiver(post_save, sender=Order)
+def update_daily_sales_on_order_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_state = None if created else getattr(instance, '_sales_state', None)
+    new_state = order_sales_state(instance)
+
+    new = order_contribution(**new_state)
+    old = order_contribution(**old_state) if old_state else {}
+    delta = contribution_delta(old, new)
+
+    # Passage vers / depuis un statut encaissé: (dé)comptabiliser les articles
+    was_counted = bool(old_state) and old_state['status'] in REVENUE_STATUSES
+    is_counted = new_state['status'] in REVENUE_STATUSES
+    if was_counted != is_counted and not created:
+        for field, value in order_items_revenue(instance.pk, 1 if is_counted else -1).items():
+            delta[field] = delta.get(field, 0) + value
+
+    apply_sales_delta(instance.restaurant_id, sales_day(instance.order_time), delta)
+    instance._sales_state = new_state
+
+
+@receiver(post_delete, sender=Order)
+def update_daily_sales_on_order_delete(sender, instance, **kwargs):
+    # Les articles supprimés en cascade sont décomptés par leur propre signal
+    state = getattr(instance, '_sales_state', None) or order_sales_state(instance)
+    delta = contribution_delta(order_contribution(**state), {})
+    apply_sales_delta(instance.restaurant_id, sales_day(instance.order_time), delta)
+
+
+def order_item_sales_state(item):
+    """État d'un article de commande utile aux agrégats de ventes"""
+    return {
+        'dish_id': item.dish_id,
+        'line_total': Decimal(str(item.price or 0)) * item.quantity,
+    }
+
+
+@receiver(post_init, sender=OrderItem)
+def remember_order_item_sales_state(sender, instance, **kwargs):
+    remember_loaded_state(sender, instance, '_sales_state')
+
+
+def apply_order_item_delta(order_id, old_state, new_state):
+    """Répercute la variation d'un article sur le chiffre d'affaires par type de plat"""
+    order = Order.objects.filter(pk=order_id).values('restaurant_id', 'status', 'order_time').first()
+    if order is None or order['status'] not in REVENUE_STATUSES:
+        return
+
+    dish_ids = {state['dish_id'] for state in (old_state, new_state) if state}
+    dish_types = dict(Dish.objects.filter(pk__in=dish_ids).values_list('pk', 'type'))
+
+    delta = {}
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if state and state['dish_id'] in dish_types:
+            field = f"revenue_{dish_types[state['dish_id']]}"
+            delta[field] = delta.get(field, 0) + sign * state['line_total']
+
+    apply_sales_delta(order['restaurant_id'], sales_day(order['order_time']), delta)
+
+
+@receiver(post_save, sender=OrderItem)
+def update_daily_sales_on_item_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_state = None if created else getattr(instance, '_sales_state', None)
+    new_state = order_item_sales_state(instance)
+    apply_order_item_delta(instance.order_id, old_state, new_state)
+    instance._sales_state = new_state
+
+
+@receiver(post_delete, sender=OrderItem)
+def update_daily_sales_on_item_delete(sender, instance, **kwargs):
+    state = getattr(instance, '_sales_state', None) or order_item_sales_state(instance)
+    apply_order_item_delta(instance.order_id, state, None)
+
+
+# ---------------------------------------------------------------------------
+# Compteurs globaux du tableau de bord (counters.py)
+# ---------------------------------------------------------------------------
+
+@receiver(post_init, sender=Restaurant)
+@receiver(post_init, sender=Dish)
+@receiver(post_init, sender=City)
+@receiver(post_init, sender=User)
+def remember_counters_contribution(sender, instance, **kwargs):
+    instance._counters_contribution = loaded_contribution(sender, instance) if instance.pk else None
+
+
+@receiver(pre_save, sender=Restaurant)
+@receiver(pre_save, sender=Dish)
+@receiver(pre_save, sender=City)
+@receiver(pre_save, sender=User)
+@receiver(pre_delete, sender=Restaurant)
+@receiver(pre_delete, sender=Dish)
+@receiver(pre_delete, sender=City)
+@receiver(pre_delete, sender=User)
+def load_counters_contribution(sender, instance, raw=False, **kwargs):
+    # Instance chargée avec des champs différés: contribution relue avant l'écriture
+    if raw or instance._state.adding or getattr(instance, '_counters_contribution', None) is not None:
+        return
+    instance._counters_contribution = stored_contribution(sender, instance.pk)
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_save, sender=Dish)
+@receiver(post_save, sender=City)
+@receiver(post_save, sender=User)
+def update_counters_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = {} if created else getattr(instance, '_counters_contribution', None) or {}
+    new = CONTRIBUTIONS[sender](instance)
+    apply_counters_delta(counters_delta(old, new))
+    instance._counters_contribution = new
+
+
+@receiver(post_delete, sender=Restaurant)
+@receiver(post_delete, sender=Dish)
+@receiver(post_delete, sender=City)
+@receiver(post_delete, sender=User)
+def update_counters_on_delete(sender, instance, **kwargs):
+    old = getattr(instance, '_counters_contribution', None) or {}
+    apply_counters_delta(counters_delta(old, {}))
+
+
+# ---------------------------------------------------------------------------
+# Notes des restaurants (Restaurant.rating_*)
+# ---------------------------------------------------------------------------
+
+def review_rating_state(review):
+    """Contribution d'un avis aux agrégats de notes (None s'il n'est pas publié)"""
+    if not review.is_published or not review.rating:
+        return None
+    return (review.restaurant_id, review.rating)
+
+
+def apply_rating_delta(state, sign):
+    """Ajoute (sign=1) ou retire (sign=-1) un avis des agrégats de son restaurant"""
+    if state is None:
+        return
+    restaurant_id, rating = state
+    Restaurant.objects.filter(pk=restaurant_id).update(
+        rating_sum=F('rating_sum') + sign * rating,
+        rating_count=F('rating_count') + sign,
+        **{f'rating_{rating}_count': F(f'rating_{rating}_count') + sign}
+    )
+
+
+@receiver(post_init, sender=Review)
+def remember_review_rating_state(sender, instance, **kwargs):
+    remember_loaded_state(sender, instance, '_rating_state')
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_review_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_state = None if created else getattr(instance, '_rating_state', None)
+    new_state = review_rating_state(instance)
+    if old_state != new_state:
+        apply_rating_delta(old_state, -1)
+        apply_rating_delta(new_state, 1)
+    instance._rating_state = new_state
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_review_delete(sender, instance, **kwargs):
+    apply_rating_delta(getattr(instance, '_rating_state', None), -1)
+
+
+# ---------------------------------------------------------------------------
+# Index de facettes des plats (dish_index.py)
+# ---------------------------------------------------------------------------
+
+@receiver(post_save, sender=Dish)
+@receiver(post_delete, sender=Dish)
+def invalidate_dish_index_on_dish_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(invalidate_dish_index)
+
+
+@receiver(post_delete, sender=City)
+@receiver(post_delete, sender=Category)
+def invalidate_dish_index_on_facet_delete(sender, instance, **kwargs):
+    # Les plats passent à NULL via un UPDATE en masse, sans signal sur Dish:
+    # la nouvelle version du catalogue fait reconstruire l'index des autres processus
+    transaction.on_commit(invalidate_dish_index)
+    transaction.on_commit(bump_catalog_version)
+
+
+# ---------------------------------------------------------------------------
+# Cache des API du catalogue (catalog_cache.py)
+# ---------------------------------------------------------------------------
+
+@receiver(post_save, sender=Dish)
+@receiver(post_delete, sender=Dish)
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+def bump_catalog_version_on_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(bump_catalog_version)
+
+
+# ---------------------------------------------------------------------------
+# Index de recherche plein texte (search.py)
+# ---------------------------------------------------------------------------
+
+@receiver(post_save, sender=Dish)
+@receiver(post_save, sender=Restaurant)
+@receiver(post_save, sender=ChatbotKnowledge)
+@receiver(post_save, sender=ForumTopic)
+def index_searchable_object(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: index_object(instance))
+
+
+@receiver(post_delete, sender=Dish)
+@receiver(post_delete, sender=Restaurant)
+@receiver(post_delete, sender=ChatbotKnowledge)
+@receiver(post_delete, sender=ForumTopic)
+def unindex_searchable_object(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: remove_object(sender, pk))
+
+
+@receiver(post_save, sender=City)
+def reindex_city_objects(sender, instance, created, raw=False, **kwargs):
+    # Le nom de la ville fait partie des documents des plats et restaurants
+    if raw or created:
+        return
+
+    def reindex():
+        for dish in instance.dishes.select_related('city'):
+            index_object(dish)
+        for restaurant in instance.restaurants.select_related('city'):
+            index_object(restaurant)
+    transaction.on_commit(reindex)
+
+
+# ---------------------------------------------------------------------------
+# Index d'autocomplétion (autocomplete.py)
+# ---------------------------------------------------------------------------
+
+AUTOCOMPLETE_KINDS = {Dish: 'dish', Restaurant: 'restaurant', City: 'city'}
+
+
+@receiver(post_save, sender=Dish)
+@receiver(post_save, sender=Restaurant)
+@receiver(post_save, sender=City)
+def update_autocomplete_entry(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: update_autocomplete(instance))
+
+
+@receiver(post_delete, sender=Dish)
+@receiver(post_delete, sender=Restaurant)
+@receiver(post_delete, sender=City)
+def remove_autocomplete_entry(sender, instance, **kwargs):
+    kind, pk = AUTOCOMPLETE_KINDS[sender], instance.pk
+    transaction.on_commit(lambda: remove_autocomplete(kind, pk))
+
+
+# ---------------------------------------------------------------------------
+# Calendrier de disponibilité des réservations (reservations.py)
+# ---------------------------------------------------------------------------
+
+@receiver(post_init, sender=Reservation)
+def remember_reservation_day(sender, instance, **kwargs):
+    remember_loaded_state(sender, instance, '_calendar_day')
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def refresh_reservation_calendar(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Jour actuel et, pour une réservation déplacée, jour d'origine
+    days = {(instance.restaurant_id, instance.date)}
+    if getattr(instance, '_calendar_day', None):
+        days.add(instance._calendar_day)
+    instance._calendar_day = (instance.restaurant_id, instance.date)
+
+    def refresh():
+        for restaurant_id, date in days:
+            refresh_calendar_day(restaurant_id, date)
+    transaction.on_commit(refresh)
+
+
+# ---------------------------------------------------------------------------
+# Compteurs des tableaux de bord restaurant (dashboard.py)
+# ---------------------------------------------------------------------------
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def invalidate_dashboard_summary(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    restaurant_id = instance.restaurant_id
+    transaction.on_commit(lambda: invalidate_reservation_summary(restaurant_id))
+
+
+# ---------------------------------------------------------------------------
+# Tableau des commandes en direct (events.py)
+# ---------------------------------------------------------------------------
+
+@receiver(post_init, sender=Order)
+def remember_order_live_status(sender, instance, **kwargs):
+    remember_loaded_state(sender, instance, '_live_status')
+
+
+@receiver(post_save, sender=Order)
+def publish_order_change(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_status = None if created else getattr(instance, '_live_status', None)
+    instance._live_status = instance.status
+    if instance.status == old_status or instance.status == Order.STATUS_CART:
+        return
+    # Un panier validé apparaît sur le tableau comme une nouvelle commande
+    if old_status in (None, Order.STATUS_CART):
+        transaction.on_commit(lambda: publish_order_created(instance))
+    else:
+        transaction.on_commit(lambda: publish_order_status(instance))
+
+
+@receiver(post_init, sender=KitchenOrderStatus)
+def remember_kitchen_live_status(sender, instance, **kwargs):
+    remember_loaded_state(sender, instance, '_live_status')
+
+
+@receiver(post_save, sender=KitchenOrderStatus)
+def publish_kitchen_status_change(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # Statut ou poste (assigned_to) modifié
+    old_status = None if created else getattr(instance, '_live_status', None)
+    instance._live_status = (instance.status, instance.assigned_to_id)
+    if instance._live_status == old_status:
+        return
+
+    def publish():
+        restaurant_id = Order.objects.filter(pk=instance.order_id).values_list('restaurant_id', flat=True).first()
+        if restaurant_id is not None:
+            publish_kitchen_status(instance, restaurant_id)
+    transaction.on_commit(publish)
+
+
+@receiver(post_init, sender=OrderItem)
+def remember_item_live_status(sender, instance, **kwargs):
+    remember_loaded_state(sender, instance, '_live_completed')
+
+
+@receiver(post_save, sender=OrderItem)
+def publish_item_status_change(sender, instance, created, raw=False, **kwargs):
+    # Les articles d'une nouvelle commande sont diffusés avec elle
+    if raw or created:
+        return
+    old_completed = getattr(instance, '_live_completed', None)
+    instance._live_completed = instance.is_completed
+    if instance.is_completed == old_completed:
+        return
+
+    def publish():
+        restaurant_id = Order.objects.filter(pk=instance.order_id).values_list('restaurant_id', flat=True).first()
+        if restaurant_id is not None:
+            publish_item_status(instance, restaurant_id)
+    transaction.on_commit(publish)
+
+
+# ---------------------------------------------------------------------------
+# Synchronisation incrémentale des commandes (changes.py)
+# ---------------------------------------------------------------------------
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+@receiver(post_save, sender=KitchenOrderStatus)
+def touch_order_on_change(sender, instance, raw=False, **kwargs):
+    # Les articles et le statut en cuisine font partie de la commande synchronisée
+    if raw:
+        return
+    touch_order(instance.order_id)
+
+
+# ---------------------------------------------------------------------------
+# États mémorisés au chargement: attribut -> (champs lus, état), par modèle
+# ---------------------------------------------------------------------------
+
+LOADED_STATES = {
+    Order: {
+        '_sales_state': (('status', 'total_amount', 'payment_method'), order_sales_state),
+        '_live_status': (('status',), attrgetter('status')),
+    },
+    OrderItem: {
+        '_sales_state': (('dish_id', 'price', 'quantity'), order_item_sales_state),
+        '_live_completed': (('is_completed',), attrgetter('is_completed')),
+    },
+    Review: {
+        '_rating_state': (('restaurant_id', 'is_published', 'rating'), review_rating_state),
+    },
+    Reservation: {
+        '_calendar_day': (('restaurant_id', 'date'), attrgetter('restaurant_id', 'date')),
+    },
+    KitchenOrderStatus: {
+        '_live_status': (('status', 'assigned_to_id'), attrgetter('status', 'assigned_to_id')),
+    },
+}
+
+
+@receiver(pre_save, sender=Order)
+@receiver(pre_save, sender=OrderItem)
+@receiver(pre_save, sender=Review)
+@receiver(pre_save, sender=Reservation)
+@receiver(pre_save, sender=KitchenOrderStatus)
+@receiver(pre_delete, sender=Order)
+@receiver(pre_delete, sender=OrderItem)
+@receiver(pre_delete, sender=Review)
+@receiver(pre_delete, sender=Reservation)
+def reload_loaded_states(sender, instance, signal, raw=False, **kwargs):
+    # Instance chargée avec des champs différés: états relus en une requête avant l'écriture
+    if raw or instance._state.adding:
+        return
+    deferred = instance.get_deferred_fields()
+    if signal is pre_delete and deferred:
+        # Les receveurs post_delete lisent l'instance alors que la ligne n'existe plus
+        instance.refresh_from_db(fields=deferred)
+    missing = {attr: spec for attr, spec in LOADED_STATES[sender].items() if attr not in instance.__dict__}
+    if not missing:
+        return
+    fields = {field for fields, _ in missing.values() for field in fields}
+    stored = sender._base_manager.only(*fields).filter(pk=instance.pk).first()
+    for attr, (_, state) in missing.items():
+        setattr(instance, attr, state(stored) if stored is not None else None)
@@ -0,0 +1,132 @@
+"""
+Flux SSE (server-sent events) du tableau des commandes en direct.
+
+Application ASGI montée par foodproject/asgi.py sur STREAM_PATH, en dehors du
+cycle requête/réponse de Django: une connexion ouverte n'occupe ni thread ni
+connexion à la base entre deux événements. Le client (EventSource) est
+authentifié par son cookie de session et reçoit les événements de son
+restaurant (voir events.py), plus un commentaire toutes les
+HEARTBEAT_INTERVAL secondes pour garder la connexion ouverte. Après une
+coupure, le navigateur renvoie l'en-tête Last-Event-ID et ne reçoit que les
+événements manqués; si ce jeton ne peut pas être repris (événements sortis du
+tampon, autre worker, redémarrage), le flux envoie à la place un événement
+« snapshot » avec les commandes en cours et continue.
+"""
+import asyncio
+import json
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections
+from django.http import parse_cookie
+
+from .events import active_orders, subscribe
+from .models import RestaurantAccount
+
+STREAM_PATH = '/api/restaurant/orders/stream/'
+
+HEARTBEAT_INTERVAL = 15
+
+# Délai de reconnexion indiqué au navigateur
+RETRY_MILLISECONDS = 3000
+
+
+@sync_to_async
+def restaurant_for(cookie_header):
+    """Restaurant du compte restaurant actif de la session, None sinon"""
+    try:
+        cookies = parse_cookie(cookie_header)
+        engine = import_module(settings.SESSION_ENGINE)
+        request = SimpleNamespace(session=engine.SessionStore(cookies.get(settings.SESSION_COOKIE_NAME)))
+        user = get_user(request)
+        if not user.is_authenticated:
+            return None
+        return RestaurantAccount.objects.filter(user=user, is_active=True).values_list(
+            'restaurant_id', flat=True
+        ).first()
+    finally:
+        close_old_connections()
+
+
+def format_event(event_token, event_type, data):
+    return f'id: {event_token}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n'
+
+
+async def snapshot_event(subscription, restaurant_id):
+    """État complet des commandes en cours, à la position de l'abonnement"""
+    # Abonné avant la lecture: un changement concurrent est relu ou renvoyé ensuite
+    orders = await active_orders(restaurant_id)
+    return format_event(subscription.resume_token(), 'snapshot', {'orders': orders})
+
+
+async def send_text(send, status, text):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'text/plain; charset=utf-8')],
+    })
+    await send({'type': 'http.response.body', 'body': text.encode()})
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def order_stream(scope, receive, send):
+    """Flux des événements du restaurant de l'utilisateur connecté"""
+    if scope['method'] != 'GET':
+        await send_text(send, 405, 'Méthode non autorisée')
+        return
+
+    headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+    restaurant_id = await restaurant_for(headers.get('cookie', ''))
+    if restaurant_id is None:
+        await send_text(send, 403, 'Accès refusé')
+        return
+
+    # Jeton de reprise: en-tête du navigateur à la reconnexion, sinon celui de la page
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    resume_token = headers.get('last-event-id') or query.get('last_event_id', [None])[0]
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            # Pas de mise en tampon par un proxy nginx
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': f'retry: {RETRY_MILLISECONDS}\n\n'.encode(), 'more_body': True})
+
+    subscription = subscribe(restaurant_id, resume_token)
+    chunk = ''
+    if subscription is None:
+        subscription = subscribe(restaurant_id)
+        chunk = await snapshot_event(subscription, restaurant_id)
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        with subscription:
+            while True:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+                events = asyncio.ensure_future(subscription.next_events(HEARTBEAT_INTERVAL))
+                await asyncio.wait({events, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.done():
+                    events.cancel()
+                    return
+                pending = events.result()
+                if pending is None:
+                    # Événements manqués sortis du tampon: état relu en base
+                    subscription.skip_pending()
+                    chunk = await snapshot_event(subscription, restaurant_id)
+                else:
+                    chunk = ''.join(format_event(*event) for event in pending) or ': ping\n\n'
+    finally:
+        disconnected.cancel()
@@ -0,0 +1,333 @@
+"""
+Moteur de statistiques de vente des restaurants.
+
+Les rapports sont lus dans la table d'agrégats DailyRestaurantSales (une ligne
+par restaurant et par jour). Cette table est tenue à jour de façon incrémentale
+par les signaux de Order/OrderItem (voir signals.py) et peut être reconstruite
+sur n'importe quelle période à partir de deux requêtes groupées par jour
+(commande ``rebuild_daily_sales``). Les jours sans commande sont complétés en Python.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db.models import Count, Sum, Q, F, DecimalField, ExpressionWrapper
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Dish, Order, OrderItem, DailyRestaurantSales
+
+# Statuts pris en compte dans le chiffre d'affaires
+REVENUE_STATUSES = [Order.STATUS_DELIVERED, Order.STATUS_PAID]
+
+# Catégories de plats affichées dans les graphiques (type de plat, libellé)
+DISH_CATEGORIES = [
+    (Dish.SALTY, 'Salé'),
+    (Dish.SWEET, 'Sucré'),
+    (Dish.DRINK, 'Boissons'),
+]
+
+# Modes de paiement affichés dans les graphiques (mode, libellé)
+PAYMENT_METHODS = [
+    (Order.PAYMENT_CASH, 'Espèces'),
+    (Order.PAYMENT_CARD, 'Carte bancaire'),
+    (Order.PAYMENT_ONLINE, 'En ligne'),
+]
+
+# Compteur de DailyRestaurantSales alimenté par chaque statut de commande
+STATUS_COUNT_FIELDS = {
+    Order.STATUS_NEW: 'new_count',
+    Order.STATUS_PREPARING: 'preparing_count',
+    Order.STATUS_READY: 'ready_count',
+    Order.STATUS_DELIVERED: 'completed_count',
+    Order.STATUS_PAID: 'completed_count',
+    Order.STATUS_CANCELLED: 'cancelled_count',
+}
+
+# Nombre maximal de jours d'un rapport (séries journalières complétées en Python)
+MAX_REPORT_DAYS = 366
+
+ROLLUP_FIELDS = (
+    ['orders_count', 'revenue']
+    + [f'revenue_{dish_type}' for dish_type, _label in DISH_CATEGORIES]
+    + [f'payment_{method}' for method, _label in PAYMENT_METHODS]
+    + sorted(set(STATUS_COUNT_FIELDS.values()))
+)
+
+
+def validate_period(start_date, end_date):
+    """ValueError si la période est inversée, trop longue ou au bord des dates représentables"""
+    if start_date > end_date:
+        raise ValueError("Période invalide: la date de début est après la date de fin")
+    if (end_date - start_date).days >= MAX_REPORT_DAYS:
+        raise ValueError(f"Période trop longue: {MAX_REPORT_DAYS} jours au plus")
+    if start_date == datetime.date.min or end_date == datetime.date.max:
+        # day_bounds déborderait
+        raise ValueError("Date hors limites")
+
+
+def date_range(start_date, end_date):
+    """Renvoie la liste des dates entre start_date et end_date (incluses)"""
+    days = (end_date - start_date).days + 1
+    return [start_date + datetime.timedelta(days=i) for i in range(max(days, 0))]
+
+
+def day_bounds(start_date, end_date):
+    """Bornes datetime [début, fin[ couvrant les jours demandés dans le fuseau courant"""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.datetime.combine(start_date, datetime.time.min), tz)
+    end = timezone.make_aware(
+        datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time.min), tz
+    )
+    return start, end
+
+
+def daily_order_rows(restaurant, start_date, end_date):
+    """
+    Agrège les commandes par jour en une seule requête:
+    nombre de commandes, chiffre d'affaires, répartition par mode de paiement
+    et par statut.
+    """
+    start, end = day_bounds(start_date, end_date)
+    revenue_filter = Q(status__in=REVENUE_STATUSES)
+    payment_counts = {
+        f'payment_{method}': Count('id', filter=Q(payment_method=method))
+        for method, _label in PAYMENT_METHODS
+    }
+    status_counts = {}
+    for status, field in STATUS_COUNT_FIELDS.items():
+        status_counts.setdefault(field, []).append(status)
+    status_counts = {
+        field: Count('id', filter=Q(status__in=statuses))
+        for field, statuses in status_counts.items()
+    }
+
+    rows = (
+        Order.objects
+        .filter(restaurant=restaurant, order_time__gte=start, order_time__lt=end)
+        .exclude(status=Order.STATUS_CART)
+        .annotate(day=TruncDate('order_time'))
+        .values('day')
+        .annotate(
+            orders=Count('id'),
+            revenue=Sum('total_amount', filter=revenue_filter),
+            **payment_counts,
+            **status_counts
+        )
+        .order_by('day')
+    )
+    return {row['day']: row for row in rows}
+
+
+def daily_item_rows(restaurant, start_date, end_date):
+    """
+    Agrège le chiffre d'affaires des articles par jour et par type de plat
+    en une seule requête (commandes livrées ou payées uniquement).
+    """
+    start, end = day_bounds(start_date, end_date)
+    line_total = ExpressionWrapper(
+        F('price') * F('quantity'),
+        output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+    type_totals = {
+        f'revenue_{dish_type}': Sum(line_total, filter=Q(dish__type=dish_type))
+        for dish_type, _label in DISH_CATEGORIES
+    }
+
+    rows = (
+        OrderItem.objects
+        .filter(
+            order__restaurant=restaurant,
+            order__order_time__gte=start,
+            order__order_time__lt=end,
+            order__status__in=REVENUE_STATUSES,
+        )
+        .annotate(day=TruncDate('order__order_time'))
+        .values('day')
+        .annotate(**type_totals)
+        .order_by('day')
+    )
+    return {row['day']: row for row in rows}
+
+
+def compute_daily_sales(restaurant, start_date, end_date):
+    """
+    Recalcule depuis les commandes les valeurs des agrégats journaliers d'un
+    restaurant sur une période. Renvoie {date: {champ: valeur}} pour les jours
+    ayant au moins une commande.
+    """
+    order_rows = daily_order_rows(restaurant, start_date, end_date)
+    item_rows = daily_item_rows(restaurant, start_date, end_date)
+
+    daily_sales = {}
+    for day, order_row in order_rows.items():
+        item_row = item_rows.get(day, {})
+        values = {}
+        for field in ROLLUP_FIELDS:
+            if field == 'orders_count':
+                values[field] = order_row['orders']
+            elif field.startswith('revenue_'):
+                values[field] = item_row.get(field) or Decimal('0')
+            else:
+                values[field] = order_row.get(field) or 0
+        daily_sales[day] = values
+    return daily_sales
+
+
+def rebuild_daily_sales(restaurant, start_date, end_date):
+    """
+    Reconstruit les lignes DailyRestaurantSales d'un restaurant sur une période.
+    Les jours sans commande sont supprimés. Renvoie le nombre de lignes écrites.
+    """
+    daily_sales = compute_daily_sales(restaurant, start_date, end_date)
+    restaurant_id = getattr(restaurant, 'pk', restaurant)
+
+    DailyRestaurantSales.objects.filter(
+        restaurant_id=restaurant_id,
+        date__gte=start_date,
+        date__lte=end_date
+    ).exclude(date__in=list(daily_sales)).delete()
+
+    now = timezone.now()
+    DailyRestaurantSales.objects.bulk_create(
+        [
+            DailyRestaurantSales(restaurant_id=restaurant_id, date=day, updated_at=now, **values)
+            for day, values in daily_sales.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['restaurant', 'date'],
+        update_fields=ROLLUP_FIELDS + ['updated_at'],
+    )
+    return len(daily_sales)
+
+
+def sales_day(order_time):
+    """Jour (dans le fuseau courant) auquel une commande est comptabilisée"""
+    return timezone.localdate(order_time)
+
+
+def order_contribution(status, total_amount, payment_method):
+    """Contribution d'une commande aux compteurs de son jour (hors détail par type de plat)"""
+    if status == Order.STATUS_CART:
+        # Un panier n'est pas encore une commande
+        return {}
+    contribution = {'orders_count': 1}
+    if any(payment_method == method for method, _label in PAYMENT_METHODS):
+        contribution[f'payment_{payment_method}'] = 1
+    if status in STATUS_COUNT_FIELDS:
+        contribution[STATUS_COUNT_FIELDS[status]] = 1
+    if status in REVENUE_STATUSES:
+        contribution['revenue'] = Decimal(str(total_amount or 0))
+    return contribution
+
+
+def contribution_delta(old, new):
+    """Différence champ par champ entre deux contributions"""
+    return {field: new.get(field, 0) - old.get(field, 0) for field in set(old) | set(new)}
+
+
+def order_items_revenue(order_id, sign=1):
+    """Chiffre d'affaires des articles d'une commande par type de plat, en une requête"""
+    line_total = ExpressionWrapper(
+        F('price') * F('quantity'),
+        output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+    totals = OrderItem.objects.filter(order_id=order_id).aggregate(**{
+        f'revenue_{dish_type}': Sum(line_total, filter=Q(dish__type=dish_type))
+        for dish_type, _label in DISH_CATEGORIES
+    })
+    return {field: sign * (value or Decimal('0')) for field, value in totals.items()}
+
+
+def apply_sales_delta(restaurant_id, day, delta):
+    """Applique atomiquement des incréments (F expressions) à la ligne d'agrégats d'un jour"""
+    delta = {field: value for field, value in delta.items() if value}
+    if not delta:
+        return
+    row, _created = DailyRestaurantSales.objects.get_or_create(restaurant_id=restaurant_id, date=day)
+    DailyRestaurantSales.objects.filter(pk=row.pk).update(
+        updated_at=timezone.now(),
+        **{field: F(field) + value for field, value in delta.items()}
+    )
+
+
+def get_daily_sales(restaurant, day):
+    """Renvoie les agrégats d'un jour (une ligne vide si aucune commande)"""
+    row = DailyRestaurantSales.objects.filter(restaurant=restaurant, date=day).first()
+    if row is None:
+        row = DailyRestaurantSales(restaurant=restaurant, date=day)
+    return row
+
+
+def build_sales_report(restaurant, start_date, end_date):
+    """
+    Construit le rapport de ventes complet d'un restaurant sur une période
+    à partir des agrégats journaliers (une seule requête).
+
+    Les séries sont densifiées: chaque jour de la période a une valeur,
+    même sans commande.
+    """
+    rows = {
+        row.date: row
+        for row in DailyRestaurantSales.objects.filter(
+            restaurant=restaurant,
+            date__gte=start_date,
+            date__lte=end_date
+        )
+    }
+
+    days = date_range(start_date, end_date)
+    revenue_series = []
+    orders_series = []
+    category_totals = {dish_type: Decimal('0') for dish_type, _label in DISH_CATEGORIES}
+    payment_totals = {method: 0 for method, _label in PAYMENT_METHODS}
+
+    for day in days:
+        row = rows.get(day)
+        if row is None:
+            revenue_series.append(Decimal('0'))
+            orders_series.append(0)
+            continue
+
+        revenue_series.append(row.revenue)
+        orders_series.append(row.orders_count)
+
+        for method in payment_totals:
+            payment_totals[method] += getattr(row, f'payment_{method}')
+        for dish_type in category_totals:
+            category_totals[dish_type] += getattr(row, f'revenue_{dish_type}')
+
+    revenue = sum(revenue_series, Decimal('0'))
+    orders_count = sum(orders_series)
+
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'days': days,
+        'revenue': revenue,
+        'orders_count': orders_count,
+        'avg_order_value': round(revenue / orders_count, 2) if orders_count else 0,
+        'revenue_series': revenue_series,
+        'orders_series': orders_series,
+        'dish_categories': [label for _type, label in DISH_CATEGORIES],
+        'dish_categories_data': [category_totals[dish_type] for dish_type, _label in DISH_CATEGORIES],
+        'payment_methods': [label for _method, label in PAYMENT_METHODS],
+        'payment_methods_data': [payment_totals[method] for method, _label in PAYMENT_METHODS],
+    }
+
+
+def report_chart_data(report):
+    """Convertit un rapport en données sérialisables en JSON pour les graphiques"""
+    return {
+        'start_date': report['start_date'].strftime('%Y-%m-%d'),
+        'end_date': report['end_date'].strftime('%Y-%m-%d'),
+        'dates': [day.strftime('%d/%m') for day in report['days']],
+        'revenue_data': [float(value) for value in report['revenue_series']],
+        'orders_data': report['orders_series'],
+        'dish_categories': report['dish_categories'],
+        'dish_categories_data': [float(value) for value in report['dish_categories_data']],
+        'payment_methods': report['payment_methods'],
+        'payment_methods_data': report['payment_methods_data'],
+        'revenue': float(report['revenue']),
+        'orders_count': report['orders_count'],
+        'avg_order_value': float(report['avg_order_value']),
+    }
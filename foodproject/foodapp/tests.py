@@ -1,3 +1,1512 @@
-from django.test import TestCase
+import asyncio
+import copy
+import datetime
+import io
+import json
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.http import HttpResponse, QueryDict
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import events, featured, sse, views
+from .admin import DishAdmin, ReservationAdmin, ReviewAdmin
+from .autocomplete import AutocompleteIndex
+from .cache_backends import TieredCache, shared_metrics
+from .cart import CartError, StoredCart, checkout_cart, update_cart
+from .catalog_cache import bump_catalog_version, catalog_version
+from .changes import CHANGES_SETTLE_SECONDS, order_changes
+from .codes import CODE_ALPHABET, CODE_LENGTH, CodeAllocator, permute, round_keys
+from .counters import count_platform, platform_counters, reconcile_platform_counters
+from .dashboard import reservation_page, reservation_summary, restaurant_dashboard_context
+from .dish_index import (
+    dish_filters_from_params, dish_filters_q, filter_dishes, get_dish_index, invalidate_dish_index,
+)
+from .dish_sorting import DISH_SORTS, dish_page, sort_ordering
+from .kitchen import KitchenDisplay
+from .models import (
+    Category, City, CodeSequence, Dish, KitchenOrderStatus, Order, OrderItem, Reservation, Restaurant,
+    RestaurantAccount, Review,
+)
+from .page_cache import cache_anonymous_page, page_key
+from .pos import IdempotencyConflict, create_pos_order
+from .reservations import DayOccupancy, availability_calendar, book_reservation, is_open_day
+from .search import fold, search_objects, tokenize
+from .stats import MAX_REPORT_DAYS, ROLLUP_FIELDS, get_daily_sales, rebuild_daily_sales, sales_day
+from .viewed_dishes import prune_dish_views, set_new_badges
+
+
+class ReservationConcurrencyTests(TransactionTestCase):
+    """Prises de place simultanées sur un même créneau"""
+
+    CAPACITY = 40
+    GUESTS = 2
+    BOOKINGS = 300
+    WORKERS = 50
+
+    def setUp(self):
+        city = City.objects.create(name='Fès')
+        self.restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=city, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma', capacity=self.CAPACITY,
+        )
+        self.date = timezone.localdate() + datetime.timedelta(days=7)
+        while not is_open_day(self.date):
+            self.date += datetime.timedelta(days=1)
+
+    def book(self, index):
+        reservation = Reservation(
+            restaurant=self.restaurant, name=f'Client {index}', email=f'client{index}@example.com',
+            phone='0611111111', date=self.date, time=datetime.time(20, 0), guests=self.GUESTS,
+        )
+        try:
+            return book_reservation(reservation)
+        finally:
+            # Chaque thread a sa propre connexion
+            connection.close()
+
+    def test_parallel_bookings_never_overbook(self):
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as executor:
+            results = list(executor.map(self.book, range(self.BOOKINGS)))
+
+        booked = Reservation.objects.filter(restaurant=self.restaurant, date=self.date)
+        self.assertEqual(results.count(True), self.CAPACITY // self.GUESTS)
+        self.assertEqual(booked.count(), self.CAPACITY // self.GUESTS)
+        self.assertEqual(booked.aggregate(total=Sum('guests'))['total'], self.CAPACITY)
+
+    def test_modification_keeps_own_places(self):
+        reservation = Reservation(
+            restaurant=self.restaurant, name='Client', email='client@example.com', phone='0611111111',
+            date=self.date, time=datetime.time(20, 0), guests=self.CAPACITY,
+        )
+        self.assertTrue(book_reservation(reservation))
+        self.assertFalse(self.book(0))
+
+        reservation.time = datetime.time(20, 30)
+        self.assertTrue(book_reservation(reservation, exclude_reservation_id=reservation.id))
+
+
+class OrderChangesTests(TestCase):
+    """Synchronisation incrémentale des commandes (changes.py)"""
+
+    def setUp(self):
+        city = City.objects.create(name='Fès')
+        self.restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=city, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma',
+        )
+        self.first = Order.objects.create(restaurant=self.restaurant, table_number='1')
+        self.second = Order.objects.create(restaurant=self.restaurant, table_number='2')
+
+    def changes_later(self, cursor, seconds=CHANGES_SETTLE_SECONDS + 1, **kwargs):
+        """Changements demandés une fois passée la fenêtre de stabilisation"""
+        later = timezone.now() + datetime.timedelta(seconds=seconds)
+        with mock.patch('foodapp.changes.timezone.now', return_value=later):
+            return order_changes(self.restaurant, cursor, **kwargs)
+
+    def test_cursor_round_trip(self):
+        snapshot = order_changes(self.restaurant)
+        self.assertEqual([order['id'] for order in snapshot['orders']], [self.first.id, self.second.id])
+
+        self.second.status = Order.STATUS_PREPARING
+        self.second.save()
+        changes = self.changes_later(snapshot['cursor'])
+        # Les commandes du premier passage encore dans la fenêtre sont renvoyées une fois de plus
+        self.assertEqual([order['id'] for order in changes['orders']], [self.first.id, self.second.id])
+        self.assertEqual(changes['orders'][1]['status'], Order.STATUS_PREPARING)
+        self.assertFalse(changes['has_more'])
+
+        self.assertEqual(self.changes_later(changes['cursor'])['orders'], [])
+
+    def test_changes_are_paged(self):
+        snapshot = order_changes(self.restaurant)
+        first_page = self.changes_later(snapshot['cursor'], page_size=1)
+        self.assertEqual([order['id'] for order in first_page['orders']], [self.first.id])
+        self.assertTrue(first_page['has_more'])
+        second_page = self.changes_later(first_page['cursor'], page_size=1)
+        self.assertEqual([order['id'] for order in second_page['orders']], [self.second.id])
+
+    def test_recent_changes_wait_for_the_settle_window(self):
+        cursor = self.changes_later(order_changes(self.restaurant)['cursor'])['cursor']
+        self.first.status = Order.STATUS_READY
+        self.first.save()
+        self.assertEqual(self.changes_later(cursor, seconds=1)['orders'], [])
+        self.assertEqual([order['id'] for order in self.changes_later(cursor)['orders']], [self.first.id])
+
+    def test_cancelled_order_is_a_tombstone(self):
+        cursor = self.changes_later(order_changes(self.restaurant)['cursor'])['cursor']
+        self.first.status = Order.STATUS_CANCELLED
+        self.first.save()
+
+        changes = self.changes_later(cursor)
+        self.assertEqual(changes['orders'], [{'id': self.first.id, 'removed': True}])
+        self.assertNotIn(self.first.id, [order['id'] for order in order_changes(self.restaurant)['orders']])
+
+
+class CodeAllocatorTests(TestCase):
+    """Codes courts uniques (codes.py)"""
+
+    def next_code(self, allocator):
+        # Le reste d'un bloc n'est distribué qu'une fois sa réservation validée
+        with self.captureOnCommitCallbacks(execute=True):
+            return allocator.next()
+
+    def test_permutation_is_a_bijection(self):
+        # Domaine réduit: demi-blocs de 6 bits (4096 valeurs), 3000 codes
+        keys = round_keys('test')
+        with mock.patch.multiple('foodapp.codes', HALF_BITS=6, HALF_MASK=63, CODE_SPACE=3000):
+            values = [permute(value, keys) for value in range(3000)]
+        self.assertEqual(sorted(values), list(range(3000)))
+        self.assertNotEqual(values, list(range(3000)))
+
+    def test_codes_are_unique_across_blocks(self):
+        # Deux processus qui se partagent le même compteur
+        first = CodeAllocator('test', block_size=10)
+        second = CodeAllocator('test', block_size=10)
+        codes = []
+        for _index in range(25):
+            codes += [self.next_code(first), self.next_code(second)]
+
+        self.assertEqual(len(set(codes)), 50)
+        for code in codes:
+            self.assertEqual(len(code), CODE_LENGTH)
+            self.assertLessEqual(set(code), set(CODE_ALPHABET))
+        # Trois blocs de 10 par processus
+        self.assertEqual(CodeSequence.objects.get(name='test').next_value, 60)
+
+
+class DailySalesRollupTests(TestCase):
+    """Agrégats journaliers tenus à jour par les signaux (stats.py)"""
+
+    def setUp(self):
+        city = City.objects.create(name='Fès')
+        self.restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=city, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma',
+        )
+        dish = Dish.objects.create(
+            name='Tajine', description='Tajine aux pruneaux', price_range='M', type=Dish.SALTY,
+            restaurant=self.restaurant,
+        )
+        self.order = Order.objects.create(
+            restaurant=self.restaurant, total_amount=Decimal('60.00'), payment_method=Order.PAYMENT_CARD,
+        )
+        OrderItem.objects.create(order=self.order, dish=dish, quantity=2, price=Decimal('30.00'))
+        self.day = sales_day(self.order.order_time)
+
+    def sales(self):
+        row = get_daily_sales(self.restaurant, self.day)
+        return {field: getattr(row, field) for field in ROLLUP_FIELDS}
+
+    def test_status_change_applies_once(self):
+        self.assertEqual(self.sales()['new_count'], 1)
+        self.assertEqual(self.sales()['revenue'], 0)
+
+        self.order.status = Order.STATUS_DELIVERED
+        self.order.save()
+        sales = self.sales()
+        self.assertEqual(sales['orders_count'], 1)
+        self.assertEqual(sales['new_count'], 0)
+        self.assertEqual(sales['completed_count'], 1)
+        self.assertEqual(sales['payment_card'], 1)
+        self.assertEqual(sales['revenue'], Decimal('60.00'))
+        self.assertEqual(sales['revenue_salty'], Decimal('60.00'))
+
+        # Sauvegardes sans changement, y compris d'une instance relue: rien à réappliquer
+        self.order.save()
+        Order.objects.get(pk=self.order.pk).save()
+        self.assertEqual(self.sales(), sales)
+
+        # Même résultat qu'une reconstruction complète
+        rebuild_daily_sales(self.restaurant, self.day, self.day)
+        self.assertEqual(self.sales(), sales)
+
+    def test_deferred_fields_are_not_loaded_per_instance(self):
+        Order.objects.create(restaurant=self.restaurant, total_amount=Decimal('10.00'))
+        with self.assertNumQueries(2):
+            orders = list(Order.objects.only('id'))
+            items = list(OrderItem.objects.defer('price'))
+        self.assertEqual(len(orders), 2)
+        self.assertEqual(len(items), 1)
+
+    def test_deferred_instance_is_reloaded_before_save(self):
+        order = Order.objects.only('id').get(pk=self.order.pk)
+        order.status = Order.STATUS_DELIVERED
+        order.save()
+        sales = self.sales()
+        self.assertEqual((sales['new_count'], sales['completed_count']), (0, 1))
+        self.assertEqual(sales['revenue_salty'], Decimal('60.00'))
+
+        item = OrderItem.objects.defer('price', 'quantity').get(order=self.order)
+        item.quantity = 3
+        item.save()
+        self.assertEqual(self.sales()['revenue_salty'], Decimal('90.00'))
+
+        Order.objects.only('id').get(pk=self.order.pk).delete()
+        self.assertEqual(self.sales()['orders_count'], 0)
+        self.assertEqual(self.sales()['revenue_salty'], 0)
+
+    def test_deferred_review_keeps_rating_aggregates(self):
+        user = User.objects.create(username='client')
+        review = Review.objects.create(user=user, restaurant=self.restaurant, rating=4)
+        review = Review.objects.only('id').get(pk=review.pk)
+        review.is_published = False
+        review.save()
+        self.restaurant.refresh_from_db()
+        self.assertEqual((self.restaurant.rating_count, self.restaurant.rating_sum), (0, 0))
+
+
+class CartTests(TestCase):
+    """Paniers en base et hors base (cart.py)"""
+
+    def setUp(self):
+        city = City.objects.create(name='Fès')
+        self.restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=city, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma',
+        )
+        self.dish = Dish.objects.create(
+            name='Tajine', description='Tajine aux pruneaux', price_range=Dish.PRICE_MEDIUM, type=Dish.SALTY,
+            restaurant=self.restaurant,
+        )
+        self.user = User.objects.create(username='client')
+
+    def test_database_cart_adds_up(self):
+        update_cart(self.user, [(self.dish.id, 1)])
+        update_cart(self.user, [(self.dish.id, 2)])
+        cart = Order.objects.get(user=self.user, status=Order.STATUS_CART)
+        self.assertEqual(cart.items.get().quantity, 3)
+        self.assertEqual(cart.total_amount, 3 * self.dish.unit_price)
+
+        order = checkout_cart(self.user, self.restaurant.id, table_number='4')
+        self.assertEqual(order.pk, cart.pk)
+        self.assertEqual(order.status, Order.STATUS_NEW)
+        with self.assertRaises(CartError):
+            checkout_cart(self.user, self.restaurant.id)
+
+    def test_stored_cart_checkout_is_idempotent(self):
+        cart = StoredCart()
+        cart.apply([(self.dish.id, 2)])
+        # Validation renvoyée avec la même copie du panier (double appui, nouvelle tentative)
+        replayed = StoredCart(copy.deepcopy(cart.data))
+
+        order = cart.checkout(self.user, self.restaurant.id)
+        self.assertEqual(replayed.checkout(self.user, self.restaurant.id).pk, order.pk)
+        self.assertEqual(Order.objects.filter(restaurant=self.restaurant).count(), 1)
+        self.assertEqual(order.items.get().quantity, 2)
+        self.assertEqual(order.total_amount, 2 * self.dish.unit_price)
+
+
+class SearchTests(TestCase):
+    """Normalisation et classement de la recherche plein texte (search.py)"""
+
+    def test_transcription_variants_fold_together(self):
+        self.assertEqual(fold('Tagine'), fold('tajine'))
+        self.assertEqual(fold('Msemmen'), fold('msemen'))
+        self.assertEqual(fold('Couscous'), 'cuscus')
+        self.assertEqual(fold('Crème brûlée'), 'creme brule')
+
+    def test_elisions_and_hyphens_split_words(self):
+        self.assertEqual(tokenize("Bastilla d'agneau"), ['bastila', 'd', 'agneau'])
+        self.assertEqual(tokenize("L’assiette"), ['l', 'asiete'])
+        self.assertEqual(tokenize('Ras-el-hanout'), ['ras', 'el', 'hanut'])
+
+    def test_digits_are_not_squashed(self):
+        self.assertEqual(fold('100 g'), '100 g')
+
+    def test_title_matches_rank_first(self):
+        city = City.objects.create(name='Fès')
+        restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=city, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma',
+        )
+        in_body = Dish.objects.create(
+            name='Couscous', description="Servi avec de l'agneau", price_range='M', type=Dish.SALTY,
+            restaurant=restaurant,
+        )
+        in_title = Dish.objects.create(
+            name="Tajine d'agneau", description='Aux pruneaux', price_range='M', type=Dish.SALTY,
+            restaurant=restaurant,
+        )
+
+        dishes, total = search_objects('agneau', kinds=['dish'])['dish']
+        self.assertEqual(total, 2)
+        self.assertEqual(dishes, [in_title, in_body])
+        # Préfixe d'un mot et variante de transcription
+        self.assertEqual(search_objects('tagine agn', kinds=['dish'])['dish'], ([in_title], 1))
+
+
+class AutocompleteTests(TestCase):
+    """Suggestions de saisie (autocomplete.py)"""
+
+    def setUp(self):
+        city = City.objects.create(name='Fès')
+        self.restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=city, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma',
+        )
+
+    def dish(self, name, **fields):
+        return Dish.objects.create(
+            name=name, description=name, price_range='M', type=Dish.SALTY, restaurant=self.restaurant, **fields
+        )
+
+    def suggestions(self, index, query, **kwargs):
+        return [label for _kind, _pk, label in index.suggest(query, **kwargs)]
+
+    def test_typing_a_variant_letter_by_letter(self):
+        self.dish('Tajine aux pruneaux')
+        self.dish('Couscous royal')
+        index = AutocompleteIndex.build()
+        for word, label in [('tagine', 'Tajine aux pruneaux'), ('couscous', 'Couscous royal')]:
+            for length in range(1, len(word) + 1):
+                self.assertIn(label, self.suggestions(index, word[:length], kinds=['dish']), word[:length])
+        # Mot terminé: pas de variante
+        self.assertEqual(self.suggestions(index, 'tag ', kinds=['dish']), [])
+
+    def test_ranking(self):
+        self.dish('Tajine de poulet')
+        self.dish('Poulet aux olives')
+        self.dish('Poulet rôti', is_tourist_recommended=True)
+        index = AutocompleteIndex.build()
+        # Nom commençant par la saisie, puis plat recommandé, puis nom le plus court
+        self.assertEqual(
+            self.suggestions(index, 'poul', kinds=['dish']),
+            ['Poulet rôti', 'Poulet aux olives', 'Tajine de poulet'],
+        )
+        self.assertEqual(self.suggestions(index, 'dar', kinds=['restaurant']), ['Dar Tajine'])
+        self.assertEqual(self.suggestions(index, 'poul', limit=1), ['Poulet rôti'])
+
+
+class CatalogVersionTests(TestCase):
+    """Invalidation des caches du catalogue après une modification (catalog_cache.py)"""
+
+    def setUp(self):
+        city = City.objects.create(name='Fès')
+        self.restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=city, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma',
+        )
+        self.dish = Dish.objects.create(
+            name='Tajine', description='Tajine aux pruneaux', price_range='M', type=Dish.SALTY,
+            restaurant=self.restaurant,
+        )
+        # Index d'un test précédent: la version du catalogue est annulée avec sa transaction
+        invalidate_dish_index()
+
+    def vegetarian_ids(self):
+        index = get_dish_index()
+        return list(index.matching_ids(index.match(require=['is_vegetarian'])))
+
+    def test_dish_save_bumps_the_version(self):
+        version = catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dish.save()
+        self.assertNotEqual(catalog_version(), version)
+
+    def test_admin_bulk_action_invalidates_the_catalog(self):
+        self.assertEqual(self.vegetarian_ids(), [])
+        version = catalog_version()
+
+        dish_admin = DishAdmin(Dish, admin.site)
+        with mock.patch.object(dish_admin, 'message_user'), self.captureOnCommitCallbacks(execute=True):
+            dish_admin.mark_as_vegetarian(RequestFactory().post('/'), Dish.objects.filter(pk=self.dish.pk))
+
+        self.assertNotEqual(catalog_version(), version)
+        self.assertEqual(self.vegetarian_ids(), [self.dish.pk])
+
+
+class FeaturedDishesTests(TestCase):
+    """Tirage des plats mis en avant (featured.py)"""
+
+    def setUp(self):
+        city = City.objects.create(name='Fès')
+        restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=city, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma',
+        )
+        self.dishes = [
+            Dish.objects.create(
+                name=f'Plat {index}', description='Plat', price_range='M', type=Dish.SALTY,
+                restaurant=restaurant, is_vegetarian=index % 2 == 0,
+            )
+            for index in range(10)
+        ]
+        # Tableaux d'un test précédent: la version du catalogue est annulée avec sa transaction
+        featured._pools = None
+
+    def test_sample_is_drawn_from_the_pool(self):
+        vegetarian = {dish.pk for dish in self.dishes if dish.is_vegetarian}
+        for _draw in range(20):
+            ids = featured.featured_dish_ids('vegetarian', 3)
+            self.assertEqual(len(set(ids)), 3)
+            self.assertLessEqual(set(ids), vegetarian)
+        self.assertEqual(set(featured.featured_dish_ids('vegetarian', 20)), vegetarian)
+        self.assertEqual(featured.featured_dish_ids('vegan', 3), [])
+
+    @override_settings(FEATURED_ROTATION_MINUTES=10)
+    def test_rotation_is_stable_within_a_period(self):
+        with mock.patch('foodapp.featured.time.time', return_value=6000):
+            first = featured.featured_dish_ids('all', 4)
+            self.assertEqual(featured.featured_dish_ids('all', 4), first)
+            # Même tirage dans un autre worker (graine partagée)
+            featured._pools = None
+            self.assertEqual(featured.featured_dish_ids('all', 4), first)
+        periods = set()
+        for period in range(10):
+            with mock.patch('foodapp.featured.time.time', return_value=period * 600):
+                periods.add(tuple(featured.featured_dish_ids('all', 4)))
+        self.assertGreater(len(periods), 1)
+
+    def test_pools_expire_after_bulk_updates(self):
+        pools = featured.get_featured_pools()
+        self.assertEqual(featured.featured_dish_ids('tourist', 3), [])
+        # Modification en masse sans changement de version du catalogue
+        Dish.objects.filter(pk=self.dishes[0].pk).update(is_tourist_recommended=True)
+        self.assertEqual(featured.featured_dish_ids('tourist', 3), [])
+
+        later = pools.built_at + settings.FEATURED_POOLS_TTL + 1
+        with mock.patch('foodapp.featured.time.monotonic', return_value=later):
+            self.assertEqual(featured.featured_dish_ids('tourist', 3), [self.dishes[0].pk])
+
+
+class SalesStatsViewsTests(TestCase):
+    """Période et séries des statistiques de vente (views.restaurant_stats, stats.py)"""
+
+    def setUp(self):
+        city = City.objects.create(name='Fès')
+        self.restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=city, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma',
+        )
+        self.user = User.objects.create(username='gerant')
+        RestaurantAccount.objects.create(user=self.user, restaurant=self.restaurant, is_active=True)
+        self.order = Order.objects.create(
+            restaurant=self.restaurant, status=Order.STATUS_DELIVERED, total_amount=Decimal('42.00'),
+        )
+        self.day = sales_day(self.order.order_time)
+
+    def get(self, view, **params):
+        request = RequestFactory().get('/', params)
+        request.user = self.user
+        return view(request)
+
+    def test_series_are_densified(self):
+        start = self.day - datetime.timedelta(days=2)
+        response = self.get(views.restaurant_stats_data, **{'from': start.isoformat(), 'to': self.day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(len(data['dates']), 3)
+        self.assertEqual(data['revenue_data'], [0.0, 0.0, 42.0])
+        self.assertEqual(data['orders_data'], [0, 0, 1])
+
+        with mock.patch.object(views, 'render') as render:
+            self.get(views.restaurant_stats, **{'from': start.isoformat(), 'to': self.day.isoformat()})
+        context = render.call_args[0][2]
+        self.assertEqual(json.loads(context['orders_data']), [0, 0, 1])
+        self.assertEqual(context['revenue'], Decimal('42.00'))
+
+    def test_invalid_periods_are_rejected(self):
+        periods = [
+            ('2026-01-01', '2025-12-31'),
+            ('2025-01-01', '2026-12-31'),
+            ('0001-01-01', '2025-01-01'),
+            ('9999-12-30', '9999-12-31'),
+        ]
+        for start, end in periods:
+            for view in (views.restaurant_stats, views.restaurant_stats_data):
+                with self.subTest(view=view.__name__, start=start, end=end):
+                    self.assertEqual(self.get(view, **{'from': start, 'to': end}).status_code, 400)
+
+    def test_longest_period_is_accepted(self):
+        start = self.day - datetime.timedelta(days=MAX_REPORT_DAYS - 1)
+        response = self.get(views.restaurant_stats_data, **{'from': start.isoformat(), 'to': self.day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)['dates']), MAX_REPORT_DAYS)
+
+
+class PosOrderTests(TestCase):
+    """Tickets de caisse et clé d'idempotence (pos.py, views.create_order)"""
+
+    def setUp(self):
+        city = City.objects.create(name='Fès')
+        self.restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=city, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma',
+        )
+        self.dish = Dish.objects.create(
+            name='Tajine', description='Tajine aux pruneaux', price_range=Dish.PRICE_MEDIUM, type=Dish.SALTY,
+            restaurant=self.restaurant,
+        )
+        self.user = User.objects.create(username='caisse')
+        RestaurantAccount.objects.create(user=self.user, restaurant=self.restaurant, is_active=True)
+
+    def post_ticket(self, quantity, key='ticket-1', **fields):
+        ticket = {
+            'restaurant_id': self.restaurant.id, 'idempotency_key': key,
+            'items': [{'dish_id': self.dish.id, 'quantity': quantity, 'price': '0.01'}], **fields,
+        }
+        request = RequestFactory().post('/', json.dumps(ticket), content_type='application/json')
+        request.user = self.user
+        response = views.create_order(request)
+        return response.status_code, json.loads(response.content)
+
+    def test_exact_replay_returns_the_first_order(self):
+        status, first = self.post_ticket(2, notes='Sans coriandre')
+        self.assertEqual(status, 201)
+        # Prix du serveur, pas celui envoyé par la caisse
+        self.assertEqual(Decimal(first['total']), 2 * self.dish.unit_price)
+
+        status, replay = self.post_ticket(2, notes='Sans coriandre')
+        self.assertEqual(status, 200)
+        self.assertTrue(replay['replayed'])
+        self.assertEqual(replay['order_id'], first['order_id'])
+        self.assertEqual(Order.objects.filter(restaurant=self.restaurant).count(), 1)
+
+    def test_modified_replay_is_refused(self):
+        self.assertEqual(self.post_ticket(2)[0], 201)
+        status, data = self.post_ticket(3)
+        self.assertEqual(status, 409)
+        self.assertFalse(data['success'])
+        self.assertEqual(self.post_ticket(2, notes='Table du fond')[0], 409)
+        self.assertEqual(Order.objects.get(restaurant=self.restaurant).items.get().quantity, 2)
+        # Nouvelle clé: nouveau ticket
+        self.assertEqual(self.post_ticket(3, key='ticket-2')[0], 201)
+
+    def test_lines_of_a_dish_are_merged(self):
+        order, created = create_pos_order(self.restaurant, [(self.dish.id, 1), (self.dish.id, 2)], 'ticket-3')
+        self.assertTrue(created)
+        self.assertEqual(order.items.get().quantity, 3)
+        replay, created = create_pos_order(self.restaurant, [(self.dish.id, 3)], 'ticket-3')
+        self.assertEqual((replay.pk, created), (order.pk, False))
+        with self.assertRaises(IdempotencyConflict):
+            create_pos_order(self.restaurant, [(self.dish.id, 1)], 'ticket-3')
+
+
+class CacheMetricsTests(TestCase):
+    """Compteurs du cache à deux niveaux reportés par plusieurs workers"""
+
+    def worker(self):
+        return TieredCache('shared', {'OPTIONS': {'METRICS_FLUSH_INTERVAL': 0}})
+
+    def test_workers_reports_are_summed(self):
+        first, second = self.worker(), self.worker()
+        first.set('plat', 'tajine')
+        first.get('plat')
+        second.get('plat')
+        second.get('absent')
+        first.get('plat')
+
+        metrics = shared_metrics(first.shared)
+        self.assertEqual(metrics['workers'], 2)
+        self.assertEqual(
+            {metric: metrics[metric] for metric in ('local_hits', 'shared_hits', 'misses', 'sets')},
+            {'local_hits': 2, 'shared_hits': 1, 'misses': 1, 'sets': 1},
+        )
+        self.assertEqual(metrics['hit_rate'], 0.75)
+
+    def test_expired_workers_are_forgotten(self):
+        first, second = self.worker(), self.worker()
+        first.get('absent')
+        first.shared.delete('cache_metrics:' + first._worker_id)
+        second.get('absent')
+        self.assertEqual(first.shared.get('cache_metrics:workers'), [second._worker_id])
+        self.assertEqual(shared_metrics(second.shared)['misses'], 1)
+
+
+class RatingAggregatesTests(TestCase):
+    """Agrégats de notes dénormalisés sur Restaurant (signaux, ReviewAdmin, restaurant_reviews)"""
+
+    def setUp(self):
+        city = City.objects.create(name='Fès')
+        self.restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=city, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma',
+        )
+        self.user = User.objects.create(username='gerant')
+        RestaurantAccount.objects.create(user=self.user, restaurant=self.restaurant, is_active=True)
+        self.reviews = [
+            Review.objects.create(
+                user=User.objects.create(username=f'client{index}'), restaurant=self.restaurant,
+                rating=rating, is_published=published,
+            )
+            for index, (rating, published) in enumerate([(5, True), (4, True), (4, True), (2, False)])
+        ]
+
+    def aggregates(self):
+        self.restaurant.refresh_from_db()
+        return (self.restaurant.rating_count, self.restaurant.rating_sum, self.restaurant.ratings_histogram)
+
+    def assertConsistent(self):
+        stored = self.aggregates()
+        self.restaurant.refresh_rating_aggregates()
+        self.assertEqual(stored, self.aggregates())
+
+    def test_reviews_update_aggregates(self):
+        self.assertEqual(self.aggregates(), (3, 13, {5: 1, 4: 2, 3: 0, 2: 0, 1: 0}))
+        self.assertEqual(self.restaurant.rating, 13 / 3)
+
+        review = self.reviews[1]
+        review.rating = 1
+        review.save()
+        self.assertEqual(self.aggregates(), (3, 10, {5: 1, 4: 1, 3: 0, 2: 0, 1: 1}))
+
+        hidden = self.reviews[3]
+        hidden.is_published = True
+        hidden.save()
+        self.reviews[0].delete()
+        self.assertEqual(self.aggregates(), (3, 7, {5: 0, 4: 1, 3: 0, 2: 1, 1: 1}))
+        self.assertConsistent()
+
+    def test_admin_bulk_actions_refresh_aggregates(self):
+        review_admin = ReviewAdmin(Review, admin.site)
+        review_admin.unpublish_reviews(None, Review.objects.filter(rating=4))
+        self.assertEqual(self.aggregates(), (1, 5, {5: 1, 4: 0, 3: 0, 2: 0, 1: 0}))
+        review_admin.publish_reviews(None, Review.objects.all())
+        self.assertEqual(self.aggregates(), (4, 15, {5: 1, 4: 2, 3: 0, 2: 1, 1: 0}))
+        self.assertConsistent()
+
+    def test_review_page_statistics(self):
+        def context(**params):
+            request = RequestFactory().get('/', params)
+            request.user = User.objects.get(pk=self.user.pk)
+            with mock.patch.object(views, 'render') as render:
+                views.restaurant_reviews(request)
+            return render.call_args[0][2]
+
+        # Avis publiés: agrégats du restaurant, sans requête par nombre d'étoiles
+        published = context(status='published')
+        self.assertEqual((published['total_reviews'], published['avg_rating']), (3, 4.3))
+        self.assertAlmostEqual(published['ratings_distribution'][4], 200 / 3)
+
+        # Tous les avis, y compris masqués: statistiques de la liste affichée
+        listed = context()
+        self.assertEqual((listed['total_reviews'], listed['avg_rating']), (4, 3.8))
+        self.assertEqual(listed['ratings_distribution'][2], 25)
+
+
+class DishFacetIndexTests(TestCase):
+    """Index de facettes des plats (dish_index.py) et clause SQL équivalente"""
+
+    def setUp(self):
+        fes = City.objects.create(name='Fès')
+        rabat = City.objects.create(name='Rabat')
+        restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=fes, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma',
+        )
+        soups = Category.objects.create(name='Soupes', restaurant=restaurant)
+        dishes = [
+            ('Harira', Dish.SALTY, Dish.PRICE_LOW, fes, soups, {'is_vegetarian': True, 'has_gluten': True}),
+            ('Zaalouk', Dish.SALTY, Dish.PRICE_LOW, rabat, None, {'is_vegetarian': True, 'is_vegan': True}),
+            ('Pastilla', Dish.SALTY, Dish.PRICE_HIGH, fes, None, {'has_gluten': True, 'has_nuts': True}),
+            ('Chebakia', Dish.SWEET, Dish.PRICE_MEDIUM, None, None, {'has_sugar': True, 'has_nuts': True}),
+            ('Thé à la menthe', Dish.DRINK, Dish.PRICE_LOW, rabat, None, {'is_vegan': True, 'has_sugar': True}),
+        ]
+        self.ids = {}
+        for name, dish_type, price_range, city, category, flags in dishes:
+            self.ids[name] = Dish.objects.create(
+                name=name, description=name, type=dish_type, price_range=price_range, city=city,
+                category=category, restaurant=restaurant, **flags,
+            ).id
+        self.fes, self.rabat, self.soups = fes, rabat, soups
+        invalidate_dish_index()
+
+    def names(self, ids):
+        by_id = {dish_id: name for name, dish_id in self.ids.items()}
+        return {by_id[dish_id] for dish_id in ids}
+
+    def test_index_matches_the_sql_filter(self):
+        combinations = [
+            {},
+            {'require': ['is_vegetarian']},
+            {'exclude': ['has_gluten', 'has_nuts']},
+            {'type': Dish.SALTY, 'price_range': [Dish.PRICE_LOW, Dish.PRICE_HIGH]},
+            {'city': [self.fes.id, 0]},
+            {'city': str(self.rabat.id), 'require': ['is_vegan']},
+            {'category': self.soups.id},
+            {'category': 0, 'exclude': ['has_sugar']},
+            {'type': 'inconnu'},
+            {'city': ['abc', 999999]},
+        ]
+        index = get_dish_index()
+        for filters in combinations:
+            with self.subTest(filters=filters):
+                indexed = set(index.matching_ids(index.match(**filters)).tolist())
+                queried = set(Dish.objects.filter(dish_filters_q(filters)).values_list('id', flat=True))
+                self.assertEqual(indexed, queried)
+
+        matched = index.match(exclude=['has_gluten', 'has_nuts'])
+        self.assertEqual(self.names(index.matching_ids(matched)), {'Zaalouk', 'Thé à la menthe'})
+
+    def test_facet_counts(self):
+        index = get_dish_index()
+        counts = index.facet_counts(index.match(exclude=['is_vegan']))
+        self.assertEqual(counts['total'], 3)
+        self.assertEqual(counts['type'], {Dish.SWEET: 1, Dish.SALTY: 2, Dish.DRINK: 0})
+        self.assertEqual(counts['city'], {self.fes.id: 2})
+        self.assertEqual(counts['flags']['has_nuts'], 2)
+        self.assertEqual(counts['flags']['is_vegetarian'], 1)
+
+    def test_filter_dishes_by_ids_or_where_clause(self):
+        index = get_dish_index()
+        filters = {'require': ['is_vegetarian']}
+        mask = index.match(**filters)
+        by_ids = filter_dishes(Dish.objects.all(), index, mask, filters)
+        with mock.patch('foodapp.dish_index.MAX_ID_FILTER', 0):
+            by_clause = filter_dishes(Dish.objects.all(), index, mask, filters)
+        self.assertIn('IN (', str(by_ids.query))
+        self.assertNotIn('IN (', str(by_clause.query))
+        self.assertEqual(set(by_ids), set(by_clause))
+        self.assertEqual(self.names(dish.id for dish in by_clause), {'Harira', 'Zaalouk'})
+
+    def test_request_parameters(self):
+        params = QueryDict('dish_type=salty&price=low&dietary=vegetarian&health_issues=gluten_free&has_nuts=0')
+        self.assertEqual(dish_filters_from_params(params), {
+            'type': Dish.SALTY,
+            'price_range': [Dish.PRICE_LOW],
+            'require': ['is_vegetarian'],
+            'exclude': ['has_gluten', 'has_nuts'],
+        })
+        index = get_dish_index()
+        mask = index.match(**dish_filters_from_params(params))
+        self.assertEqual(self.names(index.matching_ids(mask)), {'Zaalouk'})
+
+    def test_dish_changes_rebuild_the_index(self):
+        def vegan():
+            index = get_dish_index()
+            return self.names(index.matching_ids(index.match(require=['is_vegan'])))
+
+        self.assertNotIn('Harira', vegan())
+        dish = Dish.objects.get(pk=self.ids['Harira'])
+        dish.is_vegan = True
+        with self.captureOnCommitCallbacks(execute=True):
+            dish.save()
+        self.assertIn('Harira', vegan())
+
+
+class DishSortingTests(TestCase):
+    """Tri SQL et pagination par clé de la liste des plats (dish_sorting.py)"""
+
+    def setUp(self):
+        city = City.objects.create(name='Fès')
+        restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=city, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma',
+        )
+        # Noms, gammes de prix et calories en double, calories manquantes
+        dishes = [
+            ('Harira', 'L', 250), ('Tajine', 'M', None), ('Couscous', 'M', 600), ('Tajine', 'H', 600),
+            ('Briouates', 'L', None), ('Pastilla', 'H', 450), ('Msemen', 'L', 250),
+        ]
+        for name, price_range, calories in dishes:
+            Dish.objects.create(
+                name=name, description=name, price_range=price_range, calories=calories,
+                type=Dish.SALTY, restaurant=restaurant,
+            )
+
+    def walk(self, sort_by, page_size=2):
+        """Identifiants obtenus en suivant les curseurs de page en page"""
+        ids, cursor = [], None
+        while True:
+            page, cursor = dish_page(Dish.objects.all(), sort_by, cursor, page_size=page_size)
+            self.assertLessEqual(len(page), page_size)
+            ids += [dish.id for dish in page]
+            if cursor is None:
+                return ids
+
+    def test_pages_follow_the_full_ordering(self):
+        for sort_by in DISH_SORTS:
+            with self.subTest(sort_by=sort_by):
+                expected = list(Dish.objects.order_by(*sort_ordering(sort_by)).values_list('id', flat=True))
+                self.assertEqual(self.walk(sort_by), expected)
+                self.assertEqual(self.walk(sort_by, page_size=3), expected)
+
+    def test_sort_keys(self):
+        def values(sort_by, field):
+            return [getattr(Dish.objects.get(pk=dish_id), field) for dish_id in self.walk(sort_by)]
+
+        self.assertEqual(values('price_asc', 'price_range'), ['L', 'L', 'L', 'M', 'M', 'H', 'H'])
+        self.assertEqual(values('price_desc', 'price_range'), ['H', 'H', 'M', 'M', 'L', 'L', 'L'])
+        # Plats sans calories en dernier
+        self.assertEqual(values('calories', 'calories'), [250, 250, 450, 600, 600, None, None])
+
+    def test_invalid_cursor_restarts_from_the_first_page(self):
+        first, _cursor = dish_page(Dish.objects.all(), 'name', page_size=2)
+        for cursor in ('pas-un-curseur', 'eyJ2IjoiYSJ9', 'eyJ2IjpbXSwiaWQiOiJ4In0'):
+            with self.subTest(cursor=cursor):
+                page, _cursor = dish_page(Dish.objects.all(), 'name', cursor, page_size=2)
+                self.assertEqual(page, first)
+
+    @override_settings(DISH_NATIVE_SORT=True)
+    def test_native_sort_pages(self):
+        def fast_sort_dishes(dishes, sort_by):
+            return sorted(dishes, key=lambda dish: (dish['name'], dish['id']))
+
+        with mock.patch('foodapp.dish_sorting.fast_sort_dishes', fast_sort_dishes):
+            ids = self.walk('name', page_size=3)
+        self.assertEqual(ids, list(Dish.objects.order_by('name', 'id').values_list('id', flat=True)))
+
+
+class CatalogApiTests(TestCase):
+    """Pagination par identifiant, champs et flux NDJSON de /api/dishes/ et /api/restaurants/"""
+
+    def setUp(self):
+        city = City.objects.create(name='Fès')
+        self.restaurants = [
+            Restaurant.objects.create(
+                name=name, city=city, address='Médina', phone='0600000000', email='contact@dartajine.ma',
+            )
+            for name in ('Dar Tajine', 'Riad Zitoun', 'Café Clock')
+        ]
+        self.dishes = [
+            Dish.objects.create(
+                name=f'Plat {index}', description='Plat', price_range='M', type=Dish.SALTY, city=city,
+                restaurant=self.restaurants[0], is_vegetarian=index % 2 == 0,
+            )
+            for index in range(5)
+        ]
+        # Pages mises en cache par un test précédent sous la même version du catalogue
+        cache.clear()
+        invalidate_dish_index()
+
+    def get(self, view, **params):
+        request = RequestFactory().get('/', params)
+        request.user = AnonymousUser()
+        return view(request)
+
+    def get_json(self, view, **params):
+        response = self.get(view, **params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def walk(self, view, **params):
+        ids, after = [], 0
+        while after is not None:
+            page = self.get_json(view, after=after, **params)
+            ids += [result['id'] for result in page['results']]
+            after = page['next_after']
+        return ids
+
+    def test_pages_follow_the_ids(self):
+        self.assertEqual(self.walk(views.get_dishes, limit=2), [dish.id for dish in self.dishes])
+        restaurant_ids = [restaurant.id for restaurant in self.restaurants]
+        self.assertEqual(self.walk(views.get_restaurants, limit=2), restaurant_ids)
+        vegetarian = [dish.id for dish in self.dishes if dish.is_vegetarian]
+        self.assertEqual(self.walk(views.get_dishes, limit=2, dietary='vegetarian'), vegetarian)
+
+    def test_field_selection(self):
+        page = self.get_json(views.get_dishes, fields='id,city', limit=1)
+        city = {'id': self.dishes[0].city_id, 'name': 'Fès'}
+        self.assertEqual(page['results'], [{'id': self.dishes[0].id, 'city': city}])
+        self.assertEqual(page['next_after'], self.dishes[0].id)
+
+    def test_invalid_parameters(self):
+        for params in ({'fields': 'id,prix'}, {'after': 'x'}, {'limit': '0'}, {'after': '-1'}):
+            for view in (views.get_dishes, views.get_restaurants):
+                with self.subTest(view=view.__name__, params=params):
+                    response = self.get(view, **params)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('error', json.loads(response.content))
+
+    def test_ndjson_stream(self):
+        with mock.patch('foodapp.catalog_api.STREAM_BATCH_SIZE', 2):
+            response = self.get(views.get_dishes, format='ndjson', fields='id', after=self.dishes[0].id)
+            self.assertTrue(response.streaming)
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line) for line in lines], [{'id': dish.id} for dish in self.dishes[1:]])
+
+        response = self.get(views.get_restaurants, format='ndjson', limit=2)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['name'] for line in lines], ['Dar Tajine', 'Riad Zitoun'])
+
+
+@override_settings(
+    RESERVATION_OPENING_HOURS=[('19:00', '21:00')], RESERVATION_SLOT_MINUTES=30,
+    RESERVATION_DURATION_MINUTES=90, RESERVATION_CLOSED_WEEKDAYS=[0],
+)
+class AvailabilityCalendarTests(TestCase):
+    """Calendrier de disponibilité en cache, tenu à jour par les signaux de Reservation"""
+
+    def setUp(self):
+        city = City.objects.create(name='Fès')
+        self.restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=city, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma', capacity=4,
+        )
+        self.date = timezone.localdate() + datetime.timedelta(days=7)
+        while not is_open_day(self.date):
+            self.date += datetime.timedelta(days=1)
+        # Jours mis en cache par un test précédent (identifiants réutilisés après le rollback)
+        cache.clear()
+
+    def reserve(self, time, guests, date=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Reservation.objects.create(
+                restaurant=self.restaurant, name='Client', email='client@example.com', phone='0611111111',
+                date=date or self.date, time=time, guests=guests,
+            )
+
+    def remaining(self, date):
+        calendar = availability_calendar(self.restaurant, days=21)
+        return calendar.remaining[calendar.dates.index(date)].tolist()
+
+    def test_calendar_matches_the_day_occupancy(self):
+        self.reserve(datetime.time(19, 0), 1)
+        self.reserve(datetime.time(20, 0), 2)
+        # Créneaux 19:00, 19:30, 20:00, 20:30; un repas dure 1 h 30
+        self.assertEqual(self.remaining(self.date), [1, 1, 1, 2])
+        slots = DayOccupancy.load(self.restaurant, self.date).slots()
+        self.assertEqual([slot['remaining'] for slot in slots], [1, 1, 1, 2])
+
+        closed = self.date + datetime.timedelta(days=(7 - self.date.weekday()) % 7)
+        self.assertEqual(self.remaining(closed), [0, 0, 0, 0])
+        self.assertNotIn(closed, availability_calendar(self.restaurant, days=21).available_dates())
+
+    def test_reservation_changes_update_the_cached_days(self):
+        availability_calendar(self.restaurant, days=21)
+        with CaptureQueriesContext(connection) as queries:
+            availability_calendar(self.restaurant, days=21)
+        self.assertFalse([query for query in queries if 'foodapp_reservation' in query['sql']])
+
+        full = self.reserve(datetime.time(19, 30), 4)
+        self.assertEqual(self.remaining(self.date), [0, 0, 0, 0])
+        self.assertNotIn(self.date, availability_calendar(self.restaurant, days=21).available_dates())
+
+        # Déplacement: les deux jours sont recalculés
+        other_day = self.date + datetime.timedelta(days=1)
+        while not is_open_day(other_day):
+            other_day += datetime.timedelta(days=1)
+        full.date = other_day
+        with self.captureOnCommitCallbacks(execute=True):
+            full.save()
+        self.assertEqual(self.remaining(self.date), [4, 4, 4, 4])
+        self.assertEqual(self.remaining(other_day), [0, 0, 0, 0])
+
+        full.status = Reservation.STATUS_CANCELED
+        with self.captureOnCommitCallbacks(execute=True):
+            full.save()
+        self.assertEqual(self.remaining(other_day), [4, 4, 4, 4])
+
+    def test_calendar_api(self):
+        self.reserve(datetime.time(19, 0), 3)
+        request = RequestFactory().get('/', {'guests': 2, 'days': 14})
+        data = json.loads(views.availability_calendar_api(request, self.restaurant.id).content)
+        self.assertEqual(data['slots'], ['19:00', '19:30', '20:00', '20:30'])
+        offset = (self.date - timezone.localdate()).days
+        # Seul le créneau de 20:30 peut encore accueillir deux convives
+        self.assertEqual(data['free_slots'][offset], 0b1000)
+        self.assertIn(self.date.isoformat(), data['available_dates'])
+
+        for params in ({'guests': 0}, {'days': 91}, {'guests': 'deux'}):
+            with self.subTest(params=params):
+                response = views.availability_calendar_api(RequestFactory().get('/', params), self.restaurant.id)
+                self.assertEqual(response.status_code, 400)
+
+
+class LiveOrderEventsTests(TestCase):
+    """Événements des commandes en direct (events.py) et flux SSE (sse.py)"""
+
+    def setUp(self):
+        city = City.objects.create(name='Fès')
+        self.restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=city, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma',
+        )
+        self.dish = Dish.objects.create(
+            name='Tajine', description='Tajine aux pruneaux', price_range='M', type=Dish.SALTY,
+            restaurant=self.restaurant,
+        )
+        # Tampons d'événements propres au test (les identifiants sont réutilisés après le rollback)
+        restaurants = mock.patch.object(events, '_restaurants', defaultdict(events.RestaurantEvents))
+        restaurants.start()
+        self.addCleanup(restaurants.stop)
+
+    def events_since(self, restaurant_id, resume_token):
+        """Événements [(jeton, type, données)] manqués depuis resume_token; None si non repris"""
+        async def read():
+            subscription = events.subscribe(restaurant_id, resume_token)
+            return None if subscription is None else subscription.pending()
+        return asyncio.run(read())
+
+    def stream(self, resume_token=None, restaurant_id=None):
+        """Corps envoyé par le flux SSE jusqu'à la déconnexion du client"""
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def receive():
+            await asyncio.sleep(0.05)
+            return {'type': 'http.disconnect'}
+
+        async def restaurant_for(cookie_header):
+            return restaurant_id
+
+        async def active_orders(restaurant_id):
+            return [{'id': 1, 'status': Order.STATUS_NEW}]
+
+        headers = [(b'last-event-id', resume_token.encode())] if resume_token else []
+        scope = {'type': 'http', 'method': 'GET', 'headers': headers, 'query_string': b''}
+        with mock.patch.object(sse, 'restaurant_for', restaurant_for), \
+                mock.patch.object(sse, 'active_orders', active_orders):
+            asyncio.run(sse.order_stream(scope, receive, send))
+        return sent[0]['status'], ''.join(message.get('body', b'').decode() for message in sent[1:])
+
+    def test_order_changes_are_published(self):
+        start = events.current_token()
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(restaurant=self.restaurant, total_amount=Decimal('30.00'))
+            item = OrderItem.objects.create(order=order, dish=self.dish, quantity=1, price=Decimal('30.00'))
+        created = events.current_token()
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = Order.STATUS_PREPARING
+            order.save()
+            KitchenOrderStatus.objects.create(order=order, status=KitchenOrderStatus.STATUS_PREPARING)
+            item.is_completed = True
+            item.save()
+            # Sauvegarde sans changement: rien à publier
+            order.save()
+
+        published = self.events_since(self.restaurant.id, start)
+        self.assertEqual(
+            [event_type for _token, event_type, _data in published],
+            ['order_created', 'order_status', 'kitchen_status', 'item_status'],
+        )
+        self.assertEqual(published[0][2]['items'][0]['name'], 'Tajine')
+        self.assertEqual(published[2][2]['kitchen_status'], KitchenOrderStatus.STATUS_PREPARING)
+
+        # Reprise au milieu: seuls les événements suivants
+        resumed = self.events_since(self.restaurant.id, created)
+        self.assertEqual([event[0] for event in resumed], [event[0] for event in published[1:]])
+        self.assertEqual(self.events_since(self.restaurant.id + 1, start), [])
+
+    def test_unresumable_tokens(self):
+        restaurant_id = self.restaurant.id
+        start = events.current_token()
+        with mock.patch.object(events, 'EVENT_BUFFER_SIZE', 3):
+            for number in range(5):
+                events.publish(restaurant_id, 'order_status', {'id': number})
+        # Événements sortis du tampon, autre processus, jeton illisible
+        self.assertIsNone(self.events_since(restaurant_id, start))
+        self.assertIsNone(self.events_since(restaurant_id, 'autre-1'))
+        self.assertIsNone(self.events_since(restaurant_id, 'illisible'))
+        recent = self.events_since(restaurant_id, events.current_token())
+        self.assertEqual(recent, [])
+
+    def test_stream_replays_missed_events(self):
+        restaurant_id = self.restaurant.id
+        start = events.current_token()
+        events.publish(restaurant_id, 'order_status', {'id': 7, 'status': Order.STATUS_READY})
+        status, body = self.stream(start, restaurant_id)
+        self.assertEqual(status, 200)
+        self.assertIn('event: order_status', body)
+        self.assertIn('"status": "ready"', body)
+        self.assertNotIn('event: snapshot', body)
+
+    def test_stream_sends_a_snapshot_when_it_cannot_resume(self):
+        status, body = self.stream('autre-42', self.restaurant.id)
+        self.assertEqual(status, 200)
+        self.assertIn('event: snapshot', body)
+        self.assertIn(f'id: {events.current_token()}', body)
+        self.assertEqual(self.stream(restaurant_id=None)[0], 403)
+
+
+class KitchenDisplayTests(TestCase):
+    """Écrans de cuisine: deltas par poste (kitchen.py) et version HTTP (views.kitchen_orders)"""
+
+    def setUp(self):
+        city = City.objects.create(name='Fès')
+        self.restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=city, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma',
+        )
+        self.dish = Dish.objects.create(
+            name='Tajine', description='Tajine aux pruneaux', price_range='M', type=Dish.SALTY,
+            restaurant=self.restaurant,
+        )
+        self.user = User.objects.create(username='cuisine')
+        RestaurantAccount.objects.create(user=self.user, restaurant=self.restaurant, is_active=True)
+        self.grill = User.objects.create(username='grill')
+        self.pastry = User.objects.create(username='patisserie')
+
+    def order(self, assigned_to=None):
+        order = Order.objects.create(restaurant=self.restaurant, total_amount=Decimal('30.00'))
+        OrderItem.objects.create(order=order, dish=self.dish, quantity=1, price=Decimal('30.00'))
+        if assigned_to is not None:
+            KitchenOrderStatus.objects.create(order=order, assigned_to=assigned_to)
+        return order
+
+    def post(self, message, station=None):
+        params = f'?station={station.id}' if station else ''
+        request = RequestFactory().post(f'/{params}', json.dumps(message), content_type='application/json')
+        request.user = User.objects.get(pk=self.user.pk)
+        response = views.kitchen_orders(request, self.restaurant.id)
+        return response.status_code, json.loads(response.content)
+
+    def test_deltas_are_merged_and_filtered_by_station(self):
+        display = KitchenDisplay(self.restaurant.id, station=self.grill.id)
+        display.snapshot([
+            {'id': 1, 'assigned_to': self.grill.id},
+            {'id': 2, 'assigned_to': None},
+            {'id': 3, 'assigned_to': self.pastry.id},
+        ])
+        self.assertEqual(set(display.assigned), {1, 2})
+
+        deltas, to_load = display.deltas([
+            ('t1', 'order_status', {'id': 1, 'status': Order.STATUS_PREPARING}),
+            ('t2', 'item_status', {'id': 10, 'order_id': 1, 'is_completed': True}),
+            ('t3', 'order_status', {'id': 1, 'status': Order.STATUS_READY}),
+            # Commande prise par un autre poste: retirée de l'écran
+            ('t4', 'item_status', {'id': 20, 'order_id': 2, 'is_completed': True}),
+            ('t5', 'kitchen_status', {'id': 2, 'assigned_to': self.pastry.id}),
+            # Commande d'un autre poste réattribuée à celui-ci: à charger
+            ('t6', 'kitchen_status', {'id': 3, 'assigned_to': self.grill.id}),
+            ('t7', 'order_status', {'id': 4, 'status': Order.STATUS_READY}),
+        ])
+        self.assertEqual(deltas, {
+            ('order_status', 1): {'type': 'order_status', 'id': 1, 'status': Order.STATUS_READY},
+            ('item_status', 1, 10): {'type': 'item_status', 'id': 10, 'order_id': 1, 'is_completed': True},
+            ('order_removed', 2): {'type': 'order_removed', 'id': 2},
+        })
+        self.assertEqual(to_load, {3})
+
+        deltas, _to_load = display.deltas([('t8', 'order_status', {'id': 1, 'status': Order.STATUS_DELIVERED})])
+        self.assertEqual(list(deltas), [('order_removed', 1)])
+        self.assertNotIn(1, display.assigned)
+
+    def test_http_display_by_station(self):
+        grill_order = self.order(assigned_to=self.grill)
+        pastry_order = self.order(assigned_to=self.pastry)
+        free_order = self.order()
+        request = RequestFactory().get('/', {'station': self.grill.id})
+        request.user = User.objects.get(pk=self.user.pk)
+        snapshot = json.loads(views.kitchen_orders(request, self.restaurant.id).content)
+        self.assertEqual(snapshot['type'], 'snapshot')
+        self.assertEqual({order['id'] for order in snapshot['orders']}, {grill_order.id, free_order.id})
+        self.assertNotIn(pastry_order.id, [order['id'] for order in snapshot['orders']])
+
+    def test_http_commands(self):
+        order = self.order()
+        item = order.items.get()
+        status, snapshot = self.post({'type': 'tick', 'item_id': item.id})
+        self.assertEqual(status, 200)
+        self.assertTrue(snapshot['orders'][0]['items'][0]['is_completed'])
+
+        status, snapshot = self.post(
+            {'type': 'kitchen_status', 'order_id': order.id, 'status': 'preparing', 'assigned_to': self.pastry.id},
+            station=self.grill,
+        )
+        self.assertEqual((status, snapshot['orders']), (200, []))
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.STATUS_PREPARING)
+        self.assertEqual(order.kitchen_status.assigned_to, self.pastry)
+
+        for message in ({'type': 'kitchen_status', 'order_id': order.id, 'status': 'brûlé'},
+                        {'type': 'tick', 'item_id': item.id + 100},
+                        {'type': 'inconnu'}):
+            with self.subTest(message=message):
+                self.assertEqual(self.post(message)[0], 400)
+
+
+class RestaurantDashboardTests(TestCase):
+    """Compteurs de réservations en cache et pages par clé des tableaux de bord (dashboard.py)"""
+
+    def setUp(self):
+        city = City.objects.create(name='Fès')
+        self.restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=city, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma',
+        )
+        today = timezone.localdate()
+        slots = [
+            (today, datetime.time(20, 0), Reservation.STATUS_PENDING),
+            (today, datetime.time(20, 0), Reservation.STATUS_CONFIRMED),
+            (today, datetime.time(12, 30), Reservation.STATUS_CONFIRMED),
+            (today - datetime.timedelta(days=1), datetime.time(21, 0), Reservation.STATUS_CANCELED),
+            (today + datetime.timedelta(days=2), datetime.time(19, 0), Reservation.STATUS_PENDING),
+        ]
+        self.reservations = [
+            Reservation.objects.create(
+                restaurant=self.restaurant, name='Client', email='client@example.com', phone='0611111111',
+                date=date, time=time, status=status,
+            )
+            for date, time, status in slots
+        ]
+        cache.clear()
+
+    def reservation_queries(self, queries):
+        return [query for query in queries if 'FROM "foodapp_reservation"' in query['sql']]
+
+    def test_summary_is_cached_until_a_reservation_changes(self):
+        expected = {'total': 5, 'pending': 2, 'confirmed': 2, 'canceled': 1, 'completed': 0}
+        self.assertEqual(reservation_summary(self.restaurant.id), expected)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(reservation_summary(self.restaurant.id), expected)
+        self.assertEqual(self.reservation_queries(queries), [])
+
+        reservation = self.reservations[0]
+        reservation.status = Reservation.STATUS_COMPLETED
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation.save()
+        self.assertEqual(reservation_summary(self.restaurant.id)['completed'], 1)
+        self.assertEqual(reservation_summary(self.restaurant.id)['pending'], 1)
+
+        ReservationAdmin(Reservation, admin.site).mark_as_canceled(None, Reservation.objects.all())
+        self.assertEqual(reservation_summary(self.restaurant.id)['canceled'], 5)
+
+    def test_reservation_pages(self):
+        expected = [
+            reservation.id for reservation in
+            sorted(self.reservations, key=lambda reservation: (reservation.date, reservation.time, reservation.id),
+                   reverse=True)
+        ]
+        ids, cursor = [], None
+        while True:
+            page, cursor = reservation_page(Reservation.objects.all(), cursor, page_size=2)
+            ids += [reservation.id for reservation in page]
+            if cursor is None:
+                break
+        self.assertEqual(ids, expected)
+        # Curseur invalide: première page
+        self.assertEqual(reservation_page(Reservation.objects.all(), 'abc', page_size=2)[0][0].id, expected[0])
+
+    def test_dashboard_context(self):
+        context = restaurant_dashboard_context(self.restaurant, QueryDict('status=confirmed'))
+        self.assertEqual([reservation.status for reservation in context['reservations']], ['confirmed'] * 2)
+        self.assertEqual((context['total_reservations'], context['pending_reservations']), (5, 2))
+        self.assertEqual(len(context['today_reservations']), 3)
+        self.assertIsNone(context['next_cursor'])
+
+        context = restaurant_dashboard_context(self.restaurant, QueryDict('date=pas-une-date'))
+        self.assertEqual(context['reservations'], [])
+
+
+class PlatformCountersTests(TestCase):
+    """Compteurs globaux tenus par les signaux et recomptés périodiquement (counters.py)"""
+
+    def setUp(self):
+        self.city = City.objects.create(name='Fès')
+        self.restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=self.city, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma', is_open=True,
+        )
+        self.dish = Dish.objects.create(
+            name='Tajine', description='Tajine aux pruneaux', price_range='M', type=Dish.SALTY,
+            restaurant=self.restaurant,
+        )
+        platform_counters()
+
+    def counters(self):
+        row = platform_counters()
+        return {field: getattr(row, field) for field in count_platform()}
+
+    def assertInSync(self):
+        self.assertEqual(self.counters(), count_platform())
+        self.assertEqual(reconcile_platform_counters(), {})
+
+    def test_signals_keep_counters_in_sync(self):
+        self.assertEqual(self.counters()['salty_dishes'], 1)
+
+        self.dish.type = Dish.SWEET
+        self.dish.is_vegetarian = True
+        self.dish.save()
+        self.restaurant.is_open = False
+        self.restaurant.save()
+        staff = User.objects.create(username='equipe', is_staff=True)
+        City.objects.create(name='Rabat')
+        counters = self.counters()
+        self.assertEqual((counters['salty_dishes'], counters['sweet_dishes']), (0, 1))
+        self.assertEqual((counters['vegetarian_dishes'], counters['open_restaurants']), (1, 0))
+        self.assertEqual(counters['cities'], 2)
+        self.assertInSync()
+
+        # Instances chargées avec des champs différés, suppressions en cascade
+        dish = Dish.objects.only('id').get(pk=self.dish.pk)
+        dish.type = Dish.DRINK
+        dish.save()
+        user = User.objects.only('id').get(pk=staff.pk)
+        user.is_staff = False
+        user.save()
+        self.assertInSync()
+        self.restaurant.delete()
+        User.objects.get(pk=staff.pk).delete()
+        self.assertEqual(self.counters()['dishes'], 0)
+        self.assertInSync()
+
+    def test_bulk_updates_are_reconciled(self):
+        Dish.objects.update(is_vegetarian=True)
+        Restaurant.objects.update(is_open=False)
+        self.assertEqual(self.counters()['vegetarian_dishes'], 0)
+
+        output = io.StringIO()
+        call_command('reconcile_platform_counters', stdout=output)
+        self.assertIn('vegetarian_dishes: 0 -> 1', output.getvalue())
+        self.assertIn('open_restaurants: 1 -> 0', output.getvalue())
+        self.assertInSync()
+
+        DishAdmin(Dish, admin.site).mark_as_vegetarian(mock.Mock(), Dish.objects.filter(pk=self.dish.pk))
+        self.assertInSync()
+
+
+class AnonymousPageCacheTests(TestCase):
+    """Cache des pages publiques pour les visiteurs anonymes (page_cache.py)"""
+
+    def setUp(self):
+        self.renders = 0
+
+        @cache_anonymous_page
+        def page(request):
+            self.renders += 1
+            return HttpResponse(
+                '<input type="hidden" name="csrfmiddlewaretoken" value="jeton-du-premier-visiteur">'
+                f'<p>Rendu {self.renders} pour {request.user}</p>'
+            )
+        self.page = page
+        cache.clear()
+
+    def get(self, path='/plats/', user=None, language='fr', method='get', **headers):
+        request = getattr(RequestFactory(), method)(path, **headers)
+        request.user = user or AnonymousUser()
+        request.LANGUAGE_CODE = language
+        return self.page(request)
+
+    def page_text(self, response):
+        """Contenu sans le jeton CSRF, propre à chaque visiteur"""
+        return re.sub(rb'value="[^"]*"', b'', response.content)
+
+    def test_anonymous_pages_are_shared(self):
+        first = self.get('/plats/?type=salty&price=&city=1')
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.has_header('ETag'))
+        # Mêmes paramètres non vides, dans un autre ordre
+        second = self.get('/plats/?city=1&type=salty')
+        self.assertEqual(self.renders, 1)
+        self.assertEqual(self.page_text(second), self.page_text(first))
+        self.assertIn('private', second['Cache-Control'])
+
+        # Le jeton CSRF du premier visiteur n'est pas servi aux suivants
+        self.assertNotIn(b'jeton-du-premier-visiteur', second.content)
+        self.assertNotIn(b'__page_cache_csrf_token__', second.content)
+
+        self.get('/plats/?city=1&type=salty', language='en')
+        self.get('/plats/?city=2&type=salty')
+        self.assertEqual(self.renders, 3)
+
+    def test_etag_revalidation(self):
+        etag = self.get()['ETag']
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"autre"').status_code, 200)
+        self.assertEqual(self.renders, 1)
+
+    def test_logged_in_users_and_posts_bypass_the_cache(self):
+        self.get()
+        user = User.objects.create(username='client')
+        response = self.get(user=user)
+        self.assertIn(b'pour client', response.content)
+        self.assertFalse(response.has_header('ETag'))
+        self.get(method='post')
+        self.assertEqual(self.renders, 3)
+
+    def test_catalog_changes_serve_the_stale_copy_while_rebuilding(self):
+        first = self.get()
+        bump_catalog_version()
+        request = RequestFactory().get('/plats/')
+        request.LANGUAGE_CODE = 'fr'
+        # Reconstruction en cours dans un autre worker: copie précédente
+        cache.add(f'{page_key(request)}:lock', 1, 30)
+        self.assertEqual(self.page_text(self.get()), self.page_text(first))
+        self.assertEqual(self.renders, 1)
+
+        cache.delete(f'{page_key(request)}:lock')
+        self.assertIn(b'Rendu 2', self.get().content)
+
+
+class NewDishBadgesTests(TestCase):
+    """Badges « Nouveau » calculés en bloc et élagage des vues (viewed_dishes.py)"""
+
+    def setUp(self):
+        city = City.objects.create(name='Fès')
+        restaurant = Restaurant.objects.create(
+            name='Dar Tajine', city=city, address='Médina', phone='0600000000',
+            email='contact@dartajine.ma',
+        )
+        self.dishes = [
+            Dish.objects.create(
+                name=name, description=name, price_range='M', type=Dish.SALTY, restaurant=restaurant,
+            )
+            for name in ('Tajine', 'Harira', 'Pastilla', 'Couscous')
+        ]
+        # Couscous n'est plus nouveau
+        self.old = self.dishes[3]
+        Dish.objects.filter(pk=self.old.pk).update(
+            created_at=timezone.now() - datetime.timedelta(days=Dish.NEW_DISH_DAYS + 1)
+        )
+        self.user = User.objects.create(username='client')
+        cache.clear()
+
+    def badges(self, user):
+        dishes = set_new_badges(user, list(Dish.objects.order_by('id')))
+        return [dish.is_new_for_current_user for dish in dishes]
+
+    def views_read(self, user, dishes):
+        """Nombre de lectures de la table des vues pour les badges de dishes"""
+        with CaptureQueriesContext(connection) as queries:
+            set_new_badges(user, dishes)
+        return len([query for query in queries if 'foodapp_dish_viewed_by' in query['sql']])
+
+    def test_badges_in_one_query_then_from_the_cache(self):
+        self.dishes[0].mark_as_viewed(self.user)
+        self.old.mark_as_viewed(self.user)
+        cache.clear()
+
+        dishes = list(Dish.objects.order_by('id'))
+        self.assertEqual(self.views_read(self.user, dishes), 1)
+        self.assertEqual([dish.is_new_for_current_user for dish in dishes], [False, True, True, False])
+        # Même résultat que la vérification plat par plat
+        self.assertEqual(
+            [dish.is_new_for_current_user for dish in dishes],
+            [dish.is_new_for_user(self.user) for dish in dishes],
+        )
+        self.assertEqual(self.views_read(self.user, dishes), 0)
+        with self.assertNumQueries(0):
+            set_new_badges(AnonymousUser(), dishes)
+        self.assertEqual([dish.is_new_for_current_user for dish in dishes], [True, True, True, False])
+
+    def test_viewing_a_dish_writes_through(self):
+        self.assertEqual(self.badges(self.user), [True, True, True, False])
+        self.dishes[1].mark_as_viewed(self.user)
+        dishes = list(Dish.objects.order_by('id'))
+        self.assertEqual(self.views_read(self.user, dishes), 0)
+        self.assertEqual([dish.is_new_for_current_user for dish in dishes], [True, False, True, False])
+        # Autre utilisateur: aucun plat vu
+        self.assertEqual(self.badges(User.objects.create(username='autre')), [True, True, True, False])
+
+    def test_views_of_old_dishes_are_pruned(self):
+        other = User.objects.create(username='autre')
+        for user in (self.user, other):
+            self.dishes[0].mark_as_viewed(user)
+            self.old.mark_as_viewed(user)
+
+        output = io.StringIO()
+        call_command('prune_dish_views', stdout=output)
+        self.assertIn('2 vue(s)', output.getvalue())
+        self.assertFalse(self.old.viewed_by.exists())
+        self.assertEqual(self.dishes[0].viewed_by.count(), 2)
+        self.assertEqual(prune_dish_views(batch_size=1), 0)
+        self.assertEqual(self.badges(self.user), [False, True, True, False])
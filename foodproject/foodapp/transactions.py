@@ -0,0 +1,71 @@
+"""
+Nouvelles tentatives des transactions courtes perdues sur un conflit de verrou.
+
+Sur SQLite, une transaction qui ne peut pas prendre le verrou d'écriture échoue
+(« database is locked ») au lieu d'attendre son tour; une création concurrente
+peut aussi heurter une contrainte d'unicité. Les opérations concernées (prise
+de place, panier) sont rejouées après une attente aléatoire croissante.
+
+Seules ces erreurs passagères sont rejouées: une autre erreur d'intégrité (NOT
+NULL, clé étrangère, autre contrainte) est relevée immédiatement.
+"""
+import random
+import time
+
+from django.db import IntegrityError, OperationalError
+
+RETRY_TIMEOUT = 5.0
+RETRY_DELAY = 0.005
+MAX_RETRY_DELAY = 0.1
+
+# Messages des conflits de verrou passagers (SQLite, PostgreSQL, MySQL)
+LOCK_CONFLICT_MESSAGES = ('database is locked', 'database table is locked', 'deadlock')
+
+
+def is_lock_conflict(error):
+    message = str(error).lower()
+    return any(text in message for text in LOCK_CONFLICT_MESSAGES)
+
+
+def is_unique_violation(error, model, fields):
+    """
+    error viole-t-elle l'unicité de model sur fields ? Reconnue au nom d'une
+    UniqueConstraint (PostgreSQL) ou à la table et aux colonnes citées (SQLite,
+    noms générés pour unique_together)
+    """
+    message = str(error)
+    if 'unique' not in message.lower() and 'duplicate' not in message.lower():
+        return False
+    names = [
+        constraint.name for constraint in model._meta.constraints
+        if tuple(getattr(constraint, 'fields', ())) == tuple(fields)
+    ]
+    if any(name in message for name in names):
+        return True
+    columns = [model._meta.get_field(field).column for field in fields]
+    return model._meta.db_table in message and all(column in message for column in columns)
+
+
+def run_with_retries(function, timeout=RETRY_TIMEOUT, unique=()):
+    """
+    Exécute function(), qui ouvre sa propre transaction, en la rejouant sur
+    conflit de verrou pendant au plus timeout secondes. unique: couples
+    (modèle, champs) dont une violation d'unicité vient d'une création
+    concurrente et se résout en rejouant function()
+    """
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    while True:
+        try:
+            return function()
+        except OperationalError as error:
+            if not is_lock_conflict(error) or time.monotonic() >= deadline:
+                raise
+        except IntegrityError as error:
+            if not any(is_unique_violation(error, model, fields) for model, fields in unique):
+                raise
+            if time.monotonic() >= deadline:
+                raise
+        delay = min(RETRY_DELAY * 2 ** attempt, MAX_RETRY_DELAY)
+        time.sleep(random.uniform(0, delay))
+        attempt += 1
@@ -22,8 +22,12 @@ urlpatterns = [
     path('restaurants/', views.restaurants, name='restaurants'),
     path('restaurants/<int:restaurant_id>/', views.restaurant_detail, name='restaurant_detail'),
     path('reservation/<int:restaurant_id>/', views.reservation, name='reservation'),
+    path('reservation/detail/<int:reservation_id>/', views.reservation_detail, name='reservation_detail'),
+    path('reservation/modify/<int:reservation_id>/', views.reservation_modify, name='reservation_modify'),
+    path('reservation/cancel/<int:reservation_id>/', views.reservation_cancel, name='reservation_cancel'),
     path('dish-list/', views.dish_list, name='dish_list'),
     path('dish/<int:dish_id>/', views.dish_detail, name='dish_detail'),
+    path('search/', views.search, name='search'),
     
     # Restaurant dashboard
     path('restaurant/dashboard/', views.restaurant_dashboard, name='restaurant_dashboard'),
@@ -47,6 +51,7 @@ urlpatterns = [
     path('restaurant/create-order/', views.create_order, name='create_order'),  # Vue pour créer une commande
     path('restaurant/pos/<int:restaurant_id>/', views.restaurant_pos, name='restaurant_pos'),  # Vue pour l'interface caisse
     path('restaurant/kitchen/<int:restaurant_id>/', views.kitchen_dashboard, name='kitchen_dashboard'),  # Vue pour l'interface cuisine
+    path('restaurant/kitchen/<int:restaurant_id>/orders/', views.kitchen_orders, name='kitchen_orders'),  # Écran cuisine sans WebSocket
     
     # User routes
     path('user/profile/', views.user_profile, name='user_profile'),
@@ -65,6 +70,12 @@ urlpatterns = [
     # API
     path('api/dishes/', views.get_dishes, name='api_dishes'),
     path('api/restaurants/', views.get_restaurants, name='api_restaurants'),
+    path('api/autocomplete/', views.autocomplete, name='api_autocomplete'),
+    path('api/mark-dish-viewed/<int:dish_id>/', views.mark_dish_viewed, name='mark_dish_viewed'),
+    path('api/available-slots/<int:restaurant_id>/', views.available_slots, name='available_slots'),
+    path('api/restaurant/<int:restaurant_id>/availability/', views.availability_calendar_api, name='api_availability_calendar'),
+    path('api/restaurant/stats/', views.restaurant_stats_data, name='api_restaurant_stats'),
+    path('api/restaurant/orders/changes/', views.restaurant_order_changes, name='api_restaurant_order_changes'),
     
     # Auth
     path('login/', views.login_view, name='login'),
@@ -92,6 +103,7 @@ urlpatterns = [
 
     # API Endpoints
     path('api/cart/add/', views.add_to_cart, name='api_add_to_cart'),
+    path('api/cart/checkout/', views.checkout_cart, name='api_checkout_cart'),
     
     # Chatbot URLs
     path('chat/', views.chat_view, name='chat'),
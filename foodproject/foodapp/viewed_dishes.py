@@ -0,0 +1,91 @@
+"""
+Badges « Nouveau » par utilisateur (plats récents pas encore vus).
+
+Un plat est nouveau pendant Dish.NEW_DISH_DAYS jours après sa création
+(Dish.is_new). Pour un utilisateur connecté, le badge disparaît une fois le
+plat vu (Dish.viewed_by). Plutôt qu'une requête EXISTS par plat affiché,
+l'ensemble des plats récents vus par l'utilisateur est lu en une requête et
+gardé en cache sous une forme compacte: identifiants triés en uint32 (4 octets
+par plat vu, seuls les plats encore nouveaux comptent). Les badges d'une page
+se calculent ensuite en mémoire (np.isin).
+
+mark_dish_viewed enregistre la vue puis réécrit l'entrée du cache à partir de
+la base. Les vues de plats qui ne sont plus nouveaux ne servent plus: la
+commande périodique ``prune_dish_views`` les supprime.
+"""
+import datetime
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Dish
+
+DishView = Dish.viewed_by.through
+
+VIEWED_CACHE_TIMEOUT = 60 * 60
+
+
+def viewed_key(user_id):
+    return f'viewed:{user_id}'
+
+
+def new_since():
+    """Date de création à partir de laquelle un plat est nouveau"""
+    return timezone.now() - datetime.timedelta(days=Dish.NEW_DISH_DAYS)
+
+
+def load_viewed(user_id):
+    """Plats encore nouveaux vus par l'utilisateur (une requête), mis en cache"""
+    ids = np.array(sorted(
+        DishView.objects.filter(user_id=user_id, dish__created_at__gte=new_since())
+        .values_list('dish_id', flat=True)
+    ), dtype=np.uint32)
+    cache.set(viewed_key(user_id), ids.tobytes(), VIEWED_CACHE_TIMEOUT)
+    return ids
+
+
+def viewed_dish_ids(user_id):
+    cached = cache.get(viewed_key(user_id))
+    if cached is None:
+        return load_viewed(user_id)
+    return np.frombuffer(cached, dtype=np.uint32)
+
+
+def set_new_badges(user, dishes):
+    """Renseigne dish.is_new_for_current_user pour tous les plats, sans requête par plat"""
+    since = new_since()
+    recent = [dish for dish in dishes if dish.created_at >= since]
+    for dish in dishes:
+        dish.is_new_for_current_user = False
+    if not recent:
+        return dishes
+
+    if user.is_authenticated:
+        viewed = np.isin(np.array([dish.id for dish in recent], dtype=np.uint32), viewed_dish_ids(user.id))
+    else:
+        viewed = np.zeros(len(recent), dtype=bool)
+    for dish, seen in zip(recent, viewed):
+        dish.is_new_for_current_user = not seen
+    return dishes
+
+
+def mark_dish_viewed(user, dish):
+    """Enregistre la vue du plat et met à jour le cache de l'utilisateur"""
+    if not user.is_authenticated:
+        return
+    dish.viewed_by.add(user)
+    if dish.created_at >= new_since():
+        # Relu depuis la base: une vue enregistrée en parallèle n'est pas perdue
+        load_viewed(user.id)
+
+
+def prune_dish_views(batch_size=5000):
+    """Supprime les vues des plats qui ne sont plus nouveaux; renvoie le nombre de vues supprimées"""
+    old_dishes = Dish.objects.filter(created_at__lt=new_since()).values('id')
+    deleted = 0
+    while True:
+        ids = list(DishView.objects.filter(dish_id__in=old_dishes).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += DishView.objects.filter(id__in=ids).delete()[0]
@@ -3,8 +3,11 @@ from django.views.generic import ListView
 from django.shortcuts import render, get_object_or_404, redirect
 from django.http import JsonResponse, HttpResponseForbidden, HttpResponse, HttpResponseRedirect
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib.auth.models import User
 from django.contrib import messages
-from django.db.models import Count, Q, Sum, F, Case, When, IntegerField
+from django.db import DatabaseError
+from django.db.models import Count, Q, Sum, F, Max, Case, When, IntegerField
+from django.core.paginator import Paginator
 from django.utils import timezone
 from django.urls import reverse
 from datetime import datetime, timedelta
@@ -15,11 +18,13 @@ from django.views.decorators.csrf import csrf_exempt
 from formtools.wizard.views import SessionWizardView
 from django.core.files.storage import FileSystemStorage
 from django.conf import settings
+from .page_cache import cache_anonymous_page
 
 def index(request):
     """Vue de la page d'accueil qui redirige vers la page d'accueil principale"""
     return redirect('accueil')
 
+@cache_anonymous_page
 def restaurants(request):
     """Vue pour afficher la liste des restaurants avec filtres"""
     restaurants = Restaurant.objects.all()
@@ -47,6 +52,42 @@ def restaurants(request):
     }
     return render(request, 'foodapp/modern_restaurants.html', context)
 
+@require_POST
+def mark_dish_viewed(request, dish_id):
+    """
+    Marque un plat comme vu par l'utilisateur actuel
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'status': 'error', 'message': 'Utilisateur non authentifié'}, status=401)
+    
+    try:
+        dish = Dish.objects.get(id=dish_id)
+    except Dish.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Plat non trouvé'}, status=404)
+    dish.mark_as_viewed(request.user)
+    return JsonResponse({'status': 'success', 'message': 'Plat marqué comme vu'})
+
+@cache_anonymous_page
+def moroccan_cuisine(request):
+    """
+    Vue spéciale pour montrer les plats marocains aux touristes
+    """
+    # Tous les plats marocains en une requête, répartis ensuite en mémoire
+    all_moroccan_dishes = list(Dish.objects.filter(origin=Dish.MOROCCAN).order_by('name'))
+    
+    # Badges « Nouveau » de l'utilisateur calculés en bloc (voir viewed_dishes.py)
+    set_new_badges(request.user, all_moroccan_dishes)
+    
+    context = {
+        'recommended_dishes': [dish for dish in all_moroccan_dishes if dish.is_tourist_recommended],
+        'sweet_dishes': [dish for dish in all_moroccan_dishes if dish.type == Dish.SWEET],
+        'salty_dishes': [dish for dish in all_moroccan_dishes if dish.type == Dish.SALTY],
+        'drinks': [dish for dish in all_moroccan_dishes if dish.type == Dish.DRINK],
+        'total_dishes': len(all_moroccan_dishes),
+    }
+    
+    return render(request, 'foodapp/moroccan_cuisine.html', context)
+
 @csrf_exempt
 def dish_detail(request, dish_id):
     """Vue pour afficher les détails d'un plat spécifique"""
@@ -55,54 +96,169 @@ def dish_detail(request, dish_id):
         'dish': dish
     })
 
+@cache_anonymous_page
 def dish_list(request):
     """Vue pour afficher la liste des plats avec tri et filtrage"""
     dishes = Dish.objects.all()
-    sort_by = request.GET.get('sort', 'name')
+    sort_by = request.GET.get('sort', DEFAULT_SORT)
+    if sort_by not in DISH_SORTS:
+        sort_by = DEFAULT_SORT
     city_id = request.GET.get('city')
 
-    if city_id:
-        dishes = dishes.filter(city_id=city_id)
+    # Filtrage par facettes via l'index en mémoire (compteurs et plats retenus)
+    dish_index = get_dish_index()
+    filters = dish_filters_from_params(request.GET)
+    mask = dish_index.match(**filters)
+    dishes = filter_dishes(dishes, dish_index, mask, filters)
 
-    if USE_CPP_OPTIMIZATION:
-        # Convertir les plats en format compatible avec le module C++
-        dishes_data = [
-            {
-                'id': dish.id,
-                'name': dish.name,
-                'price_range': dish.price_range,
-                'type': dish.type,
-                'city_id': dish.city.id if dish.city else 0
-            }
-            for dish in dishes
-        ]
-        
-        # Utiliser le tri rapide C++
-        sorted_dishes = fast_sort_dishes(dishes_data, sort_by)
-        
-        # Reconvertir en QuerySet Django
-        dish_ids = [dish['id'] for dish in sorted_dishes]
-        dishes = Dish.objects.filter(id__in=dish_ids)
-        # Préserver l'ordre du tri C++
-        dishes = sorted(dishes, key=lambda x: dish_ids.index(x.id))
-    else:
-        # Tri Python standard
-        if sort_by == 'price_asc':
-            dishes = dishes.order_by('price_range')
-        elif sort_by == 'price_desc':
-            dishes = dishes.order_by('-price_range')
-        elif sort_by == 'name':
-            dishes = dishes.order_by('name')
+    # Tri SQL indexé et pagination par clé (curseur)
+    dishes, next_cursor = dish_page(
+        dishes.select_related('category'), sort_by, request.GET.get('cursor')
+    )
+
+    # Paramètres des liens de pagination (filtres conservés)
+    first_params = request.GET.copy()
+    first_params.pop('cursor', None)
+    next_params = first_params.copy()
+    if next_cursor:
+        next_params['cursor'] = next_cursor
 
     context = {
         'dishes': dishes,
         'current_sort': sort_by,
+        'next_cursor': next_cursor,
+        'next_page_query': next_params.urlencode(),
+        'first_page_query': first_params.urlencode(),
+        'is_first_page': not request.GET.get('cursor'),
         'cities': City.objects.all(),
-        'selected_city': city_id
+        'selected_city': city_id,
+        'selected_sort': sort_by,
+        'selected_dish_type': request.GET.get('dish_type', ''),
+        'selected_price': request.GET.get('price', ''),
+        'selected_dietary': request.GET.get('dietary', ''),
+        'selected_health_issues': request.GET.get('health_issues', ''),
+        'facet_counts': dish_index.facet_counts(mask),
     }
     
     return render(request, 'foodapp/dish_list.html', context)
 
+def get_dishes(request):
+    """
+    Vue API renvoyant les plats, filtrés par facettes via l'index en mémoire
+    (mêmes paramètres que la liste des plats).
+
+    Pagination par identifiant (?after=<id>&limit=), sélection des champs
+    (?fields=id,name,city), flux NDJSON (?format=ndjson) et, avec ?facets=1,
+    les compteurs de facettes. Les pages sont mises en cache par version du
+    catalogue (voir catalog_cache.py).
+    """
+    try:
+        params = PageParams(request, DISH_API_FIELDS)
+    except PageParamsError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    dishes = Dish.objects.select_related('city')
+    version = catalog_version()
+
+    def serialize(ids):
+        return cached_fragments('dish', ids, dishes.in_bulk, dish_api_data, version)
+
+    def matching_ids():
+        dish_index = get_dish_index()
+        filters = dish_filters_from_params(request.GET)
+        mask = dish_index.match(**filters)
+        return dish_index, mask, (dish_index.matching_ids(mask) if filters else None)
+
+    if params.stream:
+        _dish_index, _mask, ids = matching_ids()
+        if ids is not None:
+            batches = id_batches(ids.tolist(), params.after, params.limit)
+        else:
+            batches = keyset_id_batches(Dish.objects.all(), params.after, params.limit)
+        return ndjson_response((serialize(batch) for batch in batches), params)
+
+    def build_page():
+        dish_index, mask, ids = matching_ids()
+        if ids is not None:
+            # Identifiants triés de l'index: la page est lue par clé primaire
+            ids = ids[ids > params.after][:params.limit + 1].tolist()
+        else:
+            ids = Dish.objects.filter(id__gt=params.after).order_by('id').values_list('id', flat=True)
+            ids = ids[:params.limit + 1]
+        ids, next_after = page_ids(ids, params.limit)
+        extra = {'facets': dish_index.facet_counts(mask)} if request.GET.get('facets') else {}
+        return page_payload(serialize(ids), params, next_after, **extra)
+
+    return JsonResponse(single_flight(request_key('dishes', request), version, build_page))
+
+def get_restaurants(request):
+    """
+    Vue API renvoyant les restaurants, paginés par identifiant
+    (?after=<id>&limit=), avec sélection des champs et flux NDJSON
+    """
+    try:
+        params = PageParams(request, RESTAURANT_API_FIELDS)
+    except PageParamsError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    restaurants = Restaurant.objects.select_related('city')
+    version = catalog_version()
+
+    def serialize(ids):
+        return cached_fragments('restaurant', ids, restaurants.in_bulk, restaurant_api_data, version)
+
+    if params.stream:
+        batches = keyset_id_batches(Restaurant.objects.all(), params.after, params.limit)
+        return ndjson_response((serialize(batch) for batch in batches), params)
+
+    def build_page():
+        ids = Restaurant.objects.filter(id__gt=params.after).order_by('id').values_list('id', flat=True)
+        ids, next_after = page_ids(ids[:params.limit + 1], params.limit)
+        return page_payload(serialize(ids), params, next_after)
+
+    return JsonResponse(single_flight(request_key('restaurants', request), version, build_page))
+
+def search(request):
+    """Vue pour la recherche globale (index plein texte, voir search.py)"""
+    query = request.GET.get('q', '').strip()
+    results = search_objects(query) if query else {kind: ([], 0) for kind in SEARCH_SOURCES}
+    
+    context = {
+        'query': query,
+        'dishes': results['dish'][0],
+        'restaurants': results['restaurant'][0],
+        'knowledge_entries': results['knowledge'][0],
+        'forum_topics': results['forum'][0],
+        'result_counts': {kind: total for kind, (_objects, total) in results.items()},
+        'total_results': sum(total for _objects, total in results.values()),
+    }
+    
+    return render(request, 'foodapp/search_results.html', context)
+
+def autocomplete(request):
+    """
+    API de suggestions de saisie sur les noms de plats, restaurants et villes
+    (?q=<préfixe>&limit=&types=dish,restaurant,city), servie par un index en mémoire
+    """
+    query = request.GET.get('q', '')
+    try:
+        limit = int(request.GET.get('limit') or AUTOCOMPLETE_MAX_SUGGESTIONS)
+    except ValueError:
+        return JsonResponse({'error': "Paramètre 'limit' entier attendu"}, status=400)
+    kinds = [kind for kind in request.GET.get('types', '').split(',') if kind in AUTOCOMPLETE_KINDS]
+    
+    suggestions = []
+    for kind, pk, label in suggest(query, max(limit, 1), kinds):
+        if kind == 'dish':
+            url = reverse('dish_detail', args=[pk])
+        elif kind == 'restaurant':
+            url = reverse('restaurant_detail', args=[pk])
+        else:
+            url = f"{reverse('dish_list')}?city={pk}"
+        suggestions.append({'type': kind, 'id': pk, 'label': label, 'url': url})
+    
+    return JsonResponse({'query': query, 'suggestions': suggestions})
+
 def restaurant_detail(request, restaurant_id):
     """Vue pour afficher les détails d'un restaurant spécifique"""
     restaurant = get_object_or_404(Restaurant, id=restaurant_id)
@@ -118,19 +274,8 @@ def restaurant_detail(request, restaurant_id):
 @login_required
 def dashboard(request):
     """Vue pour le tableau de bord principal avec les statistiques"""
-    # Statistiques
-    restaurants_count = Restaurant.objects.count()
-    active_restaurants_count = Restaurant.objects.filter(is_open=True).count()
-    dishes_count = Dish.objects.count()
-    vegetarian_dishes_count = Dish.objects.filter(is_vegetarian=True).count()
-    cities_count = City.objects.count()
-    users_count = User.objects.count()
-    staff_count = User.objects.filter(is_staff=True).count()
-    
-    # Comptage par type de plat
-    sweet_dishes_count = Dish.objects.filter(type='sweet').count()
-    salty_dishes_count = Dish.objects.filter(type='salty').count()
-    drink_dishes_count = Dish.objects.filter(type='drink').count()
+    # Statistiques (une ligne tenue à jour par les signaux, voir counters.py)
+    counters = platform_counters()
     
     # Dernières données
     latest_restaurants = Restaurant.objects.all().order_by('-created_at')[:5]
@@ -140,16 +285,16 @@ def dashboard(request):
     cities = City.objects.all()
     
     context = {
-        'restaurants_count': restaurants_count,
-        'active_restaurants_count': active_restaurants_count,
-        'dishes_count': dishes_count,
-        'vegetarian_dishes_count': vegetarian_dishes_count,
-        'cities_count': cities_count,
-        'users_count': users_count,
-        'staff_count': staff_count,
-        'sweet_dishes_count': sweet_dishes_count,
-        'salty_dishes_count': salty_dishes_count,
-        'drink_dishes_count': drink_dishes_count,
+        'restaurants_count': counters.restaurants,
+        'active_restaurants_count': counters.open_restaurants,
+        'dishes_count': counters.dishes,
+        'vegetarian_dishes_count': counters.vegetarian_dishes,
+        'cities_count': counters.cities,
+        'users_count': counters.users,
+        'staff_count': counters.staff_users,
+        'sweet_dishes_count': counters.sweet_dishes,
+        'salty_dishes_count': counters.salty_dishes,
+        'drink_dishes_count': counters.drink_dishes,
         'latest_restaurants': latest_restaurants,
         'latest_dishes': latest_dishes,
         'cities': cities,
@@ -170,63 +315,9 @@ def restaurant_dashboard(request):
         # Si l'utilisateur n'a pas de compte restaurant associé, le rediriger vers l'accueil
         return redirect('index')
     
-    # Récupérer le restaurant associé à ce compte
-    restaurant = restaurant_account.restaurant
-    
-    # Récupérer les réservations de ce restaurant
-    # Filtrer par statut si demandé
-    status_filter = request.GET.get('status', None)
-    date_filter = request.GET.get('date', None)
-    
-    reservations = Reservation.objects.filter(restaurant=restaurant).order_by('-date', '-time')
-    
-    if status_filter:
-        reservations = reservations.filter(status=status_filter)
-    
-    if date_filter:
-        reservations = reservations.filter(date=date_filter)
-    
-    # Statistiques
-    total_reservations = Reservation.objects.filter(restaurant=restaurant).count()
-    pending_reservations = Reservation.objects.filter(
-        restaurant=restaurant, 
-        status=Reservation.STATUS_PENDING
-    ).count()
-    confirmed_reservations = Reservation.objects.filter(
-        restaurant=restaurant, 
-        status=Reservation.STATUS_CONFIRMED
-    ).count()
-    canceled_reservations = Reservation.objects.filter(
-        restaurant=restaurant, 
-        status=Reservation.STATUS_CANCELED
-    ).count()
-    
-    # Réservations pour aujourd'hui
-    today = timezone.now().date()
-    today_reservations = Reservation.objects.filter(
-        restaurant=restaurant, 
-        date=today
-    ).order_by('time')
-    
-    # Commandes récentes
-    recent_orders = Order.objects.filter(
-        restaurant=restaurant, 
-        status__in=[Order.STATUS_NEW, Order.STATUS_PREPARING, Order.STATUS_READY]
-    ).order_by('-order_time')[:5]
-    
-    context = {
-        'restaurant': restaurant,
-        'account': restaurant_account,
-        'reservations': reservations,
-        'today_reservations': today_reservations,
-        'total_reservations': total_reservations,
-        'pending_reservations': pending_reservations,
-        'confirmed_reservations': confirmed_reservations,
-        'canceled_reservations': canceled_reservations,
-        'status_filter': status_filter,
-        'date_filter': date_filter,
-        'recent_orders': recent_orders,
-    }
+    # Compteurs en cache, réservations par pages (voir dashboard.py)
+    context = restaurant_dashboard_context(restaurant_account.restaurant, request.GET)
+    context['account'] = restaurant_account
     
     return render(request, 'foodapp/restaurant_dashboard.html', context)
 
@@ -298,13 +389,13 @@ def user_profile(request):
         # Rediriger pour éviter les soumissions multiples
         return redirect('user_profile')
     
-    # Récupérer quelques plats recommandés
+    # Récupérer quelques plats recommandés, tirés au hasard (voir featured.py)
     if user_profile.is_vegan:
-        recommended_dishes = Dish.objects.filter(is_vegan=True)[:3]
+        recommended_dishes = featured_dishes('vegan', 3)
     elif user_profile.is_vegetarian:
-        recommended_dishes = Dish.objects.filter(is_vegetarian=True)[:3]
+        recommended_dishes = featured_dishes('vegetarian', 3)
     else:
-        recommended_dishes = Dish.objects.all().order_by('?')[:3]
+        recommended_dishes = featured_dishes('all', 3)
     
     context = {
         'user_profile': user_profile,
@@ -324,20 +415,16 @@ def reservation(request, restaurant_id):
     if request.method == 'POST':
         form = ReservationForm(request.POST)
         if form.is_valid():
-            # Vérifier la disponibilité
-            date = form.cleaned_data['date']
-            time = form.cleaned_data['time']
-            guests = form.cleaned_data['guests']
+            reservation_obj = form.save(commit=False)
+            reservation_obj.restaurant = restaurant
+            if request.user.is_authenticated:
+                reservation_obj.user = request.user
             
-            # Vérifier si le créneau est disponible
-            if is_slot_available(restaurant, date, time, guests):
-                reservation_obj = form.save(commit=False)
-                reservation_obj.restaurant = restaurant
-                if request.user.is_authenticated:
-                    reservation_obj.user = request.user
-                reservation_obj.save()
+            # Vérifier la disponibilité et enregistrer sous verrou
+            if book_reservation(reservation_obj):
                 success = True
             else:
+                reservation_obj = None
                 form.add_error(None, "Désolé, ce créneau n'est plus disponible. Veuillez choisir un autre horaire.")
     else:
         initial_data = {}
@@ -349,33 +436,199 @@ def reservation(request, restaurant_id):
             }
         form = ReservationForm(initial=initial_data)
     
-    # Récupérer les créneaux disponibles pour JavaScript
-    available_dates = get_available_dates(restaurant)
+    # Calendrier des places libres pour JavaScript (jours complets grisés)
+    calendar = availability_calendar(restaurant)
     
     context = {
         'restaurant': restaurant,
         'form': form,
         'success': success,
         'reservation': reservation_obj,
-        'available_dates': json.dumps([date.strftime('%Y-%m-%d') for date in available_dates])
+        'available_dates': json.dumps([date.strftime('%Y-%m-%d') for date in calendar.available_dates()]),
+        'availability_calendar': json.dumps(calendar.as_json()),
     }
     
     return render(request, 'foodapp/reservation.html', context)
 
+def availability_calendar_api(request, restaurant_id):
+    """
+    API du calendrier de disponibilité d'un restaurant (?guests=&days=): places
+    libres par jour et par créneau, et masque des créneaux libres de chaque jour
+    """
+    restaurant = get_object_or_404(Restaurant, id=restaurant_id)
+    try:
+        guests = int(request.GET.get('guests') or 1)
+        days = int(request.GET.get('days') or CALENDAR_DAYS)
+    except ValueError:
+        return JsonResponse({'error': "Paramètres 'guests' et 'days' entiers attendus"}, status=400)
+    if guests < 1 or not 1 <= days <= CALENDAR_DAYS:
+        return JsonResponse({'error': f"'guests' positif et 'days' entre 1 et {CALENDAR_DAYS} attendus"}, status=400)
+    
+    return JsonResponse(availability_calendar(restaurant, days).as_json(guests))
+
+@login_required
+def user_reservations_list(request):
+    """Vue pour afficher toutes les réservations d'un utilisateur"""
+    reservations = Reservation.objects.filter(user=request.user).select_related('restaurant').order_by('-date', '-time')
+    
+    # Filtrer par statut si demandé
+    status_filter = request.GET.get('status')
+    if status_filter:
+        reservations = reservations.filter(status=status_filter)
+    
+    context = {
+        'reservations': reservations,
+        'status_filter': status_filter,
+        'STATUS_CHOICES': Reservation.STATUS_CHOICES
+    }
+    
+    return render(request, 'foodapp/user_reservations_list.html', context)
+
+@login_required
+def reservation_detail(request, reservation_id):
+    """Vue pour afficher les détails d'une réservation"""
+    reservation = get_object_or_404(Reservation.objects.select_related('restaurant'), id=reservation_id)
+    
+    # Vérifier que l'utilisateur a le droit de voir cette réservation
+    if reservation.user != request.user:
+        # Vérifier si c'est un restaurateur qui gère ce restaurant
+        try:
+            restaurant_account = request.user.restaurant_account
+        except RestaurantAccount.DoesNotExist:
+            return HttpResponseForbidden("Vous n'êtes pas autorisé à voir cette réservation.")
+        if restaurant_account.restaurant != reservation.restaurant:
+            return HttpResponseForbidden("Vous n'êtes pas autorisé à voir cette réservation.")
+    
+    context = {
+        'reservation': reservation,
+        'restaurant': reservation.restaurant
+    }
+    
+    return render(request, 'foodapp/reservation_detail.html', context)
+
+@login_required
+def reservation_cancel(request, reservation_id):
+    """Vue pour annuler une réservation"""
+    reservation = get_object_or_404(Reservation, id=reservation_id)
+    
+    # Vérifier que l'utilisateur a le droit d'annuler cette réservation
+    if reservation.user != request.user:
+        return HttpResponseForbidden("Vous n'êtes pas autorisé à annuler cette réservation.")
+    
+    # Vérifier que la réservation n'est pas déjà annulée ou terminée
+    if reservation.status in [Reservation.STATUS_CANCELED, Reservation.STATUS_COMPLETED]:
+        return redirect('reservation_detail', reservation_id=reservation_id)
+    
+    if request.method == 'POST':
+        reservation.status = Reservation.STATUS_CANCELED
+        reservation.save()
+        return redirect('user_reservations_list')
+    
+    context = {
+        'reservation': reservation,
+        'restaurant': reservation.restaurant
+    }
+    
+    return render(request, 'foodapp/reservation_cancel.html', context)
+
+@login_required
+def reservation_modify(request, reservation_id):
+    """Vue pour modifier une réservation"""
+    reservation = get_object_or_404(Reservation.objects.select_related('restaurant'), id=reservation_id)
+    
+    # Vérifier que l'utilisateur a le droit de modifier cette réservation
+    if reservation.user != request.user:
+        return HttpResponseForbidden("Vous n'êtes pas autorisé à modifier cette réservation.")
+    
+    # Vérifier que la réservation n'est pas déjà annulée ou terminée
+    if reservation.status in [Reservation.STATUS_CANCELED, Reservation.STATUS_COMPLETED]:
+        return redirect('reservation_detail', reservation_id=reservation_id)
+    
+    # Date limite pour les modifications (24h avant la réservation)
+    modification_limit = timezone.make_aware(datetime.combine(reservation.date, reservation.time)) - timedelta(hours=24)
+    can_modify = timezone.now() < modification_limit
+    
+    if request.method == 'POST' and can_modify:
+        form = ReservationModifyForm(request.POST, instance=reservation)
+        if form.is_valid():
+            # Vérifier la disponibilité (en excluant la réservation actuelle) et enregistrer sous verrou
+            if book_reservation(form.instance, exclude_reservation_id=reservation_id):
+                return redirect('reservation_detail', reservation_id=reservation_id)
+            else:
+                form.add_error(None, "Désolé, ce créneau n'est plus disponible. Veuillez choisir un autre horaire.")
+    else:
+        form = ReservationModifyForm(instance=reservation)
+    
+    # Récupérer les créneaux disponibles pour JavaScript
+    available_dates = get_available_dates(reservation.restaurant)
+    
+    context = {
+        'form': form,
+        'reservation': reservation,
+        'restaurant': reservation.restaurant,
+        'can_modify': can_modify,
+        'modification_limit': modification_limit,
+        'available_dates': json.dumps([date.strftime('%Y-%m-%d') for date in available_dates])
+    }
+    
+    return render(request, 'foodapp/reservation_modify.html', context)
+
+def available_slots(request, restaurant_id):
+    """
+    API des créneaux horaires d'un restaurant pour une date (?date=AAAA-MM-JJ&guests=),
+    calculés à partir des réservations du jour lues en une seule requête
+    """
+    restaurant = get_object_or_404(Restaurant, id=restaurant_id)
+    
+    date_str = request.GET.get('date')
+    if not date_str:
+        return JsonResponse({'error': 'Date non spécifiée'}, status=400)
+    try:
+        date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        guests = int(request.GET.get('guests') or 1)
+    except ValueError:
+        return JsonResponse({'error': 'Format de date ou nombre de convives invalide'}, status=400)
+    
+    # En modification, les places de la réservation en cours restent disponibles
+    exclude_id = request.GET.get('exclude')
+    if exclude_id and request.user.is_authenticated:
+        exclude_id = Reservation.objects.filter(id=exclude_id, user=request.user).values_list('id', flat=True).first()
+    else:
+        exclude_id = None
+    
+    slots = DayOccupancy.load(restaurant, date, exclude_reservation_id=exclude_id).slots(guests)
+    
+    # Les créneaux déjà passés ne sont plus réservables
+    now = timezone.localtime()
+    if date < now.date():
+        for slot in slots:
+            slot['available'] = False
+    elif date == now.date():
+        for slot in slots:
+            if slot['time'] <= now.strftime('%H:%M'):
+                slot['available'] = False
+    
+    return JsonResponse({
+        'date': date_str,
+        'slots': slots,
+        'available_slots': [slot['time'] for slot in slots if slot['available']],
+    })
+
+@cache_anonymous_page
 def accueil(request):
     """Vue principale de la page d'accueil avec les plats et villes en vedette"""
     try:
-        featured_dishes = Dish.objects.all().order_by('?')[:5]
+        featured = featured_dishes('all', 5)
         dishes = Dish.objects.all().order_by('-id')[:8]
         cities = City.objects.all()[:4]
     except Exception as e:
         # En cas d'erreur (par exemple, tables pas encore créées), on utilise des listes vides
-        featured_dishes = []
+        featured = []
         dishes = []
         cities = []
         
     context = {
-        'featured_dishes': featured_dishes,
+        'featured_dishes': featured,
         'dishes': dishes,
         'cities': cities,
     }
@@ -384,12 +637,36 @@ def accueil(request):
 from .models import (
     Restaurant, Dish, Reservation, Review, Category, RestaurantAccount,
     City, UserProfile, ForumTopic, ForumMessage, SubscriptionPlan,
-    RestaurantSubscription, UserSubscription
+    RestaurantSubscription, UserSubscription, Order, OrderItem, KitchenOrderStatus
 )
 from .forms import (
     DishFilterForm, CurrencyConverterForm, ReservationForm,
     ReservationModifyForm, RestaurantBasicInfoForm, DishForm, CategoryForm
 )
+from .stats import REVENUE_STATUSES, build_sales_report, report_chart_data, get_daily_sales, validate_period
+from .dish_index import get_dish_index, dish_filters_from_params, filter_dishes
+from .dish_sorting import DISH_SORTS, DEFAULT_SORT, dish_page
+from .catalog_api import (
+    DISH_API_FIELDS, RESTAURANT_API_FIELDS, PageParams, PageParamsError,
+    dish_api_data, restaurant_api_data, id_batches, keyset_id_batches, page_ids,
+    ndjson_response, page_payload,
+)
+from .catalog_cache import catalog_version, cached_fragments, request_key, single_flight
+from .search import SOURCES as SEARCH_SOURCES, search_objects
+from .reservations import (
+    CALENDAR_DAYS, DayOccupancy, availability_calendar, book_reservation, get_available_dates,
+)
+from .cart import CartError, checkout_request_cart, parse_cart_lines, parse_checkout, update_request_cart
+from .pos import IdempotencyConflict, create_pos_order, parse_ticket
+from .events import current_token as current_event_token
+from .sse import STREAM_PATH as ORDER_STREAM_PATH
+from .kitchen import DATABASE_ERROR_MESSAGE, SOCKET_PATH as KITCHEN_SOCKET_PATH, display_state
+from .changes import order_changes
+from .dashboard import restaurant_dashboard_context
+from .counters import platform_counters
+from .featured import featured_dishes
+from .viewed_dishes import set_new_badges
+from .autocomplete import KINDS as AUTOCOMPLETE_KINDS, MAX_SUGGESTIONS as AUTOCOMPLETE_MAX_SUGGESTIONS, suggest
 
 def is_restaurant_owner(user, restaurant_id):
     """Check if the user is the owner of the restaurant"""
@@ -898,47 +1175,57 @@ class RestaurantRegistrationWizard(SessionWizardView):
 @csrf_exempt
 @login_required
 def add_to_cart(request):
-    """API pour ajouter un plat au panier"""
+    """
+    API d'ajout au panier: un plat ({"dish_id", "quantity"}) ou plusieurs
+    ({"items": [...]}); une quantité négative retire le plat
+    """
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Méthode non autorisée'}, status=405)
     
     try:
-        data = json.loads(request.body)
-        dish_id = data.get('dish_id')
-        quantity = data.get('quantity', 1)
-        
-        # Vérifier que le plat existe
-        dish = get_object_or_404(Dish, id=dish_id)
-        
-        # Récupérer ou créer le panier de l'utilisateur
-        cart, created = Order.objects.get_or_create(
-            user=request.user,
-            status=Order.STATUS_NEW,
-            defaults={'total_amount': 0}
-        )
-        
-        # Ajouter ou mettre à jour l'article dans le panier
-        cart_item, created = OrderItem.objects.get_or_create(
-            order=cart,
-            dish=dish,
-            defaults={'quantity': quantity}
-        )
-        
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
-        
-        # Mettre à jour le total de la commande
-        cart.update_total()
-        
-        return JsonResponse({
-            'success': True,
-            'cart_count': cart.items.count(),
-            'cart_total': str(cart.total_amount)
-        })
-        
-    except Exception as e:
+        lines = parse_cart_lines(json.loads(request.body))
+        carts = update_request_cart(request, lines)
+    except (ValueError, CartError) as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'carts': [
+            {
+                'id': cart['id'],
+                'restaurant_id': cart['restaurant_id'],
+                'count': cart['lines'],
+                'total': str(cart['total_amount']),
+            }
+            for cart in carts
+        ],
+        # Compatibilité: panier du premier restaurant concerné
+        'cart_count': carts[0]['lines'] if carts else 0,
+        'cart_total': str(carts[0]['total_amount']) if carts else '0.00',
+    })
+
+@csrf_exempt
+@login_required
+def checkout_cart(request):
+    """
+    API de validation du panier d'un restaurant: {"restaurant_id", "table_number",
+    "is_takeaway", "payment_method", "notes", ...}; la commande part en cuisine
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Méthode non autorisée'}, status=405)
+    
+    try:
+        restaurant_id, fields = parse_checkout(json.loads(request.body))
+        order = checkout_request_cart(request, restaurant_id, **fields)
+    except (ValueError, CartError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'order_id': order.id,
+        'order_code': order.order_code,
+        'total': str(order.total_amount),
+    })
 
 @login_required
 def chat_view(request):
@@ -1140,53 +1427,177 @@ def restaurant_owner_dashboard(request):
         messages.error(request, "Accès refusé. Vous n'avez pas les droits nécessaires pour accéder à cette page.")
         return redirect('accueil')
     
+    # Compteurs en cache, réservations par pages (voir dashboard.py)
+    context = restaurant_dashboard_context(restaurant_account.restaurant, request.GET)
+    context['account'] = restaurant_account
+    
+    return render(request, 'foodapp/restaurant_owner_dashboard.html', context)
+
+@login_required
+def restaurant_orders(request):
+    """Vue pour la gestion des commandes d'un restaurant"""
+    
+    # Vérifier si l'utilisateur a bien un compte restaurant associé
+    try:
+        restaurant_account = request.user.restaurant_account
+        if not restaurant_account.is_active:
+            return redirect('accueil')
+    except:
+        # Si l'utilisateur n'a pas de compte restaurant associé, le rediriger vers l'accueil
+        return redirect('accueil')
+    
     # Récupérer le restaurant associé à ce compte
     restaurant = restaurant_account.restaurant
     
-    # Récupérer les réservations de ce restaurant
-    # Filtrer par statut si demandé
-    status_filter = request.GET.get('status', None)
-    date_filter = request.GET.get('date', None)
-    
-    reservations = Reservation.objects.filter(restaurant=restaurant).order_by('-date', '-time')
+    # Récupérer les commandes de ce restaurant (hors paniers en cours)
+    orders = Order.objects.filter(restaurant=restaurant).exclude(status=Order.STATUS_CART).order_by('-order_time')
     
-    if status_filter:
-        reservations = reservations.filter(status=status_filter)
+    # Commandes par statut
+    new_orders = orders.filter(status=Order.STATUS_NEW)
+    preparing_orders = orders.filter(status=Order.STATUS_PREPARING)
+    ready_orders = orders.filter(status=Order.STATUS_READY)
     
-    if date_filter:
-        reservations = reservations.filter(date=date_filter)
+    # Commandes à emporter
+    takeaway_orders = orders.filter(is_takeaway=True, status__in=[Order.STATUS_NEW, Order.STATUS_PREPARING, Order.STATUS_READY])
     
     # Statistiques
-    total_reservations = Reservation.objects.filter(restaurant=restaurant).count()
-    pending_reservations = Reservation.objects.filter(restaurant=restaurant, status=Reservation.STATUS_PENDING).count()
-    confirmed_reservations = Reservation.objects.filter(restaurant=restaurant, status=Reservation.STATUS_CONFIRMED).count()
-    canceled_reservations = Reservation.objects.filter(restaurant=restaurant, status=Reservation.STATUS_CANCELED).count()
+    new_count = new_orders.count()
+    preparing_count = preparing_orders.count()
+    ready_count = ready_orders.count()
+    in_progress_count = new_count + preparing_count
+    takeaway_count = takeaway_orders.count()
     
-    # Réservations pour aujourd'hui
-    today = timezone.now().date()
-    today_reservations = Reservation.objects.filter(restaurant=restaurant, date=today).order_by('time')
+    # Commandes et chiffre d'affaires du jour (lus dans les agrégats journaliers)
+    today_sales = get_daily_sales(restaurant, timezone.localdate())
     
-    # Commandes récentes
-    recent_orders = Order.objects.filter(
-        restaurant=restaurant, 
-        status__in=[Order.STATUS_NEW, Order.STATUS_PREPARING, Order.STATUS_READY]
-    ).order_by('-order_time')[:5]
+    # Récupérer les plats disponibles pour le restaurant (pour le formulaire de création de commande)
+    dishes = Dish.objects.filter(city=restaurant.city)
     
     context = {
         'restaurant': restaurant,
         'account': restaurant_account,
-        'reservations': reservations,
-        'today_reservations': today_reservations,
-        'total_reservations': total_reservations,
-        'pending_reservations': pending_reservations,
-        'confirmed_reservations': confirmed_reservations,
-        'canceled_reservations': canceled_reservations,
-        'status_filter': status_filter,
-        'date_filter': date_filter,
-        'recent_orders': recent_orders,
+        'orders': orders,
+        'new_orders': new_orders,
+        'preparing_orders': preparing_orders,
+        'ready_orders': ready_orders,
+        'takeaway_orders': takeaway_orders,
+        'today_orders_count': today_sales.orders_count,
+        'in_progress_count': in_progress_count,
+        'ready_count': ready_count,
+        'new_count': new_count,
+        'preparing_count': preparing_count,
+        'takeaway_count': takeaway_count,
+        'today_revenue': today_sales.revenue,
+        'dishes': dishes,
     }
     
-    return render(request, 'foodapp/restaurant_owner_dashboard.html', context)
+    return render(request, 'foodapp/restaurant_orders.html', context)
+
+@login_required
+def restaurant_orders_live(request):
+    """
+    Tableau des commandes en cours, tenu à jour par le flux SSE du restaurant
+    (foodapp/sse.py); sans flux (runserver, WSGI), la page interroge l'API
+    des changements (restaurant_order_changes)
+    """
+    try:
+        restaurant_account = request.user.restaurant_account
+        if not restaurant_account.is_active:
+            return redirect('accueil')
+    except Exception:
+        return redirect('accueil')
+    
+    restaurant = restaurant_account.restaurant
+    
+    # Jeton pris avant la lecture: le flux reprendra les changements survenus depuis
+    stream_token = current_event_token()
+    
+    orders = list(
+        Order.objects.filter(
+            restaurant=restaurant,
+            status__in=[Order.STATUS_NEW, Order.STATUS_PREPARING, Order.STATUS_READY]
+        ).select_related('kitchen_status').prefetch_related('items__dish').order_by('-order_time')
+    )
+    
+    new_count = sum(order.status == Order.STATUS_NEW for order in orders)
+    preparing_count = sum(order.status == Order.STATUS_PREPARING for order in orders)
+    ready_count = sum(order.status == Order.STATUS_READY for order in orders)
+    takeaway_count = sum(order.is_takeaway for order in orders)
+    
+    today_sales = get_daily_sales(restaurant, timezone.localdate())
+    
+    context = {
+        'restaurant': restaurant,
+        'account': restaurant_account,
+        'orders': orders,
+        'new_count': new_count,
+        'preparing_count': preparing_count,
+        'ready_count': ready_count,
+        'takeaway_count': takeaway_count,
+        'today_orders_count': today_sales.orders_count,
+        'today_revenue': today_sales.revenue,
+        'stream_url': ORDER_STREAM_PATH,
+        'stream_token': stream_token,
+        'changes_url': reverse('api_restaurant_order_changes'),
+        'status_labels': dict(Order.STATUS_CHOICES),
+        'kitchen_status_labels': dict(KitchenOrderStatus.STATUS_CHOICES),
+    }
+    
+    return render(request, 'foodapp/restaurant_orders_live.html', context)
+
+@login_required
+def restaurant_order_changes(request):
+    """
+    API de synchronisation des caisses et tablettes: commandes en cours sans
+    paramètre, puis seulement les commandes modifiées depuis ?since=<curseur>
+    """
+    try:
+        restaurant_account = request.user.restaurant_account
+        if not restaurant_account.is_active:
+            return JsonResponse({'error': 'Accès non autorisé'}, status=403)
+    except Exception:
+        return JsonResponse({'error': 'Accès non autorisé'}, status=403)
+    
+    try:
+        changes = order_changes(restaurant_account.restaurant, request.GET.get('since') or None)
+    except ValueError as e:
+        # Curseur illisible: le client doit repartir d'une synchronisation complète
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(changes)
+
+@csrf_exempt
+@login_required
+def create_order(request):
+    """
+    API de la caisse: crée la commande d'un ticket complet {"restaurant_id",
+    "items": [{"dish_id", "quantity"}], "idempotency_key", "notes", ...}
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Méthode non autorisée'}, status=405)
+    
+    if not hasattr(request.user, 'restaurant_account') or not request.user.restaurant_account.is_active:
+        return JsonResponse({'success': False, 'message': 'Accès refusé'}, status=403)
+    
+    try:
+        restaurant_id, lines, idempotency_key, fields = parse_ticket(json.loads(request.body))
+        restaurant = request.user.restaurant_account.restaurant
+        if restaurant.id != restaurant_id:
+            return JsonResponse({'success': False, 'message': 'Restaurant introuvable'}, status=404)
+        order, created = create_pos_order(restaurant, lines, idempotency_key, **fields)
+    except IdempotencyConflict as e:
+        # Ticket modifié renvoyé sous la clé d'un ticket déjà enregistré
+        return JsonResponse({'success': False, 'message': str(e)}, status=409)
+    except (ValueError, CartError) as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'order_id': order.id,
+        'order_code': order.order_code,
+        'total': str(order.total_amount),
+        # Ticket déjà enregistré sous cette clé (renvoi après une coupure)
+        'replayed': not created,
+    }, status=201 if created else 200)
 
 @login_required
 def restaurant_pos(request, restaurant_id):
@@ -1199,10 +1610,10 @@ def restaurant_pos(request, restaurant_id):
         return redirect('accueil')
     
     # Vérifier que le restaurant existe et appartient à l'utilisateur
-    restaurant = get_object_or_404(Restaurant, id=restaurant_id, restaurant_account=request.user.restaurant_account)
+    restaurant = get_object_or_404(Restaurant, id=restaurant_id, account=request.user.restaurant_account)
     
     # Récupérer les plats du restaurant
-    dishes = Dish.objects.filter(restaurant=restaurant, is_available=True).order_by('type', 'name')
+    dishes = Dish.objects.filter(restaurant=restaurant).order_by('type', 'name')
     
     # Préparer les catégories de plats pour le menu
     categories = {}
@@ -1215,7 +1626,7 @@ def restaurant_pos(request, restaurant_id):
     active_orders = Order.objects.filter(
         restaurant=restaurant,
         status__in=['new', 'preparing']
-    ).order_by('-created_at')
+    ).order_by('-order_time')
     
     context = {
         'restaurant': restaurant,
@@ -1237,51 +1648,273 @@ def kitchen_dashboard(request, restaurant_id):
         return redirect('accueil')
     
     # Vérifier que le restaurant existe et appartient à l'utilisateur
-    restaurant = get_object_or_404(Restaurant, id=restaurant_id, restaurant_account=request.user.restaurant_account)
-    
-    # Récupérer les commandes par statut
-    new_orders = Order.objects.filter(
-        restaurant=restaurant,
-        status='new'
-    ).order_by('created_at')
-    
-    preparing_orders = Order.objects.filter(
-        restaurant=restaurant,
-        status='preparing'
-    ).order_by('updated_at')
+    restaurant = get_object_or_404(Restaurant, id=restaurant_id, account=request.user.restaurant_account)
     
-    ready_orders = Order.objects.filter(
-        restaurant=restaurant,
-        status='ready',
-        updated_at__date=timezone.now().date()
-    ).order_by('-updated_at')
+    # État initial rendu avec la page, puis mises à jour par la WebSocket des écrans
+    # de cuisine (foodapp/kitchen.py), ou par kitchen_orders quand elle est indisponible
+    station = request.GET.get('station')
+    station = int(station) if station and station.isdigit() else None
+    stations = User.objects.filter(
+        Q(assigned_orders__order__restaurant=restaurant) | Q(pk=request.user.pk)
+    ).distinct().order_by('username')
     
-    # Statistiques du jour
-    today = timezone.now().date()
-    today_orders = Order.objects.filter(
-        restaurant=restaurant,
-        created_at__date=today
-    )
+    # Statistiques du jour (lues dans les agrégats journaliers)
+    today_sales = get_daily_sales(restaurant, timezone.localdate())
     
     today_stats = {
-        'total_orders': today_orders.count(),
-        'new_orders': today_orders.filter(status='new').count(),
-        'preparing_orders': today_orders.filter(status='preparing').count(),
-        'completed_orders': today_orders.filter(status='completed').count(),
-        'revenue': today_orders.aggregate(total=Sum('total_amount'))['total'] or 0,
+        'total_orders': today_sales.orders_count,
+        'new_orders': today_sales.new_count,
+        'preparing_orders': today_sales.preparing_count,
+        'completed_orders': today_sales.completed_count,
+        'revenue': today_sales.revenue,
     }
     
     context = {
         'restaurant': restaurant,
-        'new_orders': new_orders,
-        'preparing_orders': preparing_orders,
-        'ready_orders': ready_orders,
+        'station': station,
+        'stations': stations,
+        'kitchen_snapshot': display_state(restaurant.id, station),
+        'kitchen_socket_path': KITCHEN_SOCKET_PATH,
         'today_stats': today_stats,
         'active_tab': 'kitchen',
     }
     
     return render(request, 'foodapp/kitchen_dashboard.html', context)
 
+@login_required
+@require_http_methods(['GET', 'POST'])
+def kitchen_orders(request, restaurant_id):
+    """
+    Écran cuisine sans WebSocket: snapshot du poste ?station=<id> en GET; en
+    POST, exécute d'abord la commande de l'écran (tick, kitchen_status)
+    """
+    if not hasattr(request.user, 'restaurant_account') or not request.user.restaurant_account.is_active:
+        return JsonResponse({'type': 'error', 'message': 'Accès refusé'}, status=403)
+    
+    restaurant = get_object_or_404(Restaurant, id=restaurant_id, account=request.user.restaurant_account)
+    station = request.GET.get('station')
+    station = int(station) if station and station.isdigit() else None
+    
+    try:
+        message = json.loads(request.body) if request.method == 'POST' else None
+        return JsonResponse(display_state(restaurant.id, station, message))
+    except (KeyError, TypeError, ValueError) as e:
+        return JsonResponse({'type': 'error', 'message': str(e)}, status=400)
+    except DatabaseError:
+        return JsonResponse({'type': 'error', 'message': DATABASE_ERROR_MESSAGE}, status=503)
+
+@login_required
+def restaurant_reviews(request):
+    """Vue pour la gestion des avis d'un restaurant"""
+    # Vérifier si l'utilisateur a bien un compte restaurant associé
+    try:
+        restaurant_account = request.user.restaurant_account
+        if not restaurant_account.is_active:
+            return redirect('accueil')
+    except:
+        # Si l'utilisateur n'a pas de compte restaurant associé, le rediriger vers l'accueil
+        return redirect('accueil')
+    
+    # Récupérer le restaurant associé à ce compte
+    restaurant = restaurant_account.restaurant
+    
+    # Récupérer les avis pour ce restaurant
+    reviews = restaurant.reviews.all()
+    
+    # Filtres
+    status_filter = request.GET.get('status', '')
+    if status_filter == 'published':
+        reviews = reviews.filter(is_published=True)
+    elif status_filter == 'unpublished':
+        reviews = reviews.filter(is_published=False)
+    
+    # Recherche
+    search_query = request.GET.get('search', '')
+    if search_query:
+        reviews = reviews.filter(
+            Q(comment__icontains=search_query) | 
+            Q(user__username__icontains=search_query)
+        )
+    
+    # Tri
+    sort_by = request.GET.get('sort', '-created_at')
+    reviews = reviews.order_by(sort_by)
+    
+    # Pagination
+    paginator = Paginator(reviews, 10)  # 10 avis par page
+    page_number = request.GET.get('page')
+    reviews_page = paginator.get_page(page_number)
+    
+    # Statistiques des avis listés: agrégats dénormalisés du restaurant quand la
+    # liste se limite aux avis publiés, sinon une seule requête groupée
+    if search_query or status_filter != 'published':
+        aggregates = Restaurant.rating_aggregates(reviews.order_by())
+        total_reviews = aggregates['rating_count']
+        rating_sum = aggregates['rating_sum']
+        ratings_distribution = {stars: aggregates[f'rating_{stars}_count'] for stars in range(5, 0, -1)}
+    else:
+        total_reviews = restaurant.rating_count
+        rating_sum = restaurant.rating_sum
+        ratings_distribution = restaurant.ratings_histogram
+    
+    avg_rating = round(rating_sum / total_reviews, 1) if total_reviews else 0
+    
+    # Calculer les pourcentages pour les barres de progression
+    if total_reviews > 0:
+        for rating in ratings_distribution:
+            ratings_distribution[rating] = (ratings_distribution[rating] / total_reviews) * 100
+    
+    context = {
+        'restaurant': restaurant,
+        'account': restaurant_account,
+        'reviews': reviews_page,
+        'total_reviews': total_reviews,
+        'avg_rating': avg_rating,
+        'ratings_distribution': ratings_distribution,
+        'status_filter': status_filter,
+        'search_query': search_query,
+        'sort_by': sort_by,
+    }
+    
+    return render(request, 'foodapp/restaurant_reviews.html', context)
+
+def get_stats_period(request):
+    """
+    Renvoie la période (début, fin) demandée pour les statistiques, par défaut
+    le mois en cours; ValueError si elle est inversée ou trop longue
+    """
+    today = timezone.now().date()
+    start_date = today.replace(day=1)  # Premier jour du mois
+    end_date = today
+    
+    from_date = request.GET.get('from')
+    to_date = request.GET.get('to')
+    
+    if from_date:
+        try:
+            start_date = datetime.strptime(from_date, '%Y-%m-%d').date()
+        except ValueError:
+            pass
+    
+    if to_date:
+        try:
+            end_date = datetime.strptime(to_date, '%Y-%m-%d').date()
+        except ValueError:
+            pass
+    
+    validate_period(start_date, end_date)
+    return start_date, end_date
+
+@login_required
+def restaurant_stats(request):
+    """Vue pour les statistiques d'un restaurant"""
+    # Vérifier si l'utilisateur a bien un compte restaurant associé
+    try:
+        restaurant_account = request.user.restaurant_account
+        if not restaurant_account.is_active:
+            return redirect('accueil')
+    except:
+        # Si l'utilisateur n'a pas de compte restaurant associé, le rediriger vers l'accueil
+        return redirect('accueil')
+    
+    restaurant = restaurant_account.restaurant
+    try:
+        start_date, end_date = get_stats_period(request)
+    except ValueError as e:
+        return HttpResponse(str(e), status=400)
+    
+    # Séries journalières, catégories et modes de paiement en requêtes groupées
+    report = build_sales_report(restaurant, start_date, end_date)
+    chart_data = report_chart_data(report)
+    
+    reservations_count = Reservation.objects.filter(
+        restaurant=restaurant,
+        date__gte=start_date,
+        date__lte=end_date
+    ).count()
+    
+    orders = Order.objects.filter(
+        restaurant=restaurant,
+        order_time__date__gte=start_date,
+        order_time__date__lte=end_date
+    )
+    
+    # Top des plats les plus vendus
+    top_dishes_data = OrderItem.objects.filter(
+        order__in=orders,
+        order__status__in=REVENUE_STATUSES
+    ).values('dish__name').annotate(
+        quantity_sold=Sum('quantity'),
+        revenue=Sum(F('price') * F('quantity'))
+    ).order_by('-quantity_sold')[:10]
+    
+    top_dishes_data = list(top_dishes_data)
+    total_revenue = sum(item['revenue'] for item in top_dishes_data)
+    
+    top_dishes = []
+    for dish in top_dishes_data:
+        percentage = 0
+        if total_revenue > 0:
+            percentage = round((dish['revenue'] / total_revenue) * 100, 1)
+        
+        top_dishes.append({
+            'name': dish['dish__name'],
+            'quantity_sold': dish['quantity_sold'],
+            'revenue': dish['revenue'],
+            'percentage': percentage
+        })
+    
+    # Clients récurrents
+    recurring_customers = orders.values('customer_name').annotate(
+        order_count=Count('id'),
+        total_spent=Sum('total_amount'),
+        last_visit=Max('order_time')
+    ).filter(order_count__gt=1).order_by('-order_count')[:10]
+    
+    context = {
+        'restaurant': restaurant,
+        'account': restaurant_account,
+        'start_date': start_date,
+        'end_date': end_date,
+        'revenue': report['revenue'],
+        'orders_count': report['orders_count'],
+        'avg_order_value': report['avg_order_value'],
+        'reservations_count': reservations_count,
+        
+        # Données pour les graphiques (converties en JSON)
+        'dates': json.dumps(chart_data['dates']),
+        'revenue_data': json.dumps(chart_data['revenue_data']),
+        'orders_data': json.dumps(chart_data['orders_data']),
+        'dish_categories': json.dumps(chart_data['dish_categories']),
+        'dish_categories_data': json.dumps(chart_data['dish_categories_data']),
+        'payment_methods': json.dumps(chart_data['payment_methods']),
+        'payment_methods_data': json.dumps(chart_data['payment_methods_data']),
+        
+        # Données pour les tableaux
+        'top_dishes': top_dishes,
+        'recurring_customers': recurring_customers
+    }
+    
+    return render(request, 'foodapp/restaurant_stats.html', context)
+
+@login_required
+def restaurant_stats_data(request):
+    """API JSON renvoyant les séries des graphiques de statistiques du restaurant"""
+    try:
+        restaurant_account = request.user.restaurant_account
+        if not restaurant_account.is_active:
+            return JsonResponse({'error': 'Accès non autorisé'}, status=403)
+    except:
+        return JsonResponse({'error': 'Accès non autorisé'}, status=403)
+    
+    try:
+        start_date, end_date = get_stats_period(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    report = build_sales_report(restaurant_account.restaurant, start_date, end_date)
+    return JsonResponse(report_chart_data(report))
+
 def user_pricing_plans(request):
     """Vue pour afficher les plans d'abonnement utilisateur"""
     from .models import SubscriptionPlan, UserSubscription, UserProfile
@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Le flux SSE du tableau des commandes en direct (foodapp/sse.py) et la
+WebSocket des écrans de cuisine (foodapp/kitchen.py) ne sont servis que par
+cette application, avec un serveur ASGI gérant les WebSockets (uvicorn,
+daphne...): ``runserver`` et le point d'entrée WSGI ne les proposent pas.
 """
 
 import os
@@ -13,4 +18,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodproject.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Importés après l'initialisation de Django (modèles)
+from foodapp.kitchen import SOCKET_PATH, kitchen_socket  # noqa: E402
+from foodapp.sse import STREAM_PATH, order_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Les flux restent ouverts: ils sont servis hors du cycle requête/réponse de Django
+    if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+        await order_stream(scope, receive, send)
+    elif scope['type'] == 'websocket' and scope['path'] == SOCKET_PATH:
+        await kitchen_socket(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
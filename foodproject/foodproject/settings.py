@@ -100,6 +100,18 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Les transactions prennent le verrou d'écriture dès leur début et attendent
+            # leur tour: sinon une transaction qui lit avant d'écrire échoue aussitôt
+            # (« database is locked »), et le cache en base (CACHE_BACKEND='db') ignore
+            # silencieusement l'écriture perdue
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # Base de test sur disque: les tests de concurrence ouvrent une connexion par
+        # thread, et la base en mémoire partagée ne fait pas attendre les verrous
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -191,3 +203,89 @@ FRONTEND_BASE_URL = 'http://localhost:8000'  # Change in production
 
 # OpenAI API Key
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
+
+# Index de facettes des plats (foodapp/dish_index.py): durée de vie en secondes
+# avant reconstruction, pour propager les modifications faites par d'autres processus
+DISH_INDEX_TTL = int(os.getenv('DISH_INDEX_TTL', '300'))
+
+# Plats mis en avant (foodapp/featured.py): minutes entre deux changements de
+# sélection, 0 pour un nouveau tirage à chaque requête
+FEATURED_ROTATION_MINUTES = int(os.getenv('FEATURED_ROTATION_MINUTES', '0'))
+# Durée de vie en secondes des sélections éligibles, pour les modifications en
+# masse qui ne changent pas la version du catalogue (0: sans limite)
+FEATURED_POOLS_TTL = int(os.getenv('FEATURED_POOLS_TTL', '300'))
+
+# Pages publiques du catalogue en cache pour les visiteurs anonymes
+# (foodapp/page_cache.py): durée en secondes avant rafraîchissement, 0 pour désactiver
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', '300'))
+
+# Tri de la liste des plats par le module natif cpp_modules.food_processor.
+# À n'activer que si `manage.py benchmark_dish_sort` montre un gain sur le tri SQL.
+DISH_NATIVE_SORT = os.getenv('DISH_NATIVE_SORT', 'False') == 'True'
+
+# Cache à deux niveaux (foodapp/cache_backends.py): un LRU en mémoire par processus
+# devant un cache partagé par tous les workers, choisi par CACHE_BACKEND:
+# 'db' (défaut, table créée par les migrations ou `createcachetable`), 'redis'
+# (CACHE_LOCATION = URL du serveur), 'file' ou 'locmem'. Les verrous et versions
+# du cache reposent sur add() atomique: 'file' et 'locmem' ne conviennent qu'à
+# un seul processus (`manage.py check --deploy` le signale).
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'db')
+
+SHARED_CACHE_BACKENDS = {
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodapp_cache'),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+    },
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'foodapp-shared',
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'foodapp.cache_backends.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'LOCAL_MAX_ENTRIES': int(os.getenv('CACHE_LOCAL_MAX_ENTRIES', '1000')),
+            # Délai maximal de propagation d'une écriture aux autres workers
+            'LOCAL_TIMEOUT': int(os.getenv('CACHE_LOCAL_TIMEOUT', '5')),
+            # Clés lues directement dans le cache partagé (versions d'invalidation, paniers,
+            # compteurs des tableaux de bord, plats vus)
+            'SHARED_ONLY_PREFIXES': ['catalog:version', 'cart:', 'dashboard:', 'viewed:'],
+        },
+    },
+    'shared': SHARED_CACHE_BACKENDS[CACHE_BACKEND],
+}
+
+# Index en mémoire de la recherche (bases autres que SQLite, voir foodapp/search.py)
+# et de l'autocomplétion (foodapp/autocomplete.py): durée de vie en secondes avant
+# reconstruction, pour propager les modifications faites par d'autres processus
+SEARCH_INDEX_TTL = int(os.getenv('SEARCH_INDEX_TTL', '300'))
+
+# Réservations (foodapp/reservations.py): services « HH:MM-HH:MM » séparés par des
+# virgules, pas des créneaux proposés, durée d'occupation d'une table et jours de
+# fermeture (0 = lundi). La capacité est celle de chaque restaurant.
+RESERVATION_OPENING_HOURS = [
+    tuple(period.strip().split('-'))
+    for period in os.getenv('RESERVATION_OPENING_HOURS', '12:00-14:30,19:00-22:30').split(',')
+    if period.strip()
+]
+RESERVATION_SLOT_MINUTES = int(os.getenv('RESERVATION_SLOT_MINUTES', '30'))
+RESERVATION_DURATION_MINUTES = int(os.getenv('RESERVATION_DURATION_MINUTES', '90'))
+RESERVATION_CLOSED_WEEKDAYS = [
+    int(day) for day in os.getenv('RESERVATION_CLOSED_WEEKDAYS', '0').split(',') if day.strip()
+]
+
+# Stockage des paniers (foodapp/cart.py): 'database' (défaut) pour une commande
+# « cart » tenue à jour en base à chaque ajout; 'session' ou 'cache' pour aucune
+# écriture en base avant la validation
+CART_STORAGE = os.getenv('CART_STORAGE', 'database')